@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CropDoctorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crop_doctor'
+
+    def ready(self):
+        from kisan_sathi.pdf_styles import warm_pdf_registry
+        warm_pdf_registry()
@@ -1,3 +1,30 @@
-from django.test import TestCase
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .models import Analysis
+
+
+class ReportPDFTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analysis = Analysis.objects.create(crop_type='tomato', result={'items': [{
+            'disease': {'en': 'Early Blight'},
+            'confidence': 91,
+            'severity': 'moderate',
+            'cause': {'en': 'Alternaria solani fungus'},
+            'treatment': {
+                'immediate': {'en': ['Remove infected leaves']},
+                'chemical': {'en': ['Mancozeb 2 g per litre']},
+                'organic': {'en': ['Neem oil spray']},
+            },
+            'prevention': {'en': ['Rotate crops', 'Avoid overhead watering']},
+        }]})
+
+    def test_renders_pdf(self):
+        response = self.client.get(f'/api/crop-doctor/report/{self.analysis.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_missing_report(self):
+        response = self.client.get(f'/api/crop-doctor/report/{self.analysis.pk + 1}/')
+        self.assertEqual(response.status_code, 404)
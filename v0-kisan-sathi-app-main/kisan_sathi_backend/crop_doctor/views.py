@@ -12,6 +12,8 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.pdfgen import canvas
 
+from kisan_sathi.pdf_styles import get_pdf_fonts
+
 from .models import Analysis, AnalysisImage
 from .serializers import AnalysisSerializer
 
@@ -322,6 +324,7 @@ class ReportPDFView(APIView):
             return Response({"success": False, "message": "Report not found"}, status=status.HTTP_404_NOT_FOUND)
 
         # Build simple PDF
+        fonts = get_pdf_fonts()
         buffer = BytesIO()
         p = canvas.Canvas(buffer, pagesize=A4)
         width, height = A4
@@ -330,11 +333,11 @@ class ReportPDFView(APIView):
         left = 20 * mm
         line = top
 
-        p.setFont("Helvetica-Bold", 16)
+        p.setFont(fonts.bold, 16)
         p.drawString(left, line, "Kisan Sathi - AI Crop Detector Report")
         line -= 10 * mm
 
-        p.setFont("Helvetica", 10)
+        p.setFont(fonts.regular, 10)
         p.drawString(left, line, f"Crop Type: {analysis.crop_type or '-'}")
         line -= 6 * mm
         p.drawString(left, line, f"Date: {analysis.created_at.strftime('%Y-%m-%d %H:%M')}")
@@ -342,29 +345,29 @@ class ReportPDFView(APIView):
 
         items = (analysis.result or {}).get("items", [])
         for idx, item in enumerate(items):
-            p.setFont("Helvetica-Bold", 12)
+            p.setFont(fonts.bold, 12)
             p.drawString(left, line, f"Image {idx + 1}")
             line -= 6 * mm
 
-            p.setFont("Helvetica", 10)
+            p.setFont(fonts.regular, 10)
             p.drawString(left, line, f"Disease: {item.get('disease', {}).get('en', '-')}")
             line -= 5 * mm
             p.drawString(left, line, f"Confidence: {item.get('confidence', '-')}%  Severity: {item.get('severity', '-').upper()}")
             line -= 6 * mm
 
             # Cause
-            p.setFont("Helvetica-Bold", 11)
+            p.setFont(fonts.bold, 11)
             p.drawString(left, line, "Cause")
             line -= 5 * mm
-            p.setFont("Helvetica", 10)
+            p.setFont(fonts.regular, 10)
             p.drawString(left, line, item.get('cause', {}).get('en', '-'))
             line -= 6 * mm
 
             # Treatment
-            p.setFont("Helvetica-Bold", 11)
+            p.setFont(fonts.bold, 11)
             p.drawString(left, line, "Treatment")
             line -= 5 * mm
-            p.setFont("Helvetica", 10)
+            p.setFont(fonts.regular, 10)
             for section in ("immediate", "chemical", "organic"):
                 values = item.get("treatment", {}).get(section, {}).get("en", [])
                 if values:
@@ -374,10 +377,10 @@ class ReportPDFView(APIView):
                         p.drawString(left + 6 * mm, line, f"• {val}")
                         line -= 5 * mm
             # Prevention
-            p.setFont("Helvetica-Bold", 11)
+            p.setFont(fonts.bold, 11)
             p.drawString(left, line, "Prevention")
             line -= 5 * mm
-            p.setFont("Helvetica", 10)
+            p.setFont(fonts.regular, 10)
             for val in item.get("prevention", {}).get("en", [])[:6]:
                 p.drawString(left + 6 * mm, line, f"• {val}")
                 line -= 5 * mm
@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (
     ExpenseCategory, Expense, Crop, Income, InventoryCategory, 
     InventoryItem, CropPlan, LivestockType, Livestock, 
-    VaccinationRecord, Loan, EMIPayment
+    VaccinationRecord, Loan, EMIPayment, FarmerMonthlyLedger, ReportExportJob,
+    InventoryMovement
 )
 
 @admin.register(ExpenseCategory)
@@ -13,10 +14,14 @@ class ExpenseCategoryAdmin(admin.ModelAdmin):
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('farmer', 'category', 'amount', 'date', 'created_at')
-    list_filter = ('category', 'date', 'created_at')
+    list_filter = ('is_deleted', 'category', 'date', 'created_at')
     search_fields = ('farmer__username', 'category__name', 'notes')
     date_hierarchy = 'date'
 
+    def get_queryset(self, request):
+        # Show soft-deleted rows too; is_deleted is in the list filter
+        return self.model.objects.with_deleted()
+
 @admin.register(Crop)
 class CropAdmin(admin.ModelAdmin):
     list_display = ('name', 'variety', 'season', 'created_at')
@@ -26,10 +31,14 @@ class CropAdmin(admin.ModelAdmin):
 @admin.register(Income)
 class IncomeAdmin(admin.ModelAdmin):
     list_display = ('farmer', 'crop', 'quantity', 'rate_per_unit', 'total_amount', 'sale_date')
-    list_filter = ('crop', 'payment_status', 'sale_date')
+    list_filter = ('is_deleted', 'crop', 'payment_status', 'sale_date')
     search_fields = ('farmer__username', 'crop__name', 'buyer_name')
     date_hierarchy = 'sale_date'
 
+    def get_queryset(self, request):
+        # Show soft-deleted rows too; is_deleted is in the list filter
+        return self.model.objects.with_deleted()
+
 @admin.register(InventoryCategory)
 class InventoryCategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'description')
@@ -45,6 +54,23 @@ class InventoryItemAdmin(admin.ModelAdmin):
         return obj.is_low_stock
     is_low_stock.boolean = True
 
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ('item', 'farmer', 'movement_type', 'quantity', 'stock_after', 'created_at')
+    list_filter = ('movement_type', 'created_at')
+    search_fields = ('item__name', 'farmer__username', 'notes')
+    list_select_related = ('item', 'farmer')
+
+    # Append-only: movements are written by the stock APIs
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(CropPlan)
 class CropPlanAdmin(admin.ModelAdmin):
     list_display = ('farmer', 'crop', 'planned_area', 'planting_date', 'status')
@@ -82,4 +108,17 @@ class EMIPaymentAdmin(admin.ModelAdmin):
     list_display = ('loan', 'payment_date', 'amount_paid', 'payment_method')
     list_filter = ('payment_method', 'payment_date')
     search_fields = ('loan__farmer__username', 'loan__lender_name', 'transaction_reference')
-    date_hierarchy = 'payment_date'
\ No newline at end of file
+    date_hierarchy = 'payment_date'
+
+@admin.register(FarmerMonthlyLedger)
+class FarmerMonthlyLedgerAdmin(admin.ModelAdmin):
+    list_display = ('farmer', 'year', 'month', 'entry_type', 'category', 'crop', 'total_amount', 'entry_count')
+    list_filter = ('entry_type', 'year')
+    search_fields = ('farmer__username',)
+    readonly_fields = ('farmer', 'year', 'month', 'entry_type', 'category', 'crop', 'total_amount', 'entry_count', 'updated_at')
+
+@admin.register(ReportExportJob)
+class ReportExportJobAdmin(admin.ModelAdmin):
+    list_display = ('farmer', 'report_type', 'status', 'created_at', 'completed_at')
+    list_filter = ('report_type', 'status')
+    search_fields = ('farmer__username',)
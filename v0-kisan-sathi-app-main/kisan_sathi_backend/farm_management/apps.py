@@ -5,3 +5,8 @@ class FarmManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'farm_management'
     verbose_name = 'Farm Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from kisan_sathi.pdf_styles import warm_pdf_registry
+        warm_pdf_registry()
@@ -0,0 +1,92 @@
+"""
+Stock movements for InventoryItem
+
+Stock is taken out with a conditional F() UPDATE (... WHERE current_stock >= qty),
+so concurrent uses cannot oversell an item, and only the stock columns are
+written. Every change is appended to InventoryMovement, and the same UPDATE
+keeps InventoryItem.low_stock_since current so low-stock lists are an index
+lookup instead of a current_stock <= minimum_stock scan.
+"""
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InventoryItem, InventoryMovement
+
+
+class InsufficientStock(Exception):
+    """Raised when one or more items do not have the requested quantity"""
+
+    def __init__(self, items):
+        self.items = items
+        super().__init__(', '.join(item.name for item in items))
+
+
+def use_stock(items, notes=''):
+    """
+    Take stock out of several items in one transaction
+
+    Args:
+        items: List of (InventoryItem, Decimal quantity) pairs, one per item
+        notes: Note stored on every movement
+
+    Returns:
+        list: The InventoryMovement rows, in the order of items
+
+    Raises:
+        InsufficientStock: If any item is short; nothing is changed
+    """
+    now = timezone.now()
+    short = []
+    with transaction.atomic():
+        for item, quantity in items:
+            updated = InventoryItem.objects.filter(
+                pk=item.pk, current_stock__gte=quantity
+            ).update(
+                current_stock=F('current_stock') - quantity,
+                # The right-hand side sees the old stock, so compare before subtracting
+                low_stock_since=Case(
+                    When(current_stock__lte=F('minimum_stock') + quantity,
+                         then=Coalesce('low_stock_since', now)),
+                    default=None,
+                ),
+                updated_at=now,
+            )
+            if not updated:
+                short.append(item)
+        if short:
+            raise InsufficientStock(short)
+
+        current = InventoryItem.objects.in_bulk([item.pk for item, _ in items])
+        movements = []
+        for item, quantity in items:
+            fresh = current[item.pk]
+            item.current_stock = fresh.current_stock
+            item.low_stock_since = fresh.low_stock_since
+            item.updated_at = now
+            movements.append(InventoryMovement(
+                item=item, farmer_id=item.farmer_id, movement_type='use',
+                quantity=-quantity, stock_after=fresh.current_stock, notes=notes
+            ))
+        return InventoryMovement.objects.bulk_create(movements)
+
+
+def record_stock_changes(changes):
+    """
+    Append movements for stock set directly by creating or editing items
+
+    Args:
+        changes: Iterable of (InventoryItem, previous stock) pairs; previous
+            is None for new items, which get an opening movement
+    """
+    movements = []
+    for item, previous in changes:
+        if previous is not None and item.current_stock == previous:
+            continue
+        movements.append(InventoryMovement(
+            item=item, farmer_id=item.farmer_id,
+            movement_type='opening' if previous is None else 'adjustment',
+            quantity=item.current_stock - (previous or 0), stock_after=item.current_stock
+        ))
+    InventoryMovement.objects.bulk_create(movements)
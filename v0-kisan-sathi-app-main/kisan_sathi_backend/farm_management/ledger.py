@@ -0,0 +1,192 @@
+"""
+Incremental maintenance of the FarmerMonthlyLedger rollup
+
+Every non-deleted Expense/Income row contributes its amount to exactly one
+ledger bucket (farmer, year, month, category/crop). Writes apply the
+difference between the old and new contribution with F() updates, so the
+dashboard endpoints never have to scan a farmer's full history.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from .models import Expense, Income, FarmerMonthlyLedger
+
+# model -> (entry_type, date field, amount field, bucket field)
+LEDGER_SOURCES = {
+    Expense: ('expense', 'date', 'amount', 'category'),
+    Income: ('income', 'sale_date', 'total_amount', 'crop'),
+}
+
+
+def ledger_contribution(instance):
+    """
+    Return the (bucket key, amount) an Expense/Income row adds to the ledger
+
+    Returns None for soft-deleted rows, which contribute nothing.
+    """
+    if instance.is_deleted:
+        return None
+    entry_type, date_field, amount_field, bucket_field = LEDGER_SOURCES[type(instance)]
+    entry_date = getattr(instance, date_field)
+    key = (
+        instance.farmer_id, entry_date.year, entry_date.month,
+        entry_type, getattr(instance, f'{bucket_field}_id')
+    )
+    return key, getattr(instance, amount_field)
+
+
+def add_contribution(deltas, instance, sign=1):
+    """Accumulate sign * contribution of instance into a deltas dict"""
+    contribution = ledger_contribution(instance)
+    if contribution is None:
+        return
+    key, amount = contribution
+    amount_delta, count_delta = deltas[key]
+    deltas[key] = (amount_delta + sign * amount, count_delta + sign)
+
+
+def new_deltas():
+    """Empty bucket -> (amount delta, count delta) accumulator"""
+    return defaultdict(lambda: (Decimal('0'), 0))
+
+
+def apply_deltas(deltas):
+    """Apply accumulated bucket deltas with one F() update per touched bucket"""
+    now = timezone.now()
+    with transaction.atomic():
+        for key, (amount_delta, count_delta) in deltas.items():
+            if not amount_delta and not count_delta:
+                continue
+            farmer_id, year, month, entry_type, bucket_id = key
+            bucket_field = 'category_id' if entry_type == 'expense' else 'crop_id'
+            lookup = {
+                'farmer_id': farmer_id, 'year': year, 'month': month,
+                'entry_type': entry_type, bucket_field: bucket_id,
+            }
+            updates = {
+                'total_amount': F('total_amount') + amount_delta,
+                'entry_count': F('entry_count') + count_delta,
+                'updated_at': now,
+            }
+            if FarmerMonthlyLedger.objects.filter(**lookup).update(**updates):
+                continue
+            if count_delta <= 0:
+                # Nothing left to subtract from; the bucket has already gone
+                continue
+            try:
+                with transaction.atomic():
+                    FarmerMonthlyLedger.objects.create(
+                        total_amount=amount_delta, entry_count=count_delta, **lookup
+                    )
+            except IntegrityError:
+                # A concurrent writer created the bucket first
+                FarmerMonthlyLedger.objects.filter(**lookup).update(**updates)
+
+
+def apply_row_changes(previous=(), current=()):
+    """
+    Move the ledger from the previous to the current state of a batch of rows
+
+    Bulk writes skip the model signals, so the bulk endpoints call this once
+    per batch: one F() update per touched bucket instead of one per row.
+    """
+    deltas = new_deltas()
+    for instance in previous:
+        add_contribution(deltas, instance, sign=-1)
+    for instance in current:
+        add_contribution(deltas, instance)
+    apply_deltas(deltas)
+
+
+def rebuild_ledger(farmer=None):
+    """
+    Recompute the ledger from Expense and Income with one grouped query each
+
+    Args:
+        farmer: Limit the rebuild to one farmer (default: everyone)
+
+    Returns:
+        int: Number of ledger rows written
+    """
+    rows = []
+    for model, (entry_type, date_field, amount_field, bucket_field) in LEDGER_SOURCES.items():
+        queryset = model.objects.all()
+        if farmer is not None:
+            queryset = queryset.filter(farmer=farmer)
+        grouped = queryset.annotate(
+            year=ExtractYear(date_field),
+            month=ExtractMonth(date_field)
+        ).values('farmer_id', 'year', 'month', f'{bucket_field}_id').annotate(
+            total=Sum(amount_field),
+            count=Count('pk')
+        ).order_by()
+        for row in grouped:
+            rows.append(FarmerMonthlyLedger(
+                farmer_id=row['farmer_id'],
+                year=row['year'],
+                month=row['month'],
+                entry_type=entry_type,
+                total_amount=row['total'],
+                entry_count=row['count'],
+                **{f'{bucket_field}_id': row[f'{bucket_field}_id']}
+            ))
+
+    with transaction.atomic():
+        existing = FarmerMonthlyLedger.objects.all()
+        if farmer is not None:
+            existing = existing.filter(farmer=farmer)
+        existing.delete()
+        FarmerMonthlyLedger.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def ledger_totals(farmer, year):
+    """Total income and expenses for a farmer's year as {'income': ..., 'expense': ...}"""
+    totals = {'income': Decimal('0'), 'expense': Decimal('0')}
+    rows = FarmerMonthlyLedger.objects.filter(
+        farmer=farmer, year=year
+    ).values('entry_type').annotate(total=Sum('total_amount')).order_by()
+    for row in rows:
+        totals[row['entry_type']] = row['total'] or Decimal('0')
+    return totals
+
+
+def ledger_totals_by_period(farmer, year, granularity):
+    """
+    Income and expense totals keyed by period start date
+
+    Only month and quarter granularity can be served from the monthly ledger.
+    """
+    totals = {'income': {}, 'expense': {}}
+    rows = FarmerMonthlyLedger.objects.filter(
+        farmer=farmer, year=year
+    ).values('entry_type', 'month').annotate(total=Sum('total_amount')).order_by()
+    for row in rows:
+        month = row['month']
+        if granularity == 'quarter':
+            month = (month - 1) // 3 * 3 + 1
+        start = date(int(year), month, 1)
+        bucket = totals[row['entry_type']]
+        bucket[start] = bucket.get(start, Decimal('0')) + (row['total'] or Decimal('0'))
+    return totals
+
+
+def ledger_breakdown(farmer, year, entry_type):
+    """
+    Per-category (expense) or per-crop (income) totals for a farmer's year
+
+    Rows have the same shape as the old raw-table queries:
+    {'category__name': ..., 'total_amount': ...} or {'crop__name': ..., 'total_amount': ...}
+    """
+    name_field = 'category__name' if entry_type == 'expense' else 'crop__name'
+    return FarmerMonthlyLedger.objects.filter(
+        farmer=farmer, year=year, entry_type=entry_type, entry_count__gt=0
+    ).values(name_field).annotate(
+        total_amount=Sum('total_amount')
+    ).order_by('-total_amount')
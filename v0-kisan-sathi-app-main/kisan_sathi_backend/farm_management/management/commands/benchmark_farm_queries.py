@@ -0,0 +1,160 @@
+from datetime import date, timedelta
+from decimal import Decimal
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncWeek
+
+from farm_management.models import Crop, Expense, ExpenseCategory, Income
+from farm_management.pagination import ExpensePagination, IncomePagination
+
+SEED_BATCH_SIZE = 5000
+
+# Indexes as they were before the soft-delete manager, for the "before" run
+LEGACY_INDEXES = {
+    Expense: models.Index(fields=['farmer', '-date', '-created_at', '-id'], name='expense_keyset_idx'),
+    Income: models.Index(fields=['farmer', '-sale_date', '-created_at', '-id'], name='income_keyset_idx'),
+}
+
+
+def dashboard_queries(farmer, year, legacy):
+    """
+    (label, queryset) pairs for the queries behind the dashboard and lists
+
+    legacy=True filters with is_deleted=False on the base manager, as the
+    views did before SoftDeleteManager.
+    """
+    if legacy:
+        expenses = Expense._base_manager.filter(farmer=farmer, is_deleted=False)
+        incomes = Income._base_manager.filter(farmer=farmer, is_deleted=False)
+        deleted = Expense._base_manager.filter(farmer=farmer, is_deleted=True)
+    else:
+        expenses = Expense.objects.filter(farmer=farmer)
+        incomes = Income.objects.filter(farmer=farmer)
+        deleted = Expense.objects.only_deleted().filter(farmer=farmer)
+
+    start, end = date(year, 1, 1), date(year, 12, 31)
+    return [
+        ('expense total (year)', expenses.filter(date__range=(start, end))
+            .values('farmer').annotate(total=Sum('amount')).order_by()),
+        ('income total (year)', incomes.filter(sale_date__range=(start, end))
+            .values('farmer').annotate(total=Sum('total_amount')).order_by()),
+        ('weekly expense chart', expenses.filter(date__range=(start, end))
+            .annotate(period=TruncWeek('date')).values('period')
+            .annotate(total=Sum('amount')).order_by()),
+        ('expense list page', expenses.order_by(*ExpensePagination.ordering)[:21]),
+        ('income list page', incomes.order_by(*IncomePagination.ordering)[:21]),
+        ('deleted expense count', deleted.values('farmer').annotate(count=Count('pk')).order_by()),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway Expense/Income dataset and compares dashboard query plans '
+        'and timings before and after the soft-delete indexes. Everything is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Expense + income rows to seed')
+        parser.add_argument('--farmers', type=int, default=500, help='Farmers to spread the rows over')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query (best is reported)')
+
+    def handle(self, *args, **options):
+        rows = max(options['rows'], 1)
+        farmer_count = max(options['farmers'], 1)
+
+        # SQLite only allows schema edits inside a transaction with FK checks off
+        connection.disable_constraint_checking()
+        try:
+            with transaction.atomic():
+                farmer = self.seed(rows, farmer_count)
+                year = date.today().year - 1
+                self.analyze()
+
+                after = self.measure(farmer, year, legacy=False, repeat=options['repeat'])
+                self.use_legacy_indexes()
+                self.analyze()
+                before = self.measure(farmer, year, legacy=True, repeat=options['repeat'])
+
+                self.report(before, after)
+                transaction.set_rollback(True)
+        finally:
+            connection.enable_constraint_checking()
+
+        self.stdout.write(self.style.SUCCESS('Benchmark data rolled back'))
+
+    def seed(self, rows, farmer_count):
+        """Create farmers and rows (10% soft-deleted); return the farmer to query"""
+        self.stdout.write(f'Seeding {rows} rows over {farmer_count} farmers...')
+        started = time.perf_counter()
+        rng = random.Random(42)
+
+        User = get_user_model()
+        farmers = User.objects.bulk_create(
+            User(username=f'bench-{i}', phone=f'+91700{i:07d}', email=f'bench-{i}@example.com',
+                 first_name='Bench', district='Bench', taluk='Bench', village='Bench', password='!')
+            for i in range(farmer_count)
+        )
+        category = ExpenseCategory.objects.create(name='Benchmark category')
+        crop = Crop.objects.create(name='Benchmark crop', season='kharif')
+        first_day = date(date.today().year - 3, 1, 1)
+
+        def day():
+            return first_day + timedelta(days=rng.randrange(3 * 365))
+
+        expense_rows = rows * 2 // 3
+        for offset in range(0, expense_rows, SEED_BATCH_SIZE):
+            Expense.objects.bulk_create([
+                Expense(farmer=rng.choice(farmers), category=category,
+                        amount=Decimal(rng.randrange(100, 50000)), date=day(),
+                        is_deleted=rng.random() < 0.1)
+                for _ in range(min(SEED_BATCH_SIZE, expense_rows - offset))
+            ])
+        income_rows = rows - expense_rows
+        for offset in range(0, income_rows, SEED_BATCH_SIZE):
+            Income.objects.bulk_create([
+                Income(farmer=rng.choice(farmers), crop=crop, quantity=Decimal('10'), unit='quintal',
+                       rate_per_unit=Decimal('2000'), total_amount=Decimal('20000'),
+                       buyer_name='Benchmark', sale_date=day(), is_deleted=rng.random() < 0.1)
+                for _ in range(min(SEED_BATCH_SIZE, income_rows - offset))
+            ])
+
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+        return farmers[0]
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def use_legacy_indexes(self):
+        """Replace the soft-delete indexes with the ones that existed before"""
+        with connection.schema_editor(atomic=False) as editor:
+            for model, legacy_index in LEGACY_INDEXES.items():
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+                editor.add_index(model, legacy_index)
+
+    def measure(self, farmer, year, legacy, repeat):
+        results = {}
+        for label, queryset in dashboard_queries(farmer, year, legacy):
+            plan = queryset.explain().replace('\n', '\n' + ' ' * 22)
+            best = None
+            for _ in range(max(repeat, 1)):
+                started = time.perf_counter()
+                list(queryset.all())
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (plan, best * 1000)
+        return results
+
+    def report(self, before, after):
+        for label in after:
+            before_plan, before_ms = before[label]
+            after_plan, after_ms = after[label]
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f'  before: {before_ms:9.2f} ms  {before_plan}')
+            self.stdout.write(f'  after:  {after_ms:9.2f} ms  {after_plan}')
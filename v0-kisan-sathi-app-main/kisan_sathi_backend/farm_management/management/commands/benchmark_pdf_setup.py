@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+from kisan_sathi.pdf_styles import get_pdf_fonts, load_pdf_fonts, pdf_style
+
+
+def uncached_setup():
+    """Per-PDF font and style setup as the report builders used to do it"""
+    font_name = load_pdf_fonts().regular
+    styles = getSampleStyleSheet()
+    ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#2c3e50'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName=font_name
+    )
+    ParagraphStyle('InfoStyle', parent=styles['Normal'], fontName=font_name)
+
+
+def registry_setup():
+    """Per-PDF font and style setup through the shared registry"""
+    font_name = get_pdf_fonts().regular
+    pdf_style(
+        'CustomTitle',
+        parent='Heading1',
+        fontSize=24,
+        textColor=colors.HexColor('#2c3e50'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName=font_name
+    )
+    pdf_style('InfoStyle', parent='Normal', fontName=font_name)
+
+
+class Command(BaseCommand):
+    help = 'Measures per-PDF font and style setup cost with and without the shared registry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='PDF setups to time per variant')
+
+    def handle(self, *args, **options):
+        iterations = max(options['iterations'], 1)
+        for label, setup in (('uncached', uncached_setup), ('registry', registry_setup)):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                setup()
+            per_pdf = (time.perf_counter() - started) / iterations * 1000
+            self.stdout.write(f'{label:>9}: {per_pdf:.3f} ms per PDF ({iterations} iterations)')
+
+        font = get_pdf_fonts()
+        self.stdout.write(self.style.SUCCESS(f'Fonts in use: {font.regular} / {font.bold}'))
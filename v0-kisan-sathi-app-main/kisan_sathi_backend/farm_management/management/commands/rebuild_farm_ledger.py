@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from farm_management.ledger import rebuild_ledger
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the FarmerMonthlyLedger rollup from Expense and Income records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farmer', type=int, help='Only rebuild the ledger of this farmer id')
+
+    def handle(self, *args, **options):
+        farmer = None
+        if options['farmer'] is not None:
+            User = get_user_model()
+            try:
+                farmer = User.objects.get(pk=options['farmer'])
+            except User.DoesNotExist:
+                raise CommandError(f"Farmer {options['farmer']} does not exist")
+
+        self.stdout.write('Rebuilding farm ledger...')
+        row_count = rebuild_ledger(farmer=farmer)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {row_count} ledger rows'))
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_ledger(apps, schema_editor):
+    from django.db.models import Count, Sum
+    from django.db.models.functions import ExtractMonth, ExtractYear
+
+    FarmerMonthlyLedger = apps.get_model('farm_management', 'FarmerMonthlyLedger')
+    sources = [
+        (apps.get_model('farm_management', 'Expense'), 'expense', 'date', 'amount', 'category_id'),
+        (apps.get_model('farm_management', 'Income'), 'income', 'sale_date', 'total_amount', 'crop_id'),
+    ]
+    rows = []
+    for model, entry_type, date_field, amount_field, bucket_field in sources:
+        grouped = model.objects.filter(is_deleted=False).annotate(
+            year=ExtractYear(date_field),
+            month=ExtractMonth(date_field)
+        ).values('farmer_id', 'year', 'month', bucket_field).annotate(
+            total=Sum(amount_field),
+            count=Count('pk')
+        ).order_by()
+        for row in grouped:
+            rows.append(FarmerMonthlyLedger(
+                farmer_id=row['farmer_id'], year=row['year'], month=row['month'],
+                entry_type=entry_type, total_amount=row['total'], entry_count=row['count'],
+                **{bucket_field: row[bucket_field]}
+            ))
+    FarmerMonthlyLedger.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('farm_management', '0002_auto_20251104_0106'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmerMonthlyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('entry_type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=10)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='farm_management.expensecategory')),
+                ('crop', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='farm_management.crop')),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-year', '-month'],
+                'indexes': [models.Index(fields=['farmer', 'year', 'entry_type'], name='farm_manage_farmer__cea0a7_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='farmermonthlyledger',
+            constraint=models.UniqueConstraint(condition=models.Q(('entry_type', 'expense')), fields=('farmer', 'year', 'month', 'category'), name='unique_expense_ledger_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='farmermonthlyledger',
+            constraint=models.UniqueConstraint(condition=models.Q(('entry_type', 'income')), fields=('farmer', 'year', 'month', 'crop'), name='unique_income_ledger_bucket'),
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0004_reportexportjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cropplan',
+            index=models.Index(fields=['farmer', '-planting_date', '-id'], name='cropplan_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emipayment',
+            index=models.Index(fields=['loan', '-payment_date', '-id'], name='emipayment_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['farmer', '-date', '-created_at', '-id'], name='expense_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['farmer', '-sale_date', '-created_at', '-id'], name='income_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['farmer', 'name', 'id'], name='inventory_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livestock',
+            index=models.Index(fields=['farmer', '-created_at', '-id'], name='livestock_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['farmer', '-loan_date', '-id'], name='loan_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaccinationrecord',
+            index=models.Index(fields=['livestock', '-vaccination_date', '-id'], name='vaccination_keyset_idx'),
+        ),
+    ]
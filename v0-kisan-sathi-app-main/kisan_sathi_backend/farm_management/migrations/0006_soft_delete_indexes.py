@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_keyset_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='income',
+            name='income_keyset_idx',
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['farmer', 'is_deleted', '-date', '-created_at', '-id'], name='expense_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['farmer', 'is_deleted', 'date', 'amount'], name='expense_farmer_live_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['farmer', 'is_deleted', '-sale_date', '-created_at', '-id'], name='income_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['farmer', 'is_deleted', 'sale_date', 'total_amount'], name='income_farmer_live_date_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_stock_state(apps, schema_editor):
+    from django.db.models import F
+    from django.utils import timezone
+
+    InventoryItem = apps.get_model('farm_management', 'InventoryItem')
+    InventoryMovement = apps.get_model('farm_management', 'InventoryMovement')
+    InventoryItem.objects.filter(current_stock__lte=F('minimum_stock')).update(low_stock_since=timezone.now())
+    # Existing stock becomes each item's opening balance
+    InventoryMovement.objects.bulk_create(
+        (
+            InventoryMovement(item_id=item.id, farmer_id=item.farmer_id, movement_type='opening',
+                              quantity=item.current_stock, stock_after=item.current_stock)
+            for item in InventoryItem.objects.only('id', 'farmer_id', 'current_stock').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('farm_management', '0006_soft_delete_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('opening', 'Opening Stock'), ('use', 'Use'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('stock_after', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('notes', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='low_stock_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['farmer', 'low_stock_since'], name='inventory_low_stock_idx'),
+        ),
+        migrations.AddField(
+            model_name='inventorymovement',
+            name='farmer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='inventorymovement',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='farm_management.inventoryitem'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorymovement',
+            index=models.Index(fields=['item', '-created_at', '-id'], name='movement_item_idx'),
+        ),
+        migrations.RunPython(backfill_stock_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,216 @@
+"""
+ViewSet mixins for Farm Management APIs
+"""
+import copy
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .ledger import apply_row_changes
+from .models import SoftDeleteMixin
+
+
+class RelatedFieldsMixin:
+    """
+    Join the relations a ViewSet's serializer reads
+
+    ViewSets declare the relations behind dotted serializer sources such as
+    ``category.name`` in ``select_related_fields`` (foreign keys, joined in
+    the same query) and ``prefetch_related_fields`` (reverse/many relations).
+    They are applied in filter_queryset(), so list, retrieve and any custom
+    action that serializes ``self.filter_queryset(self.get_queryset())`` run
+    a fixed number of queries regardless of row count.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+
+class BulkWriteMixin:
+    """
+    ``/bulk/`` action for farmer-owned rows: POST creates, PATCH updates and
+    DELETE removes a list of rows
+
+    POST takes a list of objects, PATCH a list of objects with ``id`` and
+    DELETE a list of ids. Every row is validated before anything is written;
+    if any row fails the response lists ``{'index', 'errors'}`` per bad row
+    and nothing is saved. Valid batches are written with one bulk_create,
+    bulk_update or UPDATE inside a single transaction.
+
+    Model save() and signals do not run on this path: ViewSets set fields
+    that save() would compute in prepare_bulk_instance() (listing them in
+    ``bulk_computed_fields``) and do per-batch follow-up work in
+    bulk_written(); ``bulk_updates_ledger`` adjusts FarmerMonthlyLedger there.
+    """
+    bulk_max_rows = 500
+    bulk_item_name = 'records'
+    bulk_computed_fields = ()
+    bulk_updates_ledger = False
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return self.bulk_error('Expected a non-empty list')
+        if len(rows) > self.bulk_max_rows:
+            return self.bulk_error(f'At most {self.bulk_max_rows} rows per request')
+
+        if request.method == 'POST':
+            return self.bulk_create(rows)
+        if request.method == 'PATCH':
+            return self.bulk_update(rows)
+        return self.bulk_destroy(rows)
+
+    def prepare_bulk_instance(self, instance):
+        """Hook for the per-row work save() would do"""
+
+    def bulk_written(self, previous, current):
+        """
+        Hook run inside the batch's transaction after it is written
+
+        previous holds the rows as they were (empty for creates) and current
+        as they are now (empty for deletes).
+        """
+        if self.bulk_updates_ledger:
+            apply_row_changes(previous=previous, current=current)
+
+    def bulk_create(self, rows):
+        serializer = self.get_serializer(data=rows, many=True)
+        if not serializer.is_valid():
+            return self.bulk_invalid(serializer.errors)
+
+        model = self.get_queryset().model
+        instances = []
+        for attrs in serializer.validated_data:
+            instance = model(farmer=self.request.user, **attrs)
+            self.prepare_bulk_instance(instance)
+            instances.append(instance)
+
+        with transaction.atomic():
+            model.objects.bulk_create(instances)
+            self.bulk_written([], instances)
+
+        return Response({
+            'success': True,
+            'message': f'{len(instances)} {self.bulk_item_name} added successfully',
+            'data': self.get_serializer(self.bulk_result_rows(instances), many=True).data
+        }, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, rows):
+        ids = self.bulk_ids(row.get('id') if isinstance(row, dict) else None for row in rows)
+        errors = [{} for _ in rows]
+        now = timezone.now()
+
+        with transaction.atomic():
+            existing = self.get_queryset().select_for_update().in_bulk(
+                [pk for pk in ids if pk is not None]
+            )
+            model = self.get_queryset().model
+            auto_now_fields = [
+                field.name for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)
+            ]
+            fields = set(self.bulk_computed_fields) | set(auto_now_fields)
+            previous, instances, seen = [], [], set()
+
+            for index, (pk, row) in enumerate(zip(ids, rows)):
+                if pk is None:
+                    errors[index] = {'id': ['This field is required.']}
+                    continue
+                if pk in seen:
+                    errors[index] = {'id': ['Duplicate id in this request']}
+                    continue
+                seen.add(pk)
+                instance = existing.get(pk)
+                if instance is None:
+                    errors[index] = {'id': ['Not found']}
+                    continue
+                serializer = self.get_serializer(instance, data=row, partial=True)
+                if not serializer.is_valid():
+                    errors[index] = serializer.errors
+                    continue
+                previous.append(copy.copy(instance))
+                for name, value in serializer.validated_data.items():
+                    setattr(instance, name, value)
+                    fields.add(name)
+                for name in auto_now_fields:
+                    setattr(instance, name, now)
+                self.prepare_bulk_instance(instance)
+                instances.append(instance)
+
+            if any(errors):
+                return self.bulk_invalid(errors)
+
+            model.objects.bulk_update(instances, sorted(fields))
+            self.bulk_written(previous, instances)
+
+        return Response({
+            'success': True,
+            'message': f'{len(instances)} {self.bulk_item_name} updated successfully',
+            'data': self.get_serializer(self.bulk_result_rows(instances), many=True).data
+        })
+
+    def bulk_destroy(self, rows):
+        ids = self.bulk_ids(rows)
+        errors = [{} for _ in rows]
+
+        with transaction.atomic():
+            queryset = self.get_queryset()
+            existing = queryset.select_for_update().in_bulk([pk for pk in ids if pk is not None])
+            for index, pk in enumerate(ids):
+                if pk not in existing:
+                    errors[index] = {'id': ['Not found']}
+            if any(errors):
+                return self.bulk_invalid(errors)
+
+            model = queryset.model
+            targets = model._base_manager.filter(pk__in=list(existing))
+            if issubclass(model, SoftDeleteMixin):
+                now = timezone.now()
+                targets.update(is_deleted=True, deleted_at=now, updated_at=now)
+            else:
+                targets.delete()
+            self.bulk_written(list(existing.values()), [])
+
+        return Response({
+            'success': True,
+            'message': f'{len(existing)} {self.bulk_item_name} deleted successfully',
+            'data': {'deleted': len(existing)}
+        })
+
+    def bulk_result_rows(self, instances):
+        """Re-read written rows with the ViewSet's joins, in request order"""
+        rows = self.filter_queryset(self.get_queryset()).in_bulk([instance.pk for instance in instances])
+        return [rows[instance.pk] for instance in instances if instance.pk in rows]
+
+    @staticmethod
+    def bulk_ids(values):
+        ids = []
+        for value in values:
+            try:
+                ids.append(int(value))
+            except (TypeError, ValueError):
+                ids.append(None)
+        return ids
+
+    def bulk_invalid(self, errors):
+        return Response({
+            'success': False,
+            'message': 'Some rows are invalid; nothing was saved',
+            'errors': [{'index': index, 'errors': row} for index, row in enumerate(errors) if row]
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    def bulk_error(self, message):
+        return Response({
+            'success': False,
+            'message': message
+        }, status=status.HTTP_400_BAD_REQUEST)
@@ -1,10 +1,55 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
 
 User = get_user_model()
 
+class SoftDeleteQuerySet(models.QuerySet):
+    """QuerySet for models with is_deleted/deleted_at fields"""
+
+    # filter(is_deleted=False) compiles to "NOT is_deleted", which SQLite
+    # cannot use as an equality on the (farmer, is_deleted, date) indexes;
+    # a single-value IN keeps it an index lookup on every backend.
+    def alive(self):
+        return self.filter(is_deleted__in=[False])
+
+    def deleted(self):
+        return self.filter(is_deleted__in=[True])
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """
+    Default manager that hides soft-deleted rows
+
+    Use with_deleted() for every row or only_deleted() for the trash. Related
+    managers (farmer.expenses) inherit the filter; _base_manager does not.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().alive()
+
+    def with_deleted(self):
+        return super().get_queryset()
+
+    def only_deleted(self):
+        return super().get_queryset().deleted()
+
+
+class SoftDeleteMixin:
+    """Soft delete and restore for models with is_deleted/deleted_at fields"""
+
+    def soft_delete(self):
+        self.is_deleted = True
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['is_deleted', 'deleted_at', 'updated_at'])
+
+    def restore(self):
+        self.is_deleted = False
+        self.deleted_at = None
+        self.save(update_fields=['is_deleted', 'deleted_at', 'updated_at'])
+
 class ExpenseCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
@@ -16,7 +61,7 @@ class ExpenseCategory(models.Model):
     class Meta:
         verbose_name_plural = "Expense Categories"
 
-class Expense(models.Model):
+class Expense(SoftDeleteMixin, models.Model):
     farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expenses')
     category = models.ForeignKey(ExpenseCategory, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
@@ -28,11 +73,18 @@ class Expense(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SoftDeleteManager()
+
     def __str__(self):
         return f"{self.farmer.username} - {self.category.name} - ₹{self.amount}"
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['farmer', 'is_deleted', '-date', '-created_at', '-id'], name='expense_keyset_idx'),
+            # Covers the dashboard/summary SUM(amount) range scans
+            models.Index(fields=['farmer', 'is_deleted', 'date', 'amount'], name='expense_farmer_live_date_idx'),
+        ]
 
 class Crop(models.Model):
     name = models.CharField(max_length=100)
@@ -51,7 +103,7 @@ class Crop(models.Model):
     class Meta:
         unique_together = ['name', 'variety']
 
-class Income(models.Model):
+class Income(SoftDeleteMixin, models.Model):
     farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='incomes')
     crop = models.ForeignKey(Crop, on_delete=models.CASCADE)
     quantity = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
@@ -78,8 +130,14 @@ class Income(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def save(self, *args, **kwargs):
+    objects = SoftDeleteManager()
+
+    def calculate_total_amount(self):
+        """Set total_amount; bulk_create/bulk_update skip save(), so call this first"""
         self.total_amount = self.quantity * self.rate_per_unit
+
+    def save(self, *args, **kwargs):
+        self.calculate_total_amount()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -87,6 +145,11 @@ class Income(models.Model):
 
     class Meta:
         ordering = ['-sale_date', '-created_at']
+        indexes = [
+            models.Index(fields=['farmer', 'is_deleted', '-sale_date', '-created_at', '-id'], name='income_keyset_idx'),
+            # Covers the dashboard/summary SUM(total_amount) range scans
+            models.Index(fields=['farmer', 'is_deleted', 'sale_date', 'total_amount'], name='income_farmer_live_date_idx'),
+        ]
 
 class InventoryCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -117,6 +180,8 @@ class InventoryItem(models.Model):
     supplier_name = models.CharField(max_length=200, blank=True)
     supplier_contact = models.CharField(max_length=15, blank=True)
     expiry_date = models.DateField(blank=True, null=True)
+    # Set while current_stock <= minimum_stock; maintained by stock movements
+    low_stock_since = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -128,11 +193,52 @@ class InventoryItem(models.Model):
     def total_value(self):
         return self.current_stock * self.cost_per_unit
 
+    def sync_low_stock(self):
+        """Set low_stock_since from the current values; bulk writes call this instead of save()"""
+        if not self.is_low_stock:
+            self.low_stock_since = None
+        elif self.low_stock_since is None:
+            self.low_stock_since = timezone.now()
+
+    def save(self, *args, **kwargs):
+        self.sync_low_stock()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.name} ({self.brand})" if self.brand else self.name
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['farmer', 'name', 'id'], name='inventory_keyset_idx'),
+            models.Index(fields=['farmer', 'low_stock_since'], name='inventory_low_stock_idx'),
+        ]
+
+class InventoryMovement(models.Model):
+    """Append-only record of every change to an InventoryItem's stock"""
+    MOVEMENT_TYPES = [
+        ('opening', 'Opening Stock'),
+        ('use', 'Use'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='movements')
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inventory_movements')
+    movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPES)
+    # Signed: negative when stock goes out
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    stock_after = models.DecimalField(max_digits=10, decimal_places=2)
+    notes = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.item.name} {self.quantity:+} ({self.get_movement_type_display()})"
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['item', '-created_at', '-id'], name='movement_item_idx'),
+        ]
 
 class CropPlan(models.Model):
     farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='crop_plans')
@@ -171,6 +277,9 @@ class CropPlan(models.Model):
 
     class Meta:
         ordering = ['-planting_date']
+        indexes = [
+            models.Index(fields=['farmer', '-planting_date', '-id'], name='cropplan_keyset_idx'),
+        ]
 
 class LivestockType(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -203,6 +312,9 @@ class Livestock(models.Model):
 
     class Meta:
         unique_together = ['farmer', 'tag_number']
+        indexes = [
+            models.Index(fields=['farmer', '-created_at', '-id'], name='livestock_keyset_idx'),
+        ]
 
 class VaccinationRecord(models.Model):
     livestock = models.ForeignKey(Livestock, on_delete=models.CASCADE, related_name='vaccinations')
@@ -219,6 +331,9 @@ class VaccinationRecord(models.Model):
 
     class Meta:
         ordering = ['-vaccination_date']
+        indexes = [
+            models.Index(fields=['livestock', '-vaccination_date', '-id'], name='vaccination_keyset_idx'),
+        ]
 
 class Loan(models.Model):
     farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='loans')
@@ -250,6 +365,9 @@ class Loan(models.Model):
 
     class Meta:
         ordering = ['-loan_date']
+        indexes = [
+            models.Index(fields=['farmer', '-loan_date', '-id'], name='loan_keyset_idx'),
+        ]
 
 class EMIPayment(models.Model):
     loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='emi_payments')
@@ -272,4 +390,82 @@ class EMIPayment(models.Model):
         return f"{self.loan} - ₹{self.amount_paid} on {self.payment_date}"
 
     class Meta:
-        ordering = ['-payment_date']
\ No newline at end of file
+        ordering = ['-payment_date']
+        indexes = [
+            models.Index(fields=['loan', '-payment_date', '-id'], name='emipayment_keyset_idx'),
+        ]
+
+class FarmerMonthlyLedger(models.Model):
+    """Per-farmer monthly income/expense rollup, one row per category or crop
+
+    Maintained incrementally by farm_management.signals and rebuilt from
+    scratch with the rebuild_farm_ledger management command.
+    """
+    ENTRY_TYPES = [
+        ('income', 'Income'),
+        ('expense', 'Expense')
+    ]
+
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_ledger')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    entry_type = models.CharField(max_length=10, choices=ENTRY_TYPES)
+    category = models.ForeignKey(ExpenseCategory, on_delete=models.CASCADE, blank=True, null=True)
+    crop = models.ForeignKey(Crop, on_delete=models.CASCADE, blank=True, null=True)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entry_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.farmer.username} - {self.year}/{self.month:02d} - {self.entry_type} - ₹{self.total_amount}"
+
+    class Meta:
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['farmer', 'year', 'month', 'category'],
+                condition=models.Q(entry_type='expense'),
+                name='unique_expense_ledger_bucket'
+            ),
+            models.UniqueConstraint(
+                fields=['farmer', 'year', 'month', 'crop'],
+                condition=models.Q(entry_type='income'),
+                name='unique_income_ledger_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['farmer', 'year', 'entry_type']),
+        ]
+
+class ReportExportJob(models.Model):
+    """Background PDF export; identical requests share one cached artifact"""
+    REPORT_TYPES = [
+        ('expenses_pdf', 'Expense Report (PDF)'),
+        ('income_pdf', 'Income Report (PDF)'),
+        ('analytics_pdf', 'Analytics Report (PDF)')
+    ]
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs')
+    report_type = models.CharField(max_length=20, choices=REPORT_TYPES)
+    params = models.JSONField(default=dict, blank=True)
+    cache_key = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUSES, default='pending')
+    file = models.FileField(upload_to='reports/', blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.farmer.username} - {self.report_type} - {self.status}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['farmer', 'cache_key', 'status']),
+        ]
@@ -0,0 +1,371 @@
+"""
+PDF report builders for Farm Management exports
+
+Shared by the synchronous export views and the background report jobs.
+"""
+from datetime import timedelta
+from decimal import Decimal
+import hashlib
+import io
+import json
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.enums import TA_CENTER
+
+from kisan_sathi.pdf_styles import pdf_style
+
+from .models import Expense, Income, FarmerMonthlyLedger
+from .ledger import ledger_totals, ledger_breakdown
+from .utils import format_currency, register_unicode_fonts
+
+
+def build_expenses_pdf(farmer, start_date=None, end_date=None):
+    """Render the expense report PDF for a farmer and optional date range"""
+    # Register Unicode fonts for rupee symbol support
+    font_name = register_unicode_fonts()
+    
+    # Query expenses
+    expenses = Expense.objects.filter(farmer=farmer).select_related('category')
+    if start_date:
+        expenses = expenses.filter(date__gte=start_date)
+    if end_date:
+        expenses = expenses.filter(date__lte=end_date)
+    
+    # Create PDF
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    
+    # Title with Unicode font
+    title_style = pdf_style(
+        'CustomTitle',
+        parent='Heading1',
+        fontSize=24,
+        textColor=colors.HexColor('#2c3e50'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName=font_name
+    )
+    elements.append(Paragraph('Expense Report', title_style))
+    elements.append(Spacer(1, 12))
+    
+    # Farmer info with Unicode font
+    info_style = pdf_style(
+        'InfoStyle',
+        parent='Normal',
+        fontName=font_name
+    )
+    elements.append(Paragraph(f'<b>Farmer:</b> {farmer.get_full_name() or farmer.username}', info_style))
+    elements.append(Paragraph(f'<b>Report Date:</b> {timezone.now().strftime("%d %B %Y")}', info_style))
+    if start_date and end_date:
+        elements.append(Paragraph(f'<b>Period:</b> {start_date} to {end_date}', info_style))
+    elements.append(Spacer(1, 20))
+    
+    # Table data with formatted currency
+    data = [['Date', 'Category', 'Amount', 'Notes']]
+    total = Decimal('0')
+    
+    for expense in expenses:
+        data.append([
+            expense.date.strftime('%d-%m-%Y'),
+            expense.category.name,
+            format_currency(expense.amount),
+            expense.notes[:50] if expense.notes else '-'
+        ])
+        total += expense.amount
+    
+    # Add total row
+    data.append(['', '', f'Total: {format_currency(total)}', ''])
+    
+    # Create table with Unicode font
+    table = Table(data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 3*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ecf0f1')),
+        ('FONTNAME', (0, -1), (-1, -1), font_name),
+        ('FONTSIZE', (0, -1), (-1, -1), 11),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ]))
+    
+    elements.append(table)
+    doc.build(elements)
+    
+    return buffer.getvalue()
+
+
+def build_income_pdf(farmer, start_date=None, end_date=None):
+    """Render the income report PDF for a farmer and optional date range"""
+    # Register Unicode fonts for rupee symbol support
+    font_name = register_unicode_fonts()
+    
+    # Query income
+    income_records = Income.objects.filter(farmer=farmer).select_related('crop')
+    if start_date:
+        income_records = income_records.filter(sale_date__gte=start_date)
+    if end_date:
+        income_records = income_records.filter(sale_date__lte=end_date)
+    
+    # Create PDF
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    
+    # Title with Unicode font
+    title_style = pdf_style(
+        'CustomTitle',
+        parent='Heading1',
+        fontSize=24,
+        textColor=colors.HexColor('#27ae60'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName=font_name
+    )
+    elements.append(Paragraph('Income Report', title_style))
+    elements.append(Spacer(1, 12))
+    
+    # Farmer info with Unicode font
+    info_style = pdf_style(
+        'InfoStyle',
+        parent='Normal',
+        fontName=font_name
+    )
+    elements.append(Paragraph(f'<b>Farmer:</b> {farmer.get_full_name() or farmer.username}', info_style))
+    elements.append(Paragraph(f'<b>Report Date:</b> {timezone.now().strftime("%d %B %Y")}', info_style))
+    if start_date and end_date:
+        elements.append(Paragraph(f'<b>Period:</b> {start_date} to {end_date}', info_style))
+    elements.append(Spacer(1, 20))
+    
+    # Table data with formatted currency
+    data = [['Date', 'Crop', 'Quantity', 'Rate', 'Total', 'Buyer']]
+    total = Decimal('0')
+    
+    for income in income_records:
+        data.append([
+            income.sale_date.strftime('%d-%m-%Y'),
+            income.crop.name,
+            f'{income.quantity} {income.unit}',
+            format_currency(income.rate_per_unit),
+            format_currency(income.total_amount),
+            income.buyer_name[:20]
+        ])
+        total += income.total_amount
+    
+    # Add total row
+    data.append(['', '', '', '', f'Total: {format_currency(total)}', ''])
+    
+    # Create table with Unicode font
+    table = Table(data, colWidths=[1.2*inch, 1.5*inch, 1.2*inch, 1.2*inch, 1.5*inch, 1.5*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#27ae60')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (3, 0), (4, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ecf0f1')),
+        ('FONTNAME', (0, -1), (-1, -1), font_name),
+        ('FONTSIZE', (0, -1), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ]))
+    
+    elements.append(table)
+    doc.build(elements)
+    
+    return buffer.getvalue()
+
+
+def build_analytics_pdf(farmer, year):
+    """Render the yearly analytics PDF for a farmer"""
+    # Register Unicode fonts for rupee symbol support
+    font_name = register_unicode_fonts()
+    
+    # Get analytics data from the monthly ledger
+    totals = ledger_totals(farmer, year)
+    total_income = totals['income']
+    total_expenses = totals['expense']
+    
+    net_profit = total_income - total_expenses
+    
+    # Category-wise expenses
+    category_expenses = ledger_breakdown(farmer, year, 'expense')
+    
+    # Category-wise income (by crop)
+    category_income = ledger_breakdown(farmer, year, 'income')
+    
+    # Create PDF
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    
+    # Title with Unicode font
+    title_style = pdf_style(
+        'CustomTitle',
+        parent='Heading1',
+        fontSize=24,
+        textColor=colors.HexColor('#8e44ad'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName=font_name
+    )
+    elements.append(Paragraph(f'Farm Analytics Report - {year}', title_style))
+    elements.append(Spacer(1, 12))
+    
+    # Farmer info with Unicode font
+    info_style = pdf_style(
+        'InfoStyle',
+        parent='Normal',
+        fontName=font_name
+    )
+    elements.append(Paragraph(f'<b>Farmer:</b> {farmer.get_full_name() or farmer.username}', info_style))
+    elements.append(Paragraph(f'<b>Report Date:</b> {timezone.now().strftime("%d %B %Y")}', info_style))
+    elements.append(Spacer(1, 20))
+    
+    # Summary table with formatted currency
+    summary_data = [
+        ['Metric', 'Amount'],
+        ['Total Income', format_currency(total_income)],
+        ['Total Expenses', format_currency(total_expenses)],
+        ['Net Profit/Loss', format_currency(net_profit)]
+    ]
+    
+    summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8e44ad')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f39c12') if net_profit >= 0 else colors.HexColor('#e74c3c')),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
+        ('FONTNAME', (0, -1), (-1, -1), font_name),
+        ('FONTSIZE', (0, -1), (-1, -1), 11),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ]))
+    
+    elements.append(summary_table)
+    elements.append(Spacer(1, 30))
+    
+    # Category-wise expenses with Unicode font
+    heading_style = pdf_style(
+        'HeadingStyle',
+        parent='Heading2',
+        fontName=font_name
+    )
+    elements.append(Paragraph('<b>Expense Breakdown by Category</b>', heading_style))
+    elements.append(Spacer(1, 12))
+    
+    category_data = [['Category', 'Amount', 'Percentage']]
+    for cat in category_expenses:
+        percentage = (cat['total_amount'] / total_expenses * 100) if total_expenses > 0 else 0
+        category_data.append([
+            cat['category__name'],
+            format_currency(cat['total_amount']),
+            f'{percentage:.1f}%'
+        ])
+    
+    category_table = Table(category_data, colWidths=[2.5*inch, 2*inch, 1.5*inch])
+    category_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (2, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ]))
+    
+    elements.append(category_table)
+    elements.append(Spacer(1, 30))
+    
+    # Income Breakdown by Category with Unicode font
+    elements.append(Paragraph('<b>Income Breakdown by Category</b>', heading_style))
+    elements.append(Spacer(1, 12))
+    
+    income_data = [['Category (Crop)', 'Amount', 'Percentage']]
+    for crop in category_income:
+        percentage = (crop['total_amount'] / total_income * 100) if total_income > 0 else 0
+        income_data.append([
+            crop['crop__name'],
+            format_currency(crop['total_amount']),
+            f'{percentage:.1f}%'
+        ])
+    
+    income_table = Table(income_data, colWidths=[2.5*inch, 2*inch, 1.5*inch])
+    income_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#27ae60')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (2, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ]))
+    
+    elements.append(income_table)
+    doc.build(elements)
+    
+    return buffer.getvalue()
+
+
+def build_report(report_type, farmer, params):
+    """Render a ReportExportJob report type with its stored params"""
+    if report_type == 'analytics_pdf':
+        return build_analytics_pdf(farmer, params.get('year', timezone.now().year))
+    builder = build_expenses_pdf if report_type == 'expenses_pdf' else build_income_pdf
+    return builder(farmer, params.get('start_date'), params.get('end_date'))
+
+
+def report_filename(report_type, params):
+    """Download filename matching the synchronous export endpoints"""
+    today = timezone.now().strftime('%Y%m%d')
+    if report_type == 'analytics_pdf':
+        return f"analytics_{params.get('year')}_{today}.pdf"
+    prefix = 'expenses' if report_type == 'expenses_pdf' else 'income'
+    return f'{prefix}_{today}.pdf'
+
+
+# A pending or running job older than this is assumed lost (worker restart,
+# dropped broker message) and is no longer handed out for reuse
+REPORT_JOB_TIMEOUT = timedelta(minutes=15)
+
+
+def report_data_fingerprint(report_type, farmer, params):
+    """
+    Cheap summary of the data a report depends on
+
+    Any insert, edit, soft delete or restore bumps updated_at or the row
+    count, so an unchanged fingerprint means the cached PDF is still valid.
+    """
+    if report_type == 'analytics_pdf':
+        queryset = FarmerMonthlyLedger.objects.filter(farmer=farmer, year=params.get('year'))
+        return queryset.aggregate(count=Count('pk'), last=Max('updated_at'), total=Sum('total_amount'))
+
+    if report_type == 'expenses_pdf':
+        # Soft-deleted rows are included, so deletes change the fingerprint
+        queryset, date_field = Expense.objects.with_deleted().filter(farmer=farmer), 'date'
+    else:
+        queryset, date_field = Income.objects.with_deleted().filter(farmer=farmer), 'sale_date'
+    if params.get('start_date'):
+        queryset = queryset.filter(**{f'{date_field}__gte': params['start_date']})
+    if params.get('end_date'):
+        queryset = queryset.filter(**{f'{date_field}__lte': params['end_date']})
+    return queryset.aggregate(count=Count('pk'), last=Max('updated_at'))
+
+
+def report_cache_key(report_type, farmer, params):
+    """Hash of farmer, report type, params and data fingerprint"""
+    payload = [farmer.pk, report_type, params, report_data_fingerprint(report_type, farmer, params)]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
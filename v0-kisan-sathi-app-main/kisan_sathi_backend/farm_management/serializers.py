@@ -1,16 +1,35 @@
+from decimal import Decimal
+
+from django.utils import timezone
 from rest_framework import serializers
 from .models import (
     ExpenseCategory, Expense, Crop, Income, InventoryCategory, 
     InventoryItem, CropPlan, LivestockType, Livestock, 
-    VaccinationRecord, Loan, EMIPayment
+    VaccinationRecord, Loan, EMIPayment, ReportExportJob, InventoryMovement
 )
 
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that looks each id up once per serializer
+
+    A many=True serializer reuses one child, so a bulk batch of rows that
+    share a category/crop costs one query per distinct id, not per row.
+    """
+
+    def to_internal_value(self, data):
+        resolved = self.__dict__.setdefault('_resolved', {})
+        key = str(data)
+        if key not in resolved:
+            resolved[key] = super().to_internal_value(data)
+        return resolved[key]
+
 class ExpenseCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = ExpenseCategory
         fields = '__all__'
 
 class ExpenseSerializer(serializers.ModelSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
     category_name = serializers.CharField(source='category.name', read_only=True)
     
     class Meta:
@@ -30,6 +49,7 @@ class CropSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class IncomeSerializer(serializers.ModelSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
     crop_name = serializers.CharField(source='crop.name', read_only=True)
     
     class Meta:
@@ -49,6 +69,7 @@ class InventoryCategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class InventoryItemSerializer(serializers.ModelSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
     category_name = serializers.CharField(source='category.name', read_only=True)
     is_low_stock = serializers.BooleanField(read_only=True)
     total_value = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -58,6 +79,20 @@ class InventoryItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('farmer',)
 
+class InventoryMovementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InventoryMovement
+        fields = ('id', 'item', 'movement_type', 'quantity', 'stock_after', 'notes', 'created_at')
+        read_only_fields = fields
+
+class StockUseItemSerializer(serializers.Serializer):
+    item = serializers.IntegerField()
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
+class StockUseSerializer(serializers.Serializer):
+    items = StockUseItemSerializer(many=True, allow_empty=False, max_length=100)
+    notes = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
 class CropPlanSerializer(serializers.ModelSerializer):
     crop_name = serializers.CharField(source='crop.name', read_only=True)
     estimated_profit = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -101,9 +136,42 @@ class EMIPaymentSerializer(serializers.ModelSerializer):
         model = EMIPayment
         fields = '__all__'
 
+class ReportExportJobSerializer(serializers.ModelSerializer):
+    start_date = serializers.DateField(write_only=True, required=False)
+    end_date = serializers.DateField(write_only=True, required=False)
+    year = serializers.IntegerField(write_only=True, required=False, min_value=2000, max_value=2100)
+    
+    class Meta:
+        model = ReportExportJob
+        fields = (
+            'id', 'report_type', 'params', 'status', 'error', 'created_at', 'completed_at',
+            'start_date', 'end_date', 'year'
+        )
+        read_only_fields = ('params', 'status', 'error', 'created_at', 'completed_at')
+    
+    def validate(self, attrs):
+        # Collapse the optional filters into the normalised params used for caching
+        start_date = attrs.pop('start_date', None)
+        end_date = attrs.pop('end_date', None)
+        year = attrs.pop('year', None)
+        
+        if attrs['report_type'] == 'analytics_pdf':
+            attrs['params'] = {'year': year or timezone.now().year}
+        else:
+            if start_date and end_date and start_date > end_date:
+                raise serializers.ValidationError('start_date must be before end_date')
+            params = {}
+            if start_date:
+                params['start_date'] = start_date.isoformat()
+            if end_date:
+                params['end_date'] = end_date.isoformat()
+            attrs['params'] = params
+        return attrs
+
 # Dashboard Serializers
 class MonthlyProfitSerializer(serializers.Serializer):
     month = serializers.CharField()
+    period_start = serializers.DateField()
     total_income = serializers.DecimalField(max_digits=12, decimal_places=2)
     total_expense = serializers.DecimalField(max_digits=12, decimal_places=2)
     profit = serializers.DecimalField(max_digits=12, decimal_places=2)
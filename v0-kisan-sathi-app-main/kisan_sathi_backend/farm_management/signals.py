@@ -0,0 +1,50 @@
+"""
+Signal handlers that keep FarmerMonthlyLedger in sync with Expense and Income
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .ledger import add_contribution, apply_deltas, new_deltas
+from .models import Crop, Expense, ExpenseCategory, Income
+
+# Deleting one of these cascades to its ledger buckets as well as its entries
+LEDGER_PARENTS = (get_user_model(), ExpenseCategory, Crop)
+
+
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=Income)
+def remember_ledger_contribution(sender, instance, raw=False, **kwargs):
+    """Load the stored row so post_save can subtract its old contribution"""
+    instance._ledger_previous = None
+    if raw or instance.pk is None:
+        return
+    # _base_manager also sees soft-deleted rows that are being restored
+    instance._ledger_previous = sender._base_manager.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def update_ledger_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = new_deltas()
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is not None:
+        add_contribution(deltas, previous, sign=-1)
+    add_contribution(deltas, instance)
+    apply_deltas(deltas)
+    instance._ledger_previous = None
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+def update_ledger_on_delete(sender, instance, origin=None, **kwargs):
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if issubclass(origin_model, LEDGER_PARENTS):
+        # The buckets this entry counted towards are being deleted with it
+        return
+    deltas = new_deltas()
+    add_contribution(deltas, instance, sign=-1)
+    apply_deltas(deltas)
@@ -0,0 +1,41 @@
+"""
+Celery tasks for Farm Management
+"""
+import logging
+
+from celery import shared_task
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import ReportExportJob
+from .reports import build_report, report_filename
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_report(job_id):
+    """Render a queued ReportExportJob and store the PDF on the job"""
+    job = ReportExportJob.objects.select_related('farmer').get(pk=job_id)
+    # Already rendered, or given up on after timing out
+    if job.status in ('completed', 'failed'):
+        return job.pk
+
+    job.status = 'running'
+    job.save(update_fields=['status'])
+
+    try:
+        pdf = build_report(job.report_type, job.farmer, job.params)
+    except Exception as e:
+        logger.exception('Report job %s failed', job.pk)
+        job.status = 'failed'
+        job.error = str(e)
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'completed_at'])
+        return job.pk
+
+    job.file.save(report_filename(job.report_type, job.params), ContentFile(pdf), save=False)
+    job.status = 'completed'
+    job.completed_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'completed_at'])
+    return job.pk
@@ -1,3 +1,891 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO
+import shutil
+import tempfile
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from openpyxl import load_workbook
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from reportlab.pdfbase import pdfmetrics
+from rest_framework.test import APITestCase
+
+from kisan_sathi.pdf_styles import FALLBACK_FONTS, get_pdf_fonts
+
+from .inventory import InsufficientStock, use_stock
+from .ledger import ledger_totals
+from .models import (
+    ExpenseCategory, Expense, Crop, Income, FarmerMonthlyLedger, InventoryCategory, InventoryItem,
+    InventoryMovement, CropPlan, LivestockType, Livestock, VaccinationRecord, Loan, EMIPayment,
+    ReportExportJob
+)
+from .reports import (
+    REPORT_JOB_TIMEOUT, build_analytics_pdf, build_expenses_pdf, build_income_pdf, report_cache_key
+)
+from .utils import EXCEL_CURRENCY_FORMAT, register_unicode_fonts
+from .tasks import generate_report
+from .views import InventoryItemViewSet
+
+
+class ListQueryCountTests(APITestCase):
+    """
+    List endpoints must run a fixed number of queries however many rows
+    exist, i.e. every relation a serializer reads is joined up front and
+    keyset pagination needs no COUNT query.
+    """
+    ROW_COUNTS = (1, 100, 1000)
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500001', email='querycount@example.com', password='test-pass',
+            username='querycount', first_name='Query'
+        )
+        cls.expense_category = ExpenseCategory.objects.create(name='Seeds')
+        cls.crop = Crop.objects.create(name='Rice', season='kharif')
+        cls.inventory_category = InventoryCategory.objects.create(name='Fertilizers')
+        cls.livestock_type = LivestockType.objects.create(name='Cow')
+        cls.loan = Loan.objects.create(
+            farmer=cls.farmer, lender_name='Grameen Bank', loan_type='crop_loan',
+            principal_amount=Decimal('100000'), interest_rate=Decimal('7.5'),
+            loan_date=date(2025, 1, 1), tenure_months=12,
+            emi_amount=Decimal('8700'), remaining_amount=Decimal('100000')
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.farmer)
+
+    def make_expenses(self, count):
+        Expense.objects.bulk_create(
+            Expense(farmer=self.farmer, category=self.expense_category,
+                    amount=Decimal('100'), date=date(2025, 1, 1))
+            for _ in range(count)
+        )
+
+    def make_income(self, count):
+        Income.objects.bulk_create(
+            Income(farmer=self.farmer, crop=self.crop, quantity=Decimal('10'), unit='quintal',
+                   rate_per_unit=Decimal('2000'), total_amount=Decimal('20000'),
+                   buyer_name='Mandi', sale_date=date(2025, 1, 1))
+            for _ in range(count)
+        )
+
+    def make_inventory(self, count):
+        InventoryItem.objects.bulk_create(
+            InventoryItem(farmer=self.farmer, category=self.inventory_category,
+                          name=f'Urea {i}', unit='kg', current_stock=Decimal('5'),
+                          minimum_stock=Decimal('10'), cost_per_unit=Decimal('20'),
+                          low_stock_since=timezone.now())
+            for i in range(count)
+        )
+
+    def make_crop_plans(self, count):
+        CropPlan.objects.bulk_create(
+            CropPlan(farmer=self.farmer, crop=self.crop, planned_area=Decimal('2'), area_unit='acre',
+                     planting_date=date(2025, 6, 1), expected_harvest_date=date(2025, 10, 1))
+            for _ in range(count)
+        )
+
+    def make_livestock(self, count):
+        # Tag numbers are unique per farmer, so continue after existing rows
+        start = Livestock.objects.count()
+        return Livestock.objects.bulk_create(
+            Livestock(farmer=self.farmer, livestock_type=self.livestock_type,
+                      tag_number=f'TAG-{i}', purchase_date=date(2024, 1, 1))
+            for i in range(start, start + count)
+        )
+
+    def make_vaccinations(self, count):
+        livestock = self.make_livestock(count)
+        VaccinationRecord.objects.bulk_create(
+            VaccinationRecord(livestock=animal, vaccine_name='FMD',
+                              vaccination_date=date(2025, 1, 1))
+            for animal in livestock
+        )
+
+    def make_emi_payments(self, count):
+        EMIPayment.objects.bulk_create(
+            EMIPayment(loan=self.loan, payment_date=date(2025, 2, 1),
+                       amount_paid=Decimal('8700'), payment_method='cash')
+            for _ in range(count)
+        )
+
+    def assert_list_queries(self, url, make_rows, expected_queries, paginated=True):
+        created = 0
+        for row_count in self.ROW_COUNTS:
+            make_rows(row_count - created)
+            created = row_count
+            with self.subTest(url=url, rows=row_count):
+                with self.assertNumQueries(expected_queries):
+                    response = self.client.get(url, {'page_size': 100} if paginated else {})
+                self.assertEqual(response.status_code, 200)
+                if paginated:
+                    self.assertEqual(len(response.data['results']), min(row_count, 100))
+                    self.assertEqual(response.data['next'] is not None, row_count > 100)
+                else:
+                    self.assertEqual(len(response.data), row_count)
+
+    def test_expense_list(self):
+        self.assert_list_queries('/farm-management/api/expenses/', self.make_expenses, 1)
+
+    def test_income_list(self):
+        self.assert_list_queries('/farm-management/api/income/', self.make_income, 1)
+
+    def test_inventory_list(self):
+        self.assert_list_queries('/farm-management/api/inventory/', self.make_inventory, 1)
+
+    def test_inventory_low_stock(self):
+        self.assert_list_queries(
+            '/farm-management/api/inventory/low_stock/', self.make_inventory, 1, paginated=False
+        )
+
+    def test_crop_plan_list(self):
+        self.assert_list_queries('/farm-management/api/crop-plans/', self.make_crop_plans, 1)
+
+    def test_livestock_list(self):
+        self.assert_list_queries('/farm-management/api/livestock/', self.make_livestock, 1)
+
+    def test_vaccination_list(self):
+        self.assert_list_queries('/farm-management/api/vaccinations/', self.make_vaccinations, 1)
+
+    def test_emi_payment_list(self):
+        self.assert_list_queries('/farm-management/api/emi-payments/', self.make_emi_payments, 1)
+
+
+class KeysetPaginationTests(APITestCase):
+    url = '/farm-management/api/expenses/'
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500002', email='keyset@example.com', password='test-pass',
+            username='keyset', first_name='Keyset'
+        )
+        category = ExpenseCategory.objects.create(name='Labour')
+        # Many rows share a date so pages must split ties on created_at/id
+        Expense.objects.bulk_create(
+            Expense(farmer=cls.farmer, category=category, amount=Decimal(i + 1),
+                    date=date(2025, 1, 1 + i % 3))
+            for i in range(47)
+        )
+        cls.expected = list(
+            Expense.objects.filter(farmer=cls.farmer).order_by('-date', '-created_at', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.farmer)
+
+    def test_walks_forward_and_back_without_gaps(self):
+        pages = []
+        response = self.client.get(self.url, {'page_size': 10})
+        self.assertIsNone(response.data['previous'])
+        while True:
+            pages.append([row['id'] for row in response.data['results']])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual([row for page in pages for row in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [10, 10, 10, 10, 7])
+
+        # Back from the last page returns the same pages in reverse
+        for page in reversed(pages[:-1]):
+            response = self.client.get(response.data['previous'])
+            self.assertEqual([row['id'] for row in response.data['results']], page)
+        self.assertIsNone(response.data['previous'])
+
+    def test_filters_survive_cursor_links(self):
+        response = self.client.get(self.url, {'page_size': 5, 'start_date': '2025-01-02'})
+        next_link = response.data['next']
+        self.assertIn('start_date=2025-01-02', next_link)
+        response = self.client.get(next_link)
+        self.assertTrue(all(row['date'] >= '2025-01-02' for row in response.data['results']))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class BulkWriteTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500003', email='bulk@example.com', password='test-pass',
+            username='bulk', first_name='Bulk'
+        )
+        cls.category = ExpenseCategory.objects.create(name='Fertilizer')
+        cls.crop = Crop.objects.create(name='Wheat', season='rabi')
+        cls.inventory_category = InventoryCategory.objects.create(name='Seeds')
+
+    def setUp(self):
+        self.client.force_authenticate(self.farmer)
+
+    def expense_rows(self, count):
+        return [
+            {'category': self.category.id, 'amount': '100.00', 'date': '2025-03-01', 'notes': f'row {i}'}
+            for i in range(count)
+        ]
+
+    def test_create_expenses_without_per_row_queries(self):
+        for count in (10, 300):
+            with self.subTest(rows=count), CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    '/farm-management/api/expenses/bulk/', self.expense_rows(count), format='json'
+                )
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.data['data']), count)
+            self.assertEqual(response.data['data'][0]['category_name'], 'Fertilizer')
+            # Inserts are batched by the backend's parameter limit, never per row
+            self.assertLess(len(queries), 20)
+            sql = [query['sql'] for query in queries]
+            self.assertEqual(sum('FROM "farm_management_expensecategory"' in q for q in sql), 1)
+            self.assertEqual(sum('UPDATE "farm_management_farmermonthlyledger"' in q for q in sql), 1)
+        self.assertEqual(ledger_totals(self.farmer, 2025)['expense'], Decimal('31000'))
+
+    def test_invalid_rows_save_nothing(self):
+        rows = self.expense_rows(3)
+        rows[1]['amount'] = '-5'
+        del rows[2]['date']
+        response = self.client.post('/farm-management/api/expenses/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('amount', response.data['errors'][0]['errors'])
+        self.assertFalse(Expense.objects.exists())
+
+    def test_income_total_amount_and_ledger(self):
+        rows = [
+            {'crop': self.crop.id, 'quantity': '10', 'unit': 'quintal', 'rate_per_unit': '2000',
+             'buyer_name': 'Mandi', 'sale_date': '2025-04-10'},
+            {'crop': self.crop.id, 'quantity': '5', 'unit': 'quintal', 'rate_per_unit': '2100',
+             'buyer_name': 'Mandi', 'sale_date': '2025-04-11'},
+        ]
+        response = self.client.post('/farm-management/api/income/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row['total_amount'] for row in response.data['data']], ['20000.00', '10500.00'])
+        self.assertEqual(ledger_totals(self.farmer, 2025)['income'], Decimal('30500'))
+
+        first, second = (row['id'] for row in response.data['data'])
+        response = self.client.patch('/farm-management/api/income/bulk/', [
+            {'id': first, 'quantity': '20'},
+            {'id': second, 'sale_date': '2024-12-31'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Income.objects.get(pk=first).total_amount, Decimal('40000'))
+        self.assertEqual(ledger_totals(self.farmer, 2025)['income'], Decimal('40000'))
+        self.assertEqual(ledger_totals(self.farmer, 2024)['income'], Decimal('10500'))
+
+        response = self.client.delete('/farm-management/api/income/bulk/', [first, second], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Income.objects.only_deleted().count(), 2)
+        self.assertEqual(ledger_totals(self.farmer, 2025)['income'], Decimal('0'))
+        self.assertEqual(ledger_totals(self.farmer, 2024)['income'], Decimal('0'))
+
+    def test_update_reports_unknown_ids(self):
+        other = get_user_model().objects.create_user(
+            phone='+919876500004', email='other@example.com', password='test-pass',
+            username='other', first_name='Other'
+        )
+        theirs = Expense.objects.create(farmer=other, category=self.category,
+                                        amount=Decimal('50'), date=date(2025, 1, 1))
+        mine = Expense.objects.create(farmer=self.farmer, category=self.category,
+                                      amount=Decimal('50'), date=date(2025, 1, 1))
+        response = self.client.patch('/farm-management/api/expenses/bulk/', [
+            {'id': mine.id, 'amount': '75'},
+            {'id': theirs.id, 'amount': '75'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{'index': 1, 'errors': {'id': ['Not found']}}])
+        mine.refresh_from_db()
+        self.assertEqual(mine.amount, Decimal('50'))
+
+    def test_inventory_bulk_delete_is_permanent(self):
+        response = self.client.post('/farm-management/api/inventory/bulk/', [
+            {'category': self.inventory_category.id, 'name': f'Seed {i}', 'unit': 'kg'} for i in range(3)
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        ids = [row['id'] for row in response.data['data']]
+        response = self.client.delete('/farm-management/api/inventory/bulk/', ids[:2], format='json')
+        self.assertEqual(response.data['data'], {'deleted': 2})
+        self.assertEqual(list(InventoryItem.objects.values_list('id', flat=True)), ids[2:])
+
+
+class LedgerCascadeTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500007', email='cascade@example.com', password='test-pass',
+            username='cascade', first_name='Cascade'
+        )
+        cls.seeds = ExpenseCategory.objects.create(name='Seeds')
+        cls.labour = ExpenseCategory.objects.create(name='Labour')
+        cls.crop = Crop.objects.create(name='Cotton', season='kharif')
+
+    def add_entries(self):
+        for category in (self.seeds, self.labour):
+            Expense.objects.create(farmer=self.farmer, category=category,
+                                   amount=Decimal('100'), date=date(2025, 2, 1))
+        Income.objects.create(farmer=self.farmer, crop=self.crop, quantity=Decimal('1'), unit='quintal',
+                              rate_per_unit=Decimal('6000'), total_amount=Decimal('6000'),
+                              buyer_name='Mandi', sale_date=date(2025, 2, 1))
+
+    def test_deleting_farmer_with_entries(self):
+        self.add_entries()
+        self.farmer.delete()
+        # SQLite checks foreign keys at commit; check them now instead
+        connection.check_constraints()
+        self.assertFalse(FarmerMonthlyLedger.objects.exists())
+
+    def test_deleting_category_with_expenses(self):
+        self.add_entries()
+        self.seeds.delete()
+        connection.check_constraints()
+        self.assertFalse(Expense.objects.filter(category=self.seeds.pk).exists())
+        self.assertEqual(
+            list(FarmerMonthlyLedger.objects.filter(entry_type='expense')
+                 .values_list('category', 'total_amount', 'entry_count')),
+            [(self.labour.pk, Decimal('100'), 1)]
+        )
+        self.assertEqual(ledger_totals(self.farmer, 2025), {'income': Decimal('6000'), 'expense': Decimal('100')})
+
+    def test_deleting_an_entry_still_updates_the_ledger(self):
+        self.add_entries()
+        Expense.objects.filter(category=self.labour).delete()
+        self.assertEqual(ledger_totals(self.farmer, 2025)['expense'], Decimal('100'))
+
+
+class InventoryStockTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500005', email='stock@example.com', password='test-pass',
+            username='stock', first_name='Stock'
+        )
+        cls.category = InventoryCategory.objects.create(name='Pesticides')
+
+    def setUp(self):
+        self.client.force_authenticate(self.farmer)
+        self.urea = self.make_item('Urea', stock='20', minimum='5')
+        self.dap = self.make_item('DAP', stock='8', minimum='2')
+
+    def make_item(self, name, stock, minimum):
+        response = self.client.post('/farm-management/api/inventory/', {
+            'category': self.category.id, 'name': name, 'unit': 'kg',
+            'current_stock': stock, 'minimum_stock': minimum
+        })
+        self.assertEqual(response.status_code, 201)
+        return InventoryItem.objects.get(pk=response.data['data']['id'])
+
+    def test_use_stock_records_movement_and_low_stock(self):
+        response = self.client.post(f'/farm-management/api/inventory/{self.urea.id}/use_stock/', {'quantity': '15'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['current_stock'], '5.00')
+        self.assertTrue(response.data['data']['is_low_stock'])
+
+        self.assertEqual(
+            list(self.urea.movements.values_list('movement_type', 'quantity', 'stock_after')),
+            [('use', Decimal('-15'), Decimal('5')), ('opening', Decimal('20'), Decimal('20'))]
+        )
+        low = self.client.get('/farm-management/api/inventory/low_stock/')
+        self.assertEqual([row['name'] for row in low.data], ['Urea'])
+
+        # Restocking through an edit clears the flag and is logged as an adjustment
+        self.client.patch(f'/farm-management/api/inventory/{self.urea.id}/', {'current_stock': '30'})
+        self.assertEqual(self.client.get('/farm-management/api/inventory/low_stock/').data, [])
+        self.assertEqual(self.urea.movements.first().quantity, Decimal('25'))
+
+    def test_stale_reads_cannot_oversell(self):
+        first, second = InventoryItem.objects.get(pk=self.urea.pk), InventoryItem.objects.get(pk=self.urea.pk)
+        use_stock([(first, Decimal('12'))])
+        # second still believes 20 kg are left
+        with self.assertRaises(InsufficientStock):
+            use_stock([(second, Decimal('12'))])
+        self.urea.refresh_from_db()
+        self.assertEqual(self.urea.current_stock, Decimal('8'))
+
+    def test_edit_does_not_write_back_stale_stock(self):
+        url = f'/farm-management/api/inventory/{self.urea.id}/'
+        # A use that lands between the edit's read of the item and its save
+        stale_get = InventoryItemViewSet.get_object
+
+        def get_object_then_use(view):
+            item = stale_get(view)
+            use_stock([(InventoryItem.objects.get(pk=self.urea.pk), Decimal('6'))])
+            return item
+
+        with patch.object(InventoryItemViewSet, 'get_object', get_object_then_use):
+            response = self.client.patch(url, {'name': 'Urea (46% N)'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['current_stock'], '14.00')
+        self.urea.refresh_from_db()
+        self.assertEqual((self.urea.name, self.urea.current_stock), ('Urea (46% N)', Decimal('14')))
+        self.assertEqual(self.urea.movements.filter(movement_type='adjustment').count(), 0)
+
+        with patch.object(InventoryItemViewSet, 'get_object', get_object_then_use):
+            self.client.patch(url, {'current_stock': '30'})
+        # The adjustment is measured from the stock left after the concurrent use
+        self.assertEqual(self.urea.movements.first().quantity, Decimal('22'))
+
+    def test_insufficient_stock(self):
+        response = self.client.post(f'/farm-management/api/inventory/{self.dap.id}/use_stock/', {'quantity': '9'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], 'Insufficient stock')
+        response = self.client.post(f'/farm-management/api/inventory/{self.dap.id}/use_stock/', {'quantity': 'abc'})
+        self.assertEqual(response.data['message'], 'Invalid quantity')
+
+    def test_batch_use_is_all_or_nothing(self):
+        url = '/farm-management/api/inventory/use_stock/'
+        response = self.client.post(url, {'items': [
+            {'item': self.urea.id, 'quantity': '4'},
+            {'item': self.dap.id, 'quantity': '10'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{'index': 1, 'errors': {'quantity': ['Insufficient stock']}}])
+        self.assertFalse(InventoryMovement.objects.filter(movement_type='use').exists())
+
+        response = self.client.post(url, {'items': [
+            {'item': self.urea.id, 'quantity': '4'},
+            {'item': self.dap.id, 'quantity': '7'},
+        ], 'notes': 'Field 3 spraying'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['current_stock'] for row in response.data['data']], ['16.00', '1.00'])
+        self.assertEqual(
+            InventoryMovement.objects.filter(movement_type='use', notes='Field 3 spraying').count(), 2
+        )
+        self.assertEqual(
+            [row['name'] for row in self.client.get('/farm-management/api/inventory/low_stock/').data], ['DAP']
+        )
+
+    def test_movement_history(self):
+        self.client.post(f'/farm-management/api/inventory/{self.dap.id}/use_stock/', {'quantity': '1'})
+        response = self.client.get(f'/farm-management/api/inventory/{self.dap.id}/movements/')
+        self.assertEqual([row['movement_type'] for row in response.data['results']], ['use', 'opening'])
+
+
+class SummaryTests(APITestCase):
+    """The stats cards and reports read these aggregates instead of every page"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500006', email='summary@example.com', password='test-pass',
+            username='summary', first_name='Summary'
+        )
+        rice = Crop.objects.create(name='Rice', season='kharif')
+        wheat = Crop.objects.create(name='Wheat', season='rabi')
+        for crop, quantity, rate, sale_date in [
+            (rice, '10', '2000', date(2025, 1, 10)),
+            (rice, '5', '2100', date(2025, 2, 10)),
+            (wheat, '8', '2500', date(2025, 2, 20)),
+        ]:
+            Income.objects.create(
+                farmer=cls.farmer, crop=crop, quantity=Decimal(quantity), unit='quintal',
+                rate_per_unit=Decimal(rate), buyer_name='Mandi', sale_date=sale_date
+            )
+
+        category = InventoryCategory.objects.create(name='Fertilizers')
+        today = timezone.now().date()
+        for name, stock, minimum, cost, expiry in [
+            ('Urea', '5', '10', '20', today + timedelta(days=10)),
+            ('DAP', '50', '10', '30', today + timedelta(days=60)),
+            ('Potash', '10', '10', '15', today - timedelta(days=1)),
+        ]:
+            InventoryItem.objects.create(
+                farmer=cls.farmer, category=category, name=name, unit='kg',
+                current_stock=Decimal(stock), minimum_stock=Decimal(minimum),
+                cost_per_unit=Decimal(cost), expiry_date=expiry
+            )
+
+        for plan_status in ['planned', 'planned', 'growing']:
+            CropPlan.objects.create(
+                farmer=cls.farmer, crop=rice, planned_area=Decimal('2'), area_unit='acre',
+                planting_date=date(2025, 6, 1), expected_harvest_date=date(2025, 10, 1),
+                status=plan_status
+            )
+
+        cow = LivestockType.objects.create(name='Cow')
+        goat = LivestockType.objects.create(name='Goat')
+        for tag, livestock_type, health in [
+            ('C-1', cow, 'healthy'), ('C-2', cow, 'sick'), ('G-1', goat, 'healthy'),
+        ]:
+            Livestock.objects.create(
+                farmer=cls.farmer, livestock_type=livestock_type, tag_number=tag,
+                purchase_date=date(2024, 1, 1), health_status=health
+            )
+
+        for loan_status, emi, remaining in [
+            ('active', '8700', '60000'), ('active', '1300', '9000'), ('completed', '5000', '0'),
+        ]:
+            Loan.objects.create(
+                farmer=cls.farmer, lender_name='Grameen Bank', loan_type='crop_loan',
+                principal_amount=Decimal('100000'), interest_rate=Decimal('7.5'),
+                loan_date=date(2025, 1, 1), tenure_months=12, status=loan_status,
+                emi_amount=Decimal(emi), remaining_amount=Decimal(remaining)
+            )
+
+        # Another farmer's rows never count
+        other = User.objects.create_user(
+            phone='+919876500008', email='summary-other@example.com', password='test-pass',
+            username='summary-other', first_name='Other'
+        )
+        Loan.objects.create(
+            farmer=other, lender_name='Other Bank', loan_type='crop_loan',
+            principal_amount=Decimal('100000'), interest_rate=Decimal('7.5'),
+            loan_date=date(2025, 1, 1), tenure_months=12,
+            emi_amount=Decimal('9999'), remaining_amount=Decimal('99999')
+        )
+        Livestock.objects.create(
+            farmer=other, livestock_type=cow, tag_number='C-1', purchase_date=date(2024, 1, 1)
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.farmer)
+
+    def test_income_by_crop_honours_the_date_range(self):
+        response = self.client.get('/farm-management/api/income/summary/', {'start_date': '2025-02-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_income'], Decimal('30500'))
+        self.assertEqual(response.data['income_count'], 2)
+        self.assertEqual(response.data['by_crop'], [
+            {'crop': 'Wheat', 'total_quantity': Decimal('8'), 'total_amount': Decimal('20000'), 'count': 1},
+            {'crop': 'Rice', 'total_quantity': Decimal('5'), 'total_amount': Decimal('10500'), 'count': 1},
+        ])
+
+    def test_inventory_summary(self):
+        response = self.client.get('/farm-management/api/inventory/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'total_items': 3,
+            'low_stock_count': 2,
+            'total_value': Decimal('1750'),
+            'expiring_count': 1,
+        })
+
+    def test_crop_plan_summary_counts_every_status(self):
+        response = self.client.get('/farm-management/api/crop-plans/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'planned': 2, 'planted': 0, 'growing': 1, 'harvested': 0, 'cancelled': 0
+        })
+
+    def test_livestock_summary(self):
+        response = self.client.get('/farm-management/api/livestock/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'total': 3,
+            'by_type': {'Cow': 2, 'Goat': 1},
+            'by_health': {'healthy': 2, 'sick': 1},
+        })
+
+    def test_loan_summary_only_totals_active_loans(self):
+        response = self.client.get('/farm-management/api/loans/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'active_count': 2,
+            'completed_count': 1,
+            'total_outstanding': Decimal('69000'),
+            'monthly_emi': Decimal('10000'),
+        })
+
+
+class ReportExportJobTests(APITestCase):
+    """Background PDF exports; celery runs eagerly without a broker"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500009', email='reports@example.com', password='test-pass',
+            username='reports', first_name='Reports'
+        )
+        cls.category = ExpenseCategory.objects.create(name='Seeds')
+        Expense.objects.create(farmer=cls.farmer, category=cls.category,
+                               amount=Decimal('250'), date=date(2025, 3, 1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.farmer)
+
+    def request_report(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/farm-management/api/report-jobs/', {'report_type': 'expenses_pdf'})
+
+    def make_job(self, job_status, age=timedelta(0)):
+        job = ReportExportJob.objects.create(
+            farmer=self.farmer, report_type='expenses_pdf', status=job_status,
+            cache_key=report_cache_key('expenses_pdf', self.farmer, {})
+        )
+        ReportExportJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - age)
+        return job
+
+    def test_create_renders_and_downloads(self):
+        response = self.request_report()
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(response.data['cached'])
+
+        job = ReportExportJob.objects.get(pk=response.data['data']['id'])
+        self.assertEqual(job.status, 'completed')
+        self.assertIsNotNone(job.completed_at)
+
+        response = self.client.get(f'/farm-management/api/report-jobs/{job.pk}/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_identical_request_reuses_the_job(self):
+        first = self.request_report()
+        second = self.request_report()
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.data['cached'])
+        self.assertEqual(second.data['data']['id'], first.data['data']['id'])
+        self.assertEqual(ReportExportJob.objects.count(), 1)
+
+    def test_changed_data_queues_a_new_job(self):
+        first = self.request_report()
+        Expense.objects.create(farmer=self.farmer, category=self.category,
+                               amount=Decimal('100'), date=date(2025, 3, 2))
+        second = self.request_report()
+        self.assertEqual(second.status_code, 202)
+        self.assertNotEqual(second.data['data']['id'], first.data['data']['id'])
+
+    def test_download_before_completion_conflicts(self):
+        for job_status in ('pending', 'running', 'failed'):
+            with self.subTest(status=job_status):
+                job = self.make_job(job_status)
+                response = self.client.get(f'/farm-management/api/report-jobs/{job.pk}/download/')
+                self.assertEqual(response.status_code, 409)
+
+    def test_recent_pending_job_is_reused(self):
+        job = self.make_job('pending', age=REPORT_JOB_TIMEOUT - timedelta(minutes=1))
+        with patch('farm_management.views.generate_report') as task:
+            response = self.request_report()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['id'], job.pk)
+        task.delay.assert_not_called()
+
+    def test_stale_job_is_failed_and_replaced(self):
+        for job_status in ('pending', 'running'):
+            with self.subTest(status=job_status):
+                stale = self.make_job(job_status, age=REPORT_JOB_TIMEOUT + timedelta(minutes=1))
+                response = self.request_report()
+                self.assertEqual(response.status_code, 202)
+                self.assertNotEqual(response.data['data']['id'], stale.pk)
+
+                stale.refresh_from_db()
+                self.assertEqual(stale.status, 'failed')
+                self.assertEqual(stale.error, 'Timed out')
+                self.assertEqual(ReportExportJob.objects.get(pk=response.data['data']['id']).status, 'completed')
+                ReportExportJob.objects.all().delete()
+
+    def test_render_error_fails_the_job(self):
+        job = self.make_job('pending')
+        with patch('farm_management.tasks.build_report', side_effect=ValueError('bad params')), \
+                self.assertLogs('farm_management.tasks', 'ERROR'):
+            generate_report(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, 'bad params')
+        self.assertIsNotNone(job.completed_at)
+        self.assertFalse(job.file)
+
+    def test_timed_out_job_is_not_rendered_late(self):
+        job = self.make_job('failed')
+        with patch('farm_management.tasks.build_report') as build:
+            generate_report(job.pk)
+        build.assert_not_called()
+
+
+class ProfitChartTests(APITestCase):
+    url = '/farm-management/api/monthly-profit/'
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500010', email='chart@example.com', password='test-pass',
+            username='chart', first_name='Chart'
+        )
+        category = ExpenseCategory.objects.create(name='Labour')
+        crop = Crop.objects.create(name='Rice', season='kharif')
+        # 1 Jan 2025 is a Wednesday: its week starts on Monday 30 Dec 2024
+        for sale_date, rate in ((date(2024, 12, 31), '500'), (date(2025, 1, 2), '100'),
+                                (date(2025, 1, 6), '200'), (date(2025, 5, 20), '300')):
+            Income.objects.create(farmer=cls.farmer, crop=crop, quantity=Decimal('1'), unit='quintal',
+                                  rate_per_unit=Decimal(rate), buyer_name='Mandi', sale_date=sale_date)
+        for expense_date, amount in ((date(2025, 1, 3), '40'), (date(2025, 12, 31), '60')):
+            Expense.objects.create(farmer=cls.farmer, category=category,
+                                   amount=Decimal(amount), date=expense_date)
+
+    def setUp(self):
+        self.client.force_authenticate(self.farmer)
+
+    def chart(self, **params):
+        response = self.client.get(self.url, {'year': '2025', **params})
+        self.assertEqual(response.status_code, 200)
+        return {row['period_start']: (row['month'], row['total_income'], row['total_expense'], row['profit'])
+                for row in response.data}
+
+    def test_week_buckets(self):
+        chart = self.chart(granularity='week')
+        starts = list(chart)
+        self.assertEqual(starts[0], '2024-12-30')
+        self.assertEqual(starts[-1], '2025-12-29')
+        self.assertEqual(len(starts), 53)
+        # Only the 2025 days of the first week count
+        self.assertEqual(chart['2024-12-30'], ('Week of 30 Dec', '100.00', '40.00', '60.00'))
+        self.assertEqual(chart['2025-01-06'], ('Week of 06 Jan', '200.00', '0.00', '200.00'))
+        self.assertEqual(chart['2025-05-19'][1], '300.00')
+        self.assertEqual(chart['2025-12-29'][2], '60.00')
+
+    def test_quarter_buckets(self):
+        chart = self.chart(granularity='quarter')
+        self.assertEqual(list(chart), ['2025-01-01', '2025-04-01', '2025-07-01', '2025-10-01'])
+        self.assertEqual(chart['2025-01-01'], ('Q1', '300.00', '40.00', '260.00'))
+        self.assertEqual(chart['2025-04-01'], ('Q2', '300.00', '0.00', '300.00'))
+        self.assertEqual(chart['2025-10-01'], ('Q4', '0.00', '60.00', '-60.00'))
+
+    def test_invalid_parameters(self):
+        for params in ({'year': 'abc'}, {'year': '0'}, {'year': '99999'}, {'granularity': 'day'}):
+            with self.subTest(**params):
+                response = self.client.get(self.url, {'year': '2025', **params})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.data['success'])
+
+
+class ExcelExportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500011', email='excel@example.com', password='test-pass',
+            username='excel', first_name='Excel'
+        )
+        category = ExpenseCategory.objects.create(name='Fertilizer')
+        crop = Crop.objects.create(name='Cotton', season='kharif')
+        for day, amount in enumerate(('120.50', '80', '1000.25', '15', '4.75'), start=1):
+            Expense.objects.create(farmer=cls.farmer, category=category, amount=Decimal(amount),
+                                   date=date(2025, 4, day), notes=f'Bag {day}')
+            Income.objects.create(farmer=cls.farmer, crop=crop, quantity=Decimal(day), unit='quintal',
+                                  rate_per_unit=Decimal(amount), buyer_name='Mandi',
+                                  sale_date=date(2025, 4, day))
+
+    def setUp(self):
+        self.client.force_login(self.farmer)
+        # A small width sample, so rows are written both from the sample and the stream
+        patcher = patch('farm_management.utils.EXCEL_WIDTH_SAMPLE_ROWS', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        return load_workbook(BytesIO(b''.join(response.streaming_content))).active
+
+    def test_expenses_workbook(self):
+        sheet = self.export('/farm-management/api/export/expenses/excel/', start_date='2025-04-02')
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ('Date', 'Category', 'Amount', 'Notes'))
+        self.assertEqual(sorted(rows[1:-1]), [
+            ('02-04-2025', 'Fertilizer', 80, 'Bag 2'),
+            ('03-04-2025', 'Fertilizer', 1000.25, 'Bag 3'),
+            ('04-04-2025', 'Fertilizer', 15, 'Bag 4'),
+            ('05-04-2025', 'Fertilizer', 4.75, 'Bag 5'),
+        ])
+        self.assertEqual(rows[-1], (None, 'TOTAL', 1100, None))
+
+        for row in sheet.iter_rows(min_row=2, min_col=3, max_col=3):
+            self.assertEqual(row[0].number_format, EXCEL_CURRENCY_FORMAT)
+        self.assertTrue(sheet.cell(row=sheet.max_row, column=2).font.bold)
+        self.assertTrue(sheet['A1'].font.bold)
+
+    def test_income_workbook(self):
+        sheet = self.export('/farm-management/api/export/income/excel/')
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][:6], ('Date', 'Crop', 'Quantity', 'Unit', 'Rate per Unit', 'Total Amount'))
+        self.assertEqual(len(rows), 7)
+        self.assertIn(('03-04-2025', 'Cotton', 3, 'quintal', 1000.25, 3000.75, 'Mandi', 'pending'), rows)
+        # 120.50 + 160 + 3000.75 + 60 + 23.75
+        self.assertEqual(rows[-1][4:6], ('TOTAL', 3365))
+
+        for row in sheet.iter_rows(min_row=2, min_col=5, max_col=6):
+            self.assertEqual([cell.number_format for cell in row], [EXCEL_CURRENCY_FORMAT] * 2)
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get('/farm-management/api/export/expenses/excel/')
+        self.assertEqual(response.status_code, 401)
+
+
+class PDFReportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(
+            phone='+919876500012', email='pdf@example.com', password='test-pass',
+            username='pdf', first_name='Pdf'
+        )
+        category = ExpenseCategory.objects.create(name='Labour')
+        crop = Crop.objects.create(name='Maize', season='rabi')
+        Expense.objects.create(farmer=cls.farmer, category=category, amount=Decimal('2500'),
+                               date=date(2025, 2, 10), notes='Harvest crew')
+        Income.objects.create(farmer=cls.farmer, crop=crop, quantity=Decimal('12'), unit='quintal',
+                              rate_per_unit=Decimal('1800'), buyer_name='Mandi', sale_date=date(2025, 3, 5))
+
+    def test_fonts_register_once(self):
+        get_pdf_fonts.cache_clear()
+        with patch('kisan_sathi.pdf_styles.pdfmetrics.registerFont',
+                   wraps=pdfmetrics.registerFont) as register_font:
+            fonts = get_pdf_fonts()
+            registered = register_font.call_count
+            for _ in range(3):
+                self.assertIs(get_pdf_fonts(), fonts)
+            self.assertEqual(register_unicode_fonts(), fonts.regular)
+            build_expenses_pdf(self.farmer)
+            build_analytics_pdf(self.farmer, 2025)
+
+        # Only the first call probes and registers the font files
+        self.assertLessEqual(registered, 2)
+        self.assertEqual(register_font.call_count, registered)
+
+    def test_falls_back_without_unicode_fonts(self):
+        get_pdf_fonts.cache_clear()
+        self.addCleanup(get_pdf_fonts.cache_clear)
+        with patch('kisan_sathi.pdf_styles.FONT_PATHS', []):
+            self.assertEqual(get_pdf_fonts(), FALLBACK_FONTS)
+        self.assertTrue(build_income_pdf(self.farmer).startswith(b'%PDF'))
+
+    def test_builders_render_pdfs(self):
+        builders = {
+            'expenses': lambda: build_expenses_pdf(self.farmer, '2025-01-01', '2025-12-31'),
+            'income': lambda: build_income_pdf(self.farmer),
+            'analytics': lambda: build_analytics_pdf(self.farmer, 2025),
+        }
+        for name, build in builders.items():
+            with self.subTest(report=name):
+                self.assertTrue(build().startswith(b'%PDF'))
+
+    def test_export_endpoint(self):
+        self.client.force_login(self.farmer)
+        response = self.client.get('/farm-management/api/export/expenses/pdf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
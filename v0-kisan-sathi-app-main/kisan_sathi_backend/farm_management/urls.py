@@ -15,6 +15,7 @@ router.register(r'livestock', views.LivestockViewSet, basename='livestock')
 router.register(r'vaccinations', views.VaccinationRecordViewSet, basename='vaccination')
 router.register(r'loans', views.LoanViewSet, basename='loan')
 router.register(r'emi-payments', views.EMIPaymentViewSet, basename='emipayment')
+router.register(r'report-jobs', views.ReportExportJobViewSet, basename='reportjob')
 
 urlpatterns = [
     # API URLs
@@ -2,10 +2,19 @@
 Utility functions for Farm Management module
 """
 from decimal import Decimal
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.fonts import addMapping
-import os
+from itertools import chain, islice
+import tempfile
+
+from kisan_sathi.pdf_styles import get_pdf_fonts
+
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXCEL_CURRENCY_FORMAT = '₹#,##0.00'
+
+# Rows fetched per database round-trip when streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows inspected to size columns instead of scanning the whole sheet
+EXCEL_WIDTH_SAMPLE_ROWS = 200
 
 
 def format_currency(amount):
@@ -55,69 +64,13 @@ def register_unicode_fonts():
     """
     Register Unicode fonts for PDF generation to support rupee symbol
     
-    This function tries to register DejaVu Sans font which supports Unicode characters
-    including the Indian Rupee symbol (₹)
+    Fonts come from the shared registry in kisan_sathi.pdf_styles, which
+    resolves them once per process.
     
     Returns:
         str: Name of the registered font family
     """
-    try:
-        # Try to use DejaVu Sans (commonly available on most systems)
-        # On Windows, fonts are typically in C:\Windows\Fonts
-        # On Linux, fonts are in /usr/share/fonts
-        # On Mac, fonts are in /Library/Fonts or ~/Library/Fonts
-        
-        font_paths = [
-            # Windows paths
-            'C:/Windows/Fonts/DejaVuSans.ttf',
-            'C:/Windows/Fonts/Arial.ttf',
-            # Linux paths
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-            '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
-            # Mac paths
-            '/Library/Fonts/Arial Unicode.ttf',
-            '/System/Library/Fonts/Supplemental/Arial Unicode.ttf',
-        ]
-        
-        font_registered = False
-        font_name = 'DejaVuSans'
-        
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                try:
-                    pdfmetrics.registerFont(TTFont(font_name, font_path))
-                    font_registered = True
-                    break
-                except Exception:
-                    continue
-        
-        if not font_registered:
-            # Fallback: Use Helvetica (won't show rupee symbol correctly)
-            # But at least won't crash
-            return 'Helvetica'
-        
-        # Register bold variant if available
-        bold_paths = [
-            'C:/Windows/Fonts/DejaVuSans-Bold.ttf',
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
-        ]
-        
-        for bold_path in bold_paths:
-            if os.path.exists(bold_path):
-                try:
-                    pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', bold_path))
-                    addMapping('DejaVuSans', 0, 0, 'DejaVuSans')
-                    addMapping('DejaVuSans', 1, 0, 'DejaVuSans-Bold')
-                    break
-                except Exception:
-                    continue
-        
-        return font_name
-        
-    except Exception as e:
-        # Fallback to Helvetica if font registration fails
-        print(f"Font registration failed: {e}")
-        return 'Helvetica'
+    return get_pdf_fonts().regular
 
 
 def format_excel_currency(worksheet, cell, amount):
@@ -143,3 +96,86 @@ def format_excel_currency(worksheet, cell, amount):
     # Format: ₹#,##0.00 for amounts with decimals
     # Format: ₹#,##0 for whole numbers
     cell_obj.number_format = '₹#,##0.00'
+
+
+def _column_widths(headers, sample_rows, min_width=10, max_width=50):
+    """Estimate column widths from the header and a sample of rows"""
+    widths = [len(str(header)) for header in headers]
+    for row in sample_rows:
+        for col, value in enumerate(row):
+            if value is not None:
+                widths[col] = max(widths[col], len(str(value)))
+    return [min(max(width + 2, min_width), max_width) for width in widths]
+
+
+def write_streaming_workbook(title, headers, rows, header_color, currency_columns=(), footer=None):
+    """
+    Write an Excel export with a write-only openpyxl workbook
+
+    Rows are appended one at a time and flushed to disk by openpyxl, so memory
+    use does not grow with the number of rows. Column widths come from the
+    first EXCEL_WIDTH_SAMPLE_ROWS rows.
+
+    Args:
+        title: Worksheet title
+        headers: List of column headers
+        rows: Iterable of row value lists, consumed once
+        header_color: Hex fill colour for the header row
+        currency_columns: 0-based indexes of columns formatted as rupees
+        footer: Optional callable returning the last row, called after all
+            rows were written (e.g. a running total)
+
+    Returns:
+        file: Temporary file positioned at the start of the .xlsx data.
+        It is deleted when closed.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    rows = iter(rows)
+    sample = list(islice(rows, EXCEL_WIDTH_SAMPLE_ROWS))
+
+    # Column widths must be set before the first row in write-only mode
+    for col, width in enumerate(_column_widths(headers, sample), 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    header_fill = PatternFill(start_color=header_color, end_color=header_color, fill_type='solid')
+    header_font = Font(bold=True, color='FFFFFF', size=12)
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    def styled(row, bold=False):
+        cells = []
+        for col, value in enumerate(row):
+            if col in currency_columns or bold:
+                cell = WriteOnlyCell(ws, value=value)
+                if col in currency_columns:
+                    cell.number_format = EXCEL_CURRENCY_FORMAT
+                if bold:
+                    cell.font = Font(bold=True)
+                cells.append(cell)
+            else:
+                cells.append(value)
+        return cells
+
+    for row in chain(sample, rows):
+        ws.append(styled(row))
+
+    if footer is not None:
+        ws.append(styled(footer(), bold=True))
+
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return output
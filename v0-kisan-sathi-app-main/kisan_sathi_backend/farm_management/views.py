@@ -1,42 +1,49 @@
 from django.shortcuts import render
 from django.db.models import Sum, Count, Q, F
+from django.db.models.functions import TruncWeek, TruncMonth, TruncQuarter
 from django.utils import timezone
-from datetime import datetime, timedelta
-from rest_framework import viewsets, status
+from django.db import transaction
+from datetime import date, timedelta
+from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse
 from django.template.loader import get_template
 from django.contrib.auth.decorators import login_required
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from functools import wraps
 import json
-from decimal import Decimal
-import io
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, numbers
-from openpyxl.utils import get_column_letter
+from decimal import Decimal, InvalidOperation
 
 from .models import (
     ExpenseCategory, Expense, Crop, Income, InventoryCategory, 
     InventoryItem, CropPlan, LivestockType, Livestock, 
-    VaccinationRecord, Loan, EMIPayment
+    VaccinationRecord, Loan, EMIPayment, ReportExportJob
 )
 from .serializers import (
     ExpenseCategorySerializer, ExpenseSerializer, CropSerializer, 
     IncomeSerializer, InventoryCategorySerializer, InventoryItemSerializer,
     CropPlanSerializer, LivestockTypeSerializer, LivestockSerializer,
     VaccinationRecordSerializer, LoanSerializer, EMIPaymentSerializer,
-    MonthlyProfitSerializer, DashboardStatsSerializer, ExpenseByCategorySerializer
+    MonthlyProfitSerializer, DashboardStatsSerializer, ExpenseByCategorySerializer,
+    ReportExportJobSerializer, InventoryMovementSerializer, StockUseSerializer
 )
-from .utils import format_currency, register_unicode_fonts, format_excel_currency
+from .utils import (
+    format_excel_currency, write_streaming_workbook, EXCEL_CONTENT_TYPE, EXPORT_CHUNK_SIZE
+)
+from .reports import (
+    build_expenses_pdf, build_income_pdf, build_analytics_pdf,
+    report_cache_key, report_filename, REPORT_JOB_TIMEOUT
+)
+from .tasks import generate_report
+from .mixins import BulkWriteMixin, RelatedFieldsMixin
+from .inventory import InsufficientStock, record_stock_changes, use_stock
+from .pagination import (
+    KeysetPagination, ExpensePagination, IncomePagination, InventoryPagination,
+    CropPlanPagination, VaccinationPagination, LoanPagination, EMIPaymentPagination
+)
+from .ledger import ledger_totals, ledger_totals_by_period, ledger_breakdown
 
 # Custom decorator for dual authentication (Session + JWT)
 def dual_auth_required(view_func):
@@ -65,12 +72,21 @@ class ExpenseCategoryViewSet(viewsets.ModelViewSet):
     serializer_class = ExpenseCategorySerializer
     permission_classes = []  # Public access for reference data
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(BulkWriteMixin, RelatedFieldsMixin, viewsets.ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ExpensePagination
+    select_related_fields = ('category',)
+    bulk_item_name = 'expenses'
+    bulk_updates_ledger = True
 
     def get_queryset(self):
-        queryset = Expense.objects.filter(farmer=self.request.user)
+        # Deleted expenses are only reachable through history/restore
+        if self.action in ('history', 'restore'):
+            queryset = Expense.objects.only_deleted()
+        else:
+            queryset = Expense.objects.all()
+        queryset = queryset.filter(farmer=self.request.user)
         
         # Filter by category
         category = self.request.query_params.get('category', None)
@@ -117,7 +133,7 @@ class ExpenseViewSet(viewsets.ModelViewSet):
                     'message': 'You do not have permission to delete this expense'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            self.perform_destroy(instance)
+            instance.soft_delete()
             return Response({
                 'success': True,
                 'message': 'Expense deleted successfully'
@@ -128,14 +144,36 @@ class ExpenseViewSet(viewsets.ModelViewSet):
                 'message': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['patch'])
+    def restore(self, request, pk=None):
+        """Restore a soft-deleted expense"""
+        instance = self.get_object()
+        instance.restore()
+        return Response({
+            'success': True,
+            'message': 'Expense restored successfully',
+            'data': self.get_serializer(instance).data
+        })
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """List soft-deleted expenses"""
+        serializer = self.get_serializer(self.filter_queryset(self.get_queryset()), many=True)
+        return Response({
+            'success': True,
+            'data': serializer.data
+        })
+
     @action(detail=False, methods=['get'])
     def summary(self, request):
         queryset = self.get_queryset()
         total = queryset.aggregate(total=Sum('amount'))['total'] or Decimal('0')
         count = queryset.count()
+        deleted_count = Expense.objects.only_deleted().filter(farmer=request.user).count()
         return Response({
             'total_expenses': total,
-            'expense_count': count
+            'expense_count': count,
+            'deleted_count': deleted_count
         })
 
 class CropViewSet(viewsets.ModelViewSet):
@@ -143,12 +181,22 @@ class CropViewSet(viewsets.ModelViewSet):
     serializer_class = CropSerializer
     permission_classes = []  # Public access for reference data
 
-class IncomeViewSet(viewsets.ModelViewSet):
+class IncomeViewSet(BulkWriteMixin, RelatedFieldsMixin, viewsets.ModelViewSet):
     serializer_class = IncomeSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IncomePagination
+    select_related_fields = ('crop',)
+    bulk_item_name = 'income records'
+    bulk_computed_fields = ('total_amount',)
+    bulk_updates_ledger = True
 
     def get_queryset(self):
-        queryset = Income.objects.filter(farmer=self.request.user)
+        # Deleted income records are only reachable through history/restore
+        if self.action in ('history', 'restore'):
+            queryset = Income.objects.only_deleted()
+        else:
+            queryset = Income.objects.all()
+        queryset = queryset.filter(farmer=self.request.user)
         
         # Filter by crop
         crop = self.request.query_params.get('crop', None)
@@ -177,6 +225,9 @@ class IncomeViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(farmer=self.request.user)
+
+    def prepare_bulk_instance(self, instance):
+        instance.calculate_total_amount()
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -200,7 +251,7 @@ class IncomeViewSet(viewsets.ModelViewSet):
                     'message': 'You do not have permission to delete this income'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            self.perform_destroy(instance)
+            instance.soft_delete()
             return Response({
                 'success': True,
                 'message': 'Income deleted successfully'
@@ -211,14 +262,50 @@ class IncomeViewSet(viewsets.ModelViewSet):
                 'message': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['patch'])
+    def restore(self, request, pk=None):
+        """Restore a soft-deleted income record"""
+        instance = self.get_object()
+        instance.restore()
+        return Response({
+            'success': True,
+            'message': 'Income restored successfully',
+            'data': self.get_serializer(instance).data
+        })
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """List soft-deleted income records"""
+        serializer = self.get_serializer(self.filter_queryset(self.get_queryset()), many=True)
+        return Response({
+            'success': True,
+            'data': serializer.data
+        })
+
     @action(detail=False, methods=['get'])
     def summary(self, request):
         queryset = self.get_queryset()
         total = queryset.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
         count = queryset.count()
+        deleted_count = Income.objects.only_deleted().filter(farmer=request.user).count()
+        by_crop = queryset.values('crop__name').annotate(
+            total_quantity=Sum('quantity'),
+            total_amount=Sum('total_amount'),
+            count=Count('id')
+        ).order_by('-total_amount')
         return Response({
             'total_income': total,
-            'income_count': count
+            'income_count': count,
+            'deleted_count': deleted_count,
+            'by_crop': [
+                {
+                    'crop': row['crop__name'],
+                    'total_quantity': row['total_quantity'],
+                    'total_amount': row['total_amount'],
+                    'count': row['count']
+                }
+                for row in by_crop
+            ]
         })
 
 class InventoryCategoryViewSet(viewsets.ModelViewSet):
@@ -226,9 +313,13 @@ class InventoryCategoryViewSet(viewsets.ModelViewSet):
     serializer_class = InventoryCategorySerializer
     permission_classes = []  # Public access for reference data
 
-class InventoryItemViewSet(viewsets.ModelViewSet):
+class InventoryItemViewSet(BulkWriteMixin, RelatedFieldsMixin, viewsets.ModelViewSet):
     serializer_class = InventoryItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = InventoryPagination
+    select_related_fields = ('category',)
+    bulk_item_name = 'inventory items'
+    bulk_computed_fields = ('low_stock_since',)
 
     def get_queryset(self):
         queryset = InventoryItem.objects.filter(farmer=self.request.user)
@@ -245,8 +336,37 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(farmer=self.request.user)
+        item = serializer.save(farmer=self.request.user)
+        record_stock_changes([(item, None)])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # get_object() read the stock outside this transaction; re-read it
+        # under a row lock so a concurrent use_stock is neither overwritten
+        # nor misreported in the adjustment movement
+        item = serializer.instance
+        item.current_stock, item.low_stock_since = InventoryItem.objects.select_for_update().filter(
+            pk=item.pk
+        ).values_list('current_stock', 'low_stock_since').get()
+        previous = item.current_stock
+
+        fields = set(serializer.validated_data)
+        if fields & {'current_stock', 'minimum_stock'}:
+            fields.add('low_stock_since')
+        for field, value in serializer.validated_data.items():
+            setattr(item, field, value)
+        # Only the submitted columns, so an edit that leaves the stock alone never writes it
+        item.save(update_fields=fields | {'updated_at'})
+        record_stock_changes([(item, previous)])
+
+    def prepare_bulk_instance(self, instance):
+        instance.sync_low_stock()
+
+    def bulk_written(self, previous, current):
+        before = {item.pk: item.current_stock for item in previous}
+        record_stock_changes((item, before.get(item.pk)) for item in current)
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -261,8 +381,9 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
-        low_stock_items = self.get_queryset().filter(
-            current_stock__lte=F('minimum_stock')
+        # low_stock_since is kept current by every stock movement
+        low_stock_items = self.filter_queryset(self.get_queryset()).filter(
+            low_stock_since__isnull=False
         )
         serializer = self.get_serializer(low_stock_items, many=True)
         return Response(serializer.data)
@@ -274,36 +395,110 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
         
         try:
             quantity = Decimal(str(quantity))
-            if quantity <= 0:
-                return Response({
-                    'success': False,
-                    'message': 'Quantity must be greater than 0'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            if item.current_stock < quantity:
-                return Response({
-                    'success': False,
-                    'message': 'Insufficient stock'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            item.current_stock -= quantity
-            item.save()
-            
-            serializer = self.get_serializer(item)
-            return Response({
-                'success': True,
-                'message': f'Used {quantity} {item.unit} of {item.name}',
-                'data': serializer.data
-            })
-        except (ValueError, TypeError):
+        except (ValueError, TypeError, InvalidOperation):
             return Response({
                 'success': False,
                 'message': 'Invalid quantity'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-class CropPlanViewSet(viewsets.ModelViewSet):
+        if not quantity.is_finite() or quantity <= 0:
+            return Response({
+                'success': False,
+                'message': 'Quantity must be greater than 0'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            use_stock([(item, quantity)], notes=request.data.get('notes', ''))
+        except InsufficientStock:
+            return Response({
+                'success': False,
+                'message': 'Insufficient stock'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(item)
+        return Response({
+            'success': True,
+            'message': f'Used {quantity} {item.unit} of {item.name}',
+            'data': serializer.data
+        })
+
+    @action(detail=False, methods=['post'], url_path='use_stock')
+    def use_stock_batch(self, request):
+        """Use stock of several items at once; all succeed or none do"""
+        serializer = StockUseSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Invalid request',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        rows = serializer.validated_data['items']
+
+        items = self.filter_queryset(self.get_queryset()).in_bulk([row['item'] for row in rows])
+        errors = [{} for _ in rows]
+        seen = set()
+        for index, row in enumerate(rows):
+            if row['item'] in seen:
+                errors[index] = {'item': ['Duplicate item in this request']}
+            elif row['item'] not in items:
+                errors[index] = {'item': ['Not found']}
+            seen.add(row['item'])
+
+        if not any(errors):
+            try:
+                use_stock(
+                    [(items[row['item']], row['quantity']) for row in rows],
+                    notes=serializer.validated_data['notes']
+                )
+            except InsufficientStock as exc:
+                short = {item.pk for item in exc.items}
+                for index, row in enumerate(rows):
+                    if row['item'] in short:
+                        errors[index] = {'quantity': ['Insufficient stock']}
+
+        if any(errors):
+            return Response({
+                'success': False,
+                'message': 'Some rows are invalid; no stock was used',
+                'errors': [{'index': index, 'errors': row} for index, row in enumerate(errors) if row]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        used = [items[row['item']] for row in rows]
+        return Response({
+            'success': True,
+            'message': f'Used stock of {len(used)} items',
+            'data': self.get_serializer(used, many=True).data
+        })
+
+    @action(detail=True, methods=['get'])
+    def movements(self, request, pk=None):
+        """Stock movement history of one item, newest first"""
+        item = self.get_object()
+        paginator = KeysetPagination()
+        movements = paginator.paginate_queryset(item.movements.all(), request, view=self)
+        return paginator.get_paginated_response(InventoryMovementSerializer(movements, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Stock totals over the filtered items, for the stats cards and the inventory report"""
+        queryset = self.get_queryset()
+        today = timezone.now().date()
+        totals = queryset.aggregate(
+            total_items=Count('id'),
+            low_stock_count=Count('id', filter=Q(current_stock__lte=F('minimum_stock'))),
+            total_value=Sum(F('current_stock') * F('cost_per_unit')),
+            expiring_count=Count('id', filter=Q(
+                expiry_date__gte=today, expiry_date__lte=today + timedelta(days=30)
+            ))
+        )
+        totals['total_value'] = totals['total_value'] or Decimal('0')
+        return Response(totals)
+
+class CropPlanViewSet(RelatedFieldsMixin, viewsets.ModelViewSet):
     serializer_class = CropPlanSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CropPlanPagination
+    select_related_fields = ('crop',)
 
     def get_queryset(self):
         return CropPlan.objects.filter(farmer=self.request.user)
@@ -311,14 +506,24 @@ class CropPlanViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(farmer=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        counts = dict(self.get_queryset().values_list('status').annotate(count=Count('id')).order_by())
+        return Response({
+            status_value: counts.get(status_value, 0)
+            for status_value, _ in CropPlan._meta.get_field('status').choices
+        })
+
 class LivestockTypeViewSet(viewsets.ModelViewSet):
     queryset = LivestockType.objects.all()
     serializer_class = LivestockTypeSerializer
     permission_classes = []  # Public access for reference data
 
-class LivestockViewSet(viewsets.ModelViewSet):
+class LivestockViewSet(RelatedFieldsMixin, viewsets.ModelViewSet):
     serializer_class = LivestockSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    select_related_fields = ('livestock_type',)
 
     def get_queryset(self):
         return Livestock.objects.filter(farmer=self.request.user)
@@ -326,9 +531,22 @@ class LivestockViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(farmer=self.request.user)
 
-class VaccinationRecordViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        queryset = self.get_queryset()
+        by_type = queryset.values('livestock_type__name').annotate(count=Count('id')).order_by('livestock_type__name')
+        by_health = queryset.values('health_status').annotate(count=Count('id')).order_by('health_status')
+        return Response({
+            'total': queryset.count(),
+            'by_type': {row['livestock_type__name']: row['count'] for row in by_type},
+            'by_health': {row['health_status']: row['count'] for row in by_health}
+        })
+
+class VaccinationRecordViewSet(RelatedFieldsMixin, viewsets.ModelViewSet):
     serializer_class = VaccinationRecordSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = VaccinationPagination
+    select_related_fields = ('livestock__livestock_type',)
 
     def get_queryset(self):
         return VaccinationRecord.objects.filter(livestock__farmer=self.request.user)
@@ -336,7 +554,7 @@ class VaccinationRecordViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
         upcoming_date = timezone.now().date() + timedelta(days=30)
-        upcoming_vaccinations = self.get_queryset().filter(
+        upcoming_vaccinations = self.filter_queryset(self.get_queryset()).filter(
             next_due_date__lte=upcoming_date,
             next_due_date__gte=timezone.now().date()
         )
@@ -346,6 +564,7 @@ class VaccinationRecordViewSet(viewsets.ModelViewSet):
 class LoanViewSet(viewsets.ModelViewSet):
     serializer_class = LoanSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LoanPagination
 
     def get_queryset(self):
         return Loan.objects.filter(farmer=self.request.user)
@@ -353,29 +572,101 @@ class LoanViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(farmer=self.request.user)
 
-class EMIPaymentViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        totals = self.get_queryset().aggregate(
+            active_count=Count('id', filter=Q(status='active')),
+            completed_count=Count('id', filter=Q(status='completed')),
+            total_outstanding=Sum('remaining_amount', filter=Q(status='active')),
+            monthly_emi=Sum('emi_amount', filter=Q(status='active'))
+        )
+        totals['total_outstanding'] = totals['total_outstanding'] or Decimal('0')
+        totals['monthly_emi'] = totals['monthly_emi'] or Decimal('0')
+        return Response(totals)
+
+class EMIPaymentViewSet(RelatedFieldsMixin, viewsets.ModelViewSet):
     serializer_class = EMIPaymentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = EMIPaymentPagination
+    select_related_fields = ('loan',)
 
     def get_queryset(self):
         return EMIPayment.objects.filter(loan__farmer=self.request.user)
 
+class ReportExportJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                             mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Queue PDF exports, poll their status and download the result"""
+    serializer_class = ReportExportJobSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return ReportExportJob.objects.filter(farmer=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report_type = serializer.validated_data['report_type']
+        params = serializer.validated_data['params']
+        cache_key = report_cache_key(report_type, request.user, params)
+
+        # A job stuck in pending/running past the timeout is never coming
+        # back; fail it so the request below queues a fresh one
+        now = timezone.now()
+        self.get_queryset().filter(
+            cache_key=cache_key,
+            status__in=['pending', 'running'],
+            created_at__lt=now - REPORT_JOB_TIMEOUT
+        ).update(status='failed', error='Timed out', completed_at=now)
+
+        # Same farmer, same params and unchanged data: reuse the existing job
+        existing = self.get_queryset().filter(
+            cache_key=cache_key,
+            status__in=['pending', 'running', 'completed']
+        ).first()
+        if existing is not None and (existing.status != 'completed' or existing.file):
+            return Response({
+                'success': True,
+                'message': 'Report already requested',
+                'cached': True,
+                'data': self.get_serializer(existing).data
+            }, status=status.HTTP_200_OK)
+
+        job = serializer.save(farmer=request.user, cache_key=cache_key)
+        transaction.on_commit(lambda: generate_report.delay(job.pk))
+        job.refresh_from_db()
+        return Response({
+            'success': True,
+            'message': 'Report queued',
+            'cached': False,
+            'data': self.get_serializer(job).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'completed' or not job.file:
+            return Response({
+                'success': False,
+                'message': f'Report is not ready (status: {job.status})'
+            }, status=status.HTTP_409_CONFLICT)
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=report_filename(job.report_type, job.params),
+            content_type='application/pdf'
+        )
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_stats(request):
     farmer = request.user
     current_year = timezone.now().year
     
-    # Calculate total income and expenses for current year
-    total_income = Income.objects.filter(
-        farmer=farmer, 
-        sale_date__year=current_year
-    ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-    
-    total_expenses = Expense.objects.filter(
-        farmer=farmer, 
-        date__year=current_year
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    # Total income and expenses for current year from the monthly ledger
+    totals = ledger_totals(farmer, current_year)
+    total_income = totals['income']
+    total_expenses = totals['expense']
     
     net_profit = total_income - total_expenses
     
@@ -385,7 +676,7 @@ def dashboard_stats(request):
     # Count low stock items
     low_stock_items = InventoryItem.objects.filter(
         farmer=farmer,
-        current_stock__lte=F('minimum_stock')
+        low_stock_since__isnull=False
     ).count()
     
     # Count upcoming vaccinations (next 30 days)
@@ -415,39 +706,98 @@ def dashboard_stats(request):
     serializer = DashboardStatsSerializer(stats)
     return Response(serializer.data)
 
+PERIOD_TRUNCATORS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+
+
+def period_starts(year, granularity):
+    """Return the start date of every bucket that overlaps the given year"""
+    if granularity == 'week':
+        # Weeks start on Monday, so the first bucket may begin in December
+        first_day = date(year, 1, 1)
+        start = first_day - timedelta(days=first_day.weekday())
+        starts = []
+        while start.year <= year:
+            starts.append(start)
+            start += timedelta(weeks=1)
+        return starts
+    step = 3 if granularity == 'quarter' else 1
+    return [date(year, month, 1) for month in range(1, 13, step)]
+
+
+def period_label(start, granularity):
+    """Human readable label for a bucket start date"""
+    if granularity == 'week':
+        return f"Week of {start.strftime('%d %b')}"
+    if granularity == 'quarter':
+        return f"Q{(start.month - 1) // 3 + 1}"
+    return start.strftime('%B')
+
+
+def totals_by_period(queryset, date_field, amount_field, granularity):
+    """Sum amount_field per period bucket with a single grouped query"""
+    rows = queryset.annotate(
+        period=PERIOD_TRUNCATORS[granularity](date_field)
+    ).values('period').annotate(
+        total=Sum(amount_field)
+    ).order_by('period')
+    return {row['period']: row['total'] or Decimal('0') for row in rows}
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def monthly_profit_chart(request):
     farmer = request.user
-    year = request.GET.get('year', timezone.now().year)
-    
-    monthly_data = []
-    
-    for month in range(1, 13):
-        # Calculate monthly income
-        monthly_income = Income.objects.filter(
-            farmer=farmer,
-            sale_date__year=year,
-            sale_date__month=month
-        ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-        
-        # Calculate monthly expenses
-        monthly_expense = Expense.objects.filter(
-            farmer=farmer,
-            date__year=year,
-            date__month=month
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        monthly_profit = monthly_income - monthly_expense
-        
-        monthly_data.append({
-            'month': datetime(int(year), month, 1).strftime('%B'),
-            'total_income': monthly_income,
-            'total_expense': monthly_expense,
-            'profit': monthly_profit
+    granularity = request.GET.get('granularity', 'month')
+
+    try:
+        year = int(request.GET.get('year', timezone.now().year))
+    except ValueError:
+        year = None
+    # Week buckets may start in the previous December, so keep a year of room
+    if year is None or not date.min.year < year < date.max.year:
+        return Response({
+            'success': False,
+            'message': 'year must be a valid year, e.g. 2025'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if granularity not in PERIOD_TRUNCATORS:
+        return Response({
+            'success': False,
+            'message': f"granularity must be one of: {', '.join(PERIOD_TRUNCATORS)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if granularity == 'week':
+        # The ledger is monthly, so weeks need one grouped query per table
+        income_totals = totals_by_period(
+            Income.objects.filter(farmer=farmer, sale_date__year=year),
+            'sale_date', 'total_amount', granularity
+        )
+        expense_totals = totals_by_period(
+            Expense.objects.filter(farmer=farmer, date__year=year),
+            'date', 'amount', granularity
+        )
+    else:
+        totals = ledger_totals_by_period(farmer, year, granularity)
+        income_totals = totals['income']
+        expense_totals = totals['expense']
+
+    period_data = []
+    for start in period_starts(year, granularity):
+        period_income = income_totals.get(start, Decimal('0'))
+        period_expense = expense_totals.get(start, Decimal('0'))
+        period_data.append({
+            'month': period_label(start, granularity),
+            'period_start': start,
+            'total_income': period_income,
+            'total_expense': period_expense,
+            'profit': period_income - period_expense
         })
-    
-    serializer = MonthlyProfitSerializer(monthly_data, many=True)
+
+    serializer = MonthlyProfitSerializer(period_data, many=True)
     return Response(serializer.data)
 
 @api_view(['GET'])
@@ -457,12 +807,7 @@ def expense_by_category(request):
     year = request.GET.get('year', timezone.now().year)
     
     # Get expenses by category for the year
-    category_expenses = Expense.objects.filter(
-        farmer=farmer,
-        date__year=year
-    ).values('category__name').annotate(
-        total_amount=Sum('amount')
-    ).order_by('-total_amount')
+    category_expenses = ledger_breakdown(farmer, year, 'expense')
     
     # Calculate total expenses for percentage calculation
     total_expenses = sum(item['total_amount'] for item in category_expenses)
@@ -506,177 +851,15 @@ def reports_view(request):
 # PDF Export
 @dual_auth_required
 def export_expenses_pdf(request):
-    farmer = request.user
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    
-    # Register Unicode fonts for rupee symbol support
-    font_name = register_unicode_fonts()
-    
-    # Query expenses
-    expenses = Expense.objects.filter(farmer=farmer)
-    if start_date:
-        expenses = expenses.filter(date__gte=start_date)
-    if end_date:
-        expenses = expenses.filter(date__lte=end_date)
-    
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title with Unicode font
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#2c3e50'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName=font_name
-    )
-    elements.append(Paragraph('Expense Report', title_style))
-    elements.append(Spacer(1, 12))
-    
-    # Farmer info with Unicode font
-    info_style = ParagraphStyle(
-        'InfoStyle',
-        parent=styles['Normal'],
-        fontName=font_name
-    )
-    elements.append(Paragraph(f'<b>Farmer:</b> {farmer.get_full_name() or farmer.username}', info_style))
-    elements.append(Paragraph(f'<b>Report Date:</b> {timezone.now().strftime("%d %B %Y")}', info_style))
-    if start_date and end_date:
-        elements.append(Paragraph(f'<b>Period:</b> {start_date} to {end_date}', info_style))
-    elements.append(Spacer(1, 20))
-    
-    # Table data with formatted currency
-    data = [['Date', 'Category', 'Amount', 'Notes']]
-    total = Decimal('0')
-    
-    for expense in expenses:
-        data.append([
-            expense.date.strftime('%d-%m-%Y'),
-            expense.category.name,
-            format_currency(expense.amount),
-            expense.notes[:50] if expense.notes else '-'
-        ])
-        total += expense.amount
-    
-    # Add total row
-    data.append(['', '', f'Total: {format_currency(total)}', ''])
-    
-    # Create table with Unicode font
-    table = Table(data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 3*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ecf0f1')),
-        ('FONTNAME', (0, -1), (-1, -1), font_name),
-        ('FONTSIZE', (0, -1), (-1, -1), 11),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
+    pdf = build_expenses_pdf(request.user, request.GET.get('start_date'), request.GET.get('end_date'))
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="expenses_{timezone.now().strftime("%Y%m%d")}.pdf"'
     return response
 
 @dual_auth_required
 def export_income_pdf(request):
-    farmer = request.user
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    
-    # Register Unicode fonts for rupee symbol support
-    font_name = register_unicode_fonts()
-    
-    # Query income
-    income_records = Income.objects.filter(farmer=farmer)
-    if start_date:
-        income_records = income_records.filter(sale_date__gte=start_date)
-    if end_date:
-        income_records = income_records.filter(sale_date__lte=end_date)
-    
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title with Unicode font
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#27ae60'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName=font_name
-    )
-    elements.append(Paragraph('Income Report', title_style))
-    elements.append(Spacer(1, 12))
-    
-    # Farmer info with Unicode font
-    info_style = ParagraphStyle(
-        'InfoStyle',
-        parent=styles['Normal'],
-        fontName=font_name
-    )
-    elements.append(Paragraph(f'<b>Farmer:</b> {farmer.get_full_name() or farmer.username}', info_style))
-    elements.append(Paragraph(f'<b>Report Date:</b> {timezone.now().strftime("%d %B %Y")}', info_style))
-    if start_date and end_date:
-        elements.append(Paragraph(f'<b>Period:</b> {start_date} to {end_date}', info_style))
-    elements.append(Spacer(1, 20))
-    
-    # Table data with formatted currency
-    data = [['Date', 'Crop', 'Quantity', 'Rate', 'Total', 'Buyer']]
-    total = Decimal('0')
-    
-    for income in income_records:
-        data.append([
-            income.sale_date.strftime('%d-%m-%Y'),
-            income.crop.name,
-            f'{income.quantity} {income.unit}',
-            format_currency(income.rate_per_unit),
-            format_currency(income.total_amount),
-            income.buyer_name[:20]
-        ])
-        total += income.total_amount
-    
-    # Add total row
-    data.append(['', '', '', '', f'Total: {format_currency(total)}', ''])
-    
-    # Create table with Unicode font
-    table = Table(data, colWidths=[1.2*inch, 1.5*inch, 1.2*inch, 1.2*inch, 1.5*inch, 1.5*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#27ae60')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (3, 0), (4, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ecf0f1')),
-        ('FONTNAME', (0, -1), (-1, -1), font_name),
-        ('FONTSIZE', (0, -1), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
+    pdf = build_income_pdf(request.user, request.GET.get('start_date'), request.GET.get('end_date'))
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="income_{timezone.now().strftime("%Y%m%d")}.pdf"'
     return response
 
@@ -694,60 +877,31 @@ def export_expenses_excel(request):
     if end_date:
         expenses = expenses.filter(date__lte=end_date)
     
-    # Create workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Expenses'
-    
-    # Header styling
-    header_fill = PatternFill(start_color='3498db', end_color='3498db', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF', size=12)
+    # Stream plain tuples (joined with the category) in chunks
+    expense_rows = expenses.values_list('date', 'category__name', 'amount', 'notes')
+    total = Decimal('0')
     
-    # Headers
-    headers = ['Date', 'Category', 'Amount', 'Notes']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
+    def rows():
+        nonlocal total
+        for expense_date, category_name, amount, notes in expense_rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            total += amount
+            yield [expense_date.strftime('%d-%m-%Y'), category_name, float(amount), notes]
+    
+    output = write_streaming_workbook(
+        'Expenses',
+        ['Date', 'Category', 'Amount', 'Notes'],
+        rows(),
+        header_color='3498db',
+        currency_columns=(2,),
+        footer=lambda: [None, 'TOTAL', float(total), None]
+    )
     
-    # Data with currency formatting
-    total = Decimal('0')
-    for row, expense in enumerate(expenses, 2):
-        ws.cell(row=row, column=1, value=expense.date.strftime('%d-%m-%Y'))
-        ws.cell(row=row, column=2, value=expense.category.name)
-        
-        # Format currency cell
-        amount_cell = ws.cell(row=row, column=3, value=float(expense.amount))
-        amount_cell.number_format = '₹#,##0.00'
-        
-        ws.cell(row=row, column=4, value=expense.notes)
-        total += expense.amount
-    
-    # Total row with currency formatting
-    total_row = len(expenses) + 2
-    ws.cell(row=total_row, column=2, value='TOTAL').font = Font(bold=True)
-    total_cell = ws.cell(row=total_row, column=3, value=float(total))
-    total_cell.font = Font(bold=True)
-    total_cell.number_format = '₹#,##0.00'
-    
-    # Adjust column widths
-    ws.column_dimensions['A'].width = 15
-    ws.column_dimensions['B'].width = 20
-    ws.column_dimensions['C'].width = 18
-    ws.column_dimensions['D'].width = 40
-    
-    # Save to buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    response = HttpResponse(
-        buffer,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'expenses_{timezone.now().strftime("%Y%m%d")}.xlsx',
+        content_type=EXCEL_CONTENT_TYPE
     )
-    response['Content-Disposition'] = f'attachment; filename="expenses_{timezone.now().strftime("%Y%m%d")}.xlsx"'
-    return response
 
 @dual_auth_required
 def export_income_excel(request):
@@ -762,223 +916,47 @@ def export_income_excel(request):
     if end_date:
         income_records = income_records.filter(sale_date__lte=end_date)
     
-    # Create workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Income'
-    
-    # Header styling
-    header_fill = PatternFill(start_color='27ae60', end_color='27ae60', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF', size=12)
+    # Stream plain tuples (joined with the crop) in chunks
+    income_rows = income_records.values_list(
+        'sale_date', 'crop__name', 'quantity', 'unit', 'rate_per_unit',
+        'total_amount', 'buyer_name', 'payment_status'
+    )
+    total = Decimal('0')
     
-    # Headers
-    headers = ['Date', 'Crop', 'Quantity', 'Unit', 'Rate per Unit', 'Total Amount', 'Buyer', 'Payment Status']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
+    def rows():
+        nonlocal total
+        for (sale_date, crop_name, quantity, unit, rate_per_unit,
+             total_amount, buyer_name, payment_status) in income_rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            total += total_amount
+            yield [
+                sale_date.strftime('%d-%m-%Y'), crop_name, float(quantity), unit,
+                float(rate_per_unit), float(total_amount), buyer_name, payment_status
+            ]
+    
+    output = write_streaming_workbook(
+        'Income',
+        ['Date', 'Crop', 'Quantity', 'Unit', 'Rate per Unit', 'Total Amount', 'Buyer', 'Payment Status'],
+        rows(),
+        header_color='27ae60',
+        currency_columns=(4, 5),
+        footer=lambda: [None, None, None, None, 'TOTAL', float(total), None, None]
+    )
     
-    # Data with currency formatting
-    total = Decimal('0')
-    for row, income in enumerate(income_records, 2):
-        ws.cell(row=row, column=1, value=income.sale_date.strftime('%d-%m-%Y'))
-        ws.cell(row=row, column=2, value=income.crop.name)
-        ws.cell(row=row, column=3, value=float(income.quantity))
-        ws.cell(row=row, column=4, value=income.unit)
-        
-        # Format currency cells
-        rate_cell = ws.cell(row=row, column=5, value=float(income.rate_per_unit))
-        rate_cell.number_format = '₹#,##0.00'
-        
-        amount_cell = ws.cell(row=row, column=6, value=float(income.total_amount))
-        amount_cell.number_format = '₹#,##0.00'
-        
-        ws.cell(row=row, column=7, value=income.buyer_name)
-        ws.cell(row=row, column=8, value=income.payment_status)
-        total += income.total_amount
-    
-    # Total row with currency formatting
-    total_row = len(income_records) + 2
-    ws.cell(row=total_row, column=5, value='TOTAL').font = Font(bold=True)
-    total_cell = ws.cell(row=total_row, column=6, value=float(total))
-    total_cell.font = Font(bold=True)
-    total_cell.number_format = '₹#,##0.00'
-    
-    # Adjust column widths
-    for col in range(1, 9):
-        ws.column_dimensions[get_column_letter(col)].width = 18
-    
-    # Save to buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    response = HttpResponse(
-        buffer,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'income_{timezone.now().strftime("%Y%m%d")}.xlsx',
+        content_type=EXCEL_CONTENT_TYPE
     )
-    response['Content-Disposition'] = f'attachment; filename="income_{timezone.now().strftime("%Y%m%d")}.xlsx"'
-    return response
 
 @dual_auth_required
 def export_analytics_pdf(request):
-    farmer = request.user
     year = request.GET.get('year', timezone.now().year)
-    
-    # Register Unicode fonts for rupee symbol support
-    font_name = register_unicode_fonts()
-    
-    # Get analytics data
-    total_income = Income.objects.filter(
-        farmer=farmer, 
-        sale_date__year=year
-    ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-    
-    total_expenses = Expense.objects.filter(
-        farmer=farmer, 
-        date__year=year
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-    
-    net_profit = total_income - total_expenses
-    
-    # Category-wise expenses
-    category_expenses = Expense.objects.filter(
-        farmer=farmer,
-        date__year=year
-    ).values('category__name').annotate(
-        total_amount=Sum('amount')
-    ).order_by('-total_amount')
-    
-    # Category-wise income (by crop)
-    category_income = Income.objects.filter(
-        farmer=farmer,
-        sale_date__year=year
-    ).values('crop__name').annotate(
-        total_amount=Sum('total_amount')
-    ).order_by('-total_amount')
-    
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title with Unicode font
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#8e44ad'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName=font_name
-    )
-    elements.append(Paragraph(f'Farm Analytics Report - {year}', title_style))
-    elements.append(Spacer(1, 12))
-    
-    # Farmer info with Unicode font
-    info_style = ParagraphStyle(
-        'InfoStyle',
-        parent=styles['Normal'],
-        fontName=font_name
-    )
-    elements.append(Paragraph(f'<b>Farmer:</b> {farmer.get_full_name() or farmer.username}', info_style))
-    elements.append(Paragraph(f'<b>Report Date:</b> {timezone.now().strftime("%d %B %Y")}', info_style))
-    elements.append(Spacer(1, 20))
-    
-    # Summary table with formatted currency
-    summary_data = [
-        ['Metric', 'Amount'],
-        ['Total Income', format_currency(total_income)],
-        ['Total Expenses', format_currency(total_expenses)],
-        ['Net Profit/Loss', format_currency(net_profit)]
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8e44ad')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f39c12') if net_profit >= 0 else colors.HexColor('#e74c3c')),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
-        ('FONTNAME', (0, -1), (-1, -1), font_name),
-        ('FONTSIZE', (0, -1), (-1, -1), 11),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    
-    elements.append(summary_table)
-    elements.append(Spacer(1, 30))
-    
-    # Category-wise expenses with Unicode font
-    heading_style = ParagraphStyle(
-        'HeadingStyle',
-        parent=styles['Heading2'],
-        fontName=font_name
-    )
-    elements.append(Paragraph('<b>Expense Breakdown by Category</b>', heading_style))
-    elements.append(Spacer(1, 12))
-    
-    category_data = [['Category', 'Amount', 'Percentage']]
-    for cat in category_expenses:
-        percentage = (cat['total_amount'] / total_expenses * 100) if total_expenses > 0 else 0
-        category_data.append([
-            cat['category__name'],
-            format_currency(cat['total_amount']),
-            f'{percentage:.1f}%'
-        ])
-    
-    category_table = Table(category_data, colWidths=[2.5*inch, 2*inch, 1.5*inch])
-    category_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (2, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    
-    elements.append(category_table)
-    elements.append(Spacer(1, 30))
-    
-    # Income Breakdown by Category with Unicode font
-    elements.append(Paragraph('<b>Income Breakdown by Category</b>', heading_style))
-    elements.append(Spacer(1, 12))
-    
-    income_data = [['Category (Crop)', 'Amount', 'Percentage']]
-    for crop in category_income:
-        percentage = (crop['total_amount'] / total_income * 100) if total_income > 0 else 0
-        income_data.append([
-            crop['crop__name'],
-            format_currency(crop['total_amount']),
-            f'{percentage:.1f}%'
-        ])
-    
-    income_table = Table(income_data, colWidths=[2.5*inch, 2*inch, 1.5*inch])
-    income_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#27ae60')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (2, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    
-    elements.append(income_table)
-    doc.build(elements)
-    
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
+    pdf = build_analytics_pdf(request.user, year)
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="analytics_{year}_{timezone.now().strftime("%Y%m%d")}.pdf"'
     return response
 
-
 # Income Breakdown View
 from django.contrib.auth.decorators import login_required
 
@@ -1001,12 +979,7 @@ def income_by_crop(request):
     year = request.GET.get('year', timezone.now().year)
     
     # Get income by crop for the year
-    crop_income = Income.objects.filter(
-        farmer=farmer,
-        sale_date__year=year
-    ).values('crop__name').annotate(
-        total_amount=Sum('total_amount')
-    ).order_by('-total_amount')
+    crop_income = ledger_breakdown(farmer, year, 'income')
     
     # Calculate total income for percentage
     total_income = sum(item['total_amount'] for item in crop_income)
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from datetime import timedelta
+from marketplace.models import DailyMetrics
 from .models import Farmer
 from .serializers import FarmerProfileSerializer
 
@@ -22,8 +23,8 @@ class AdminStatsView(APIView):
         active_users = Farmer.objects.filter(last_login__gte=thirty_days_ago).count()
         
         # Users by role
-        farmers_count = Farmer.objects.filter(user_type='farmer').count()
-        buyers_count = Farmer.objects.filter(user_type='buyer').count()
+        farmers_count = Farmer.objects.filter(farmer_profile__isnull=False).count()
+        buyers_count = Farmer.objects.filter(buyer_profile__isnull=False).count()
         
         # New signups today
         today = timezone.now().date()
@@ -32,6 +33,11 @@ class AdminStatsView(APIView):
         # Active users today (logged in today)
         active_today = Farmer.objects.filter(last_login__date=today).count()
         
+        # Marketplace totals from the DailyMetrics rollups, not the orders table
+        orders = DailyMetrics.objects.aggregate(
+            total_transactions=Sum('total_orders'), revenue=Sum('total_revenue')
+        )
+        
         return Response({
             'success': True,
             'data': {
@@ -41,8 +47,8 @@ class AdminStatsView(APIView):
                 'buyers_count': buyers_count,
                 'new_signups_today': new_signups_today,
                 'active_today': active_today,
-                'total_transactions': 0,  # TODO: Implement when transaction model exists
-                'revenue': 0,  # TODO: Implement when transaction model exists
+                'total_transactions': orders['total_transactions'] or 0,
+                'revenue': float(orders['revenue'] or 0),
             }
         })
 
@@ -2,6 +2,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.contrib.auth.signals import user_logged_in
 from django.utils import timezone
 from .models import Farmer
 from .serializers import FarmerRegistrationSerializer, LoginSerializer, FarmerProfileSerializer
@@ -72,6 +73,9 @@ class LoginAPIView(APIView):
         if serializer.is_valid():
             data = serializer.validated_data
             farmer = data['farmer']
+            # Token logins skip django.contrib.auth.login(); send its signal so
+            # last_login is kept and receivers (e.g. the cart merge) run
+            user_logged_in.send(sender=farmer.__class__, request=request, user=farmer)
 
             # Return complete farmer profile using serializer
             profile_serializer = FarmerProfileSerializer(farmer)
@@ -0,0 +1,17 @@
+"""
+Celery application for kisan_sathi project.
+
+Workers are started with:
+    celery -A kisan_sathi worker -l info
+and periodic tasks (CELERY_BEAT_SCHEDULE) with:
+    celery -A kisan_sathi beat -l info
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kisan_sathi.settings')
+
+app = Celery('kisan_sathi')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,121 @@
+"""
+Shared ReportLab font and paragraph-style registry
+
+Every PDF producer (farm management exports, soil analysis reports and the
+crop doctor report) pulls its fonts and styles from here. Font files are
+probed and parsed once per process - at app ready() - and styles are built
+once per distinct definition, so rendering a PDF only pays for its content.
+"""
+from collections import namedtuple
+from functools import lru_cache
+import logging
+import os
+
+from reportlab.lib.fonts import addMapping
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+logger = logging.getLogger(__name__)
+
+UNICODE_FONT_NAME = 'DejaVuSans'
+UNICODE_BOLD_FONT_NAME = 'DejaVuSans-Bold'
+
+# Regular fonts with the Indian Rupee symbol (₹), in order of preference
+FONT_PATHS = [
+    # Windows paths
+    'C:/Windows/Fonts/DejaVuSans.ttf',
+    'C:/Windows/Fonts/Arial.ttf',
+    # Linux paths
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    # Mac paths
+    '/Library/Fonts/Arial Unicode.ttf',
+    '/System/Library/Fonts/Supplemental/Arial Unicode.ttf',
+]
+
+BOLD_FONT_PATHS = [
+    'C:/Windows/Fonts/DejaVuSans-Bold.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+]
+
+PDFFonts = namedtuple('PDFFonts', ['regular', 'bold'])
+
+# Built-in fonts used when no Unicode font is installed (no rupee symbol)
+FALLBACK_FONTS = PDFFonts('Helvetica', 'Helvetica-Bold')
+
+
+def _register_first(font_name, paths):
+    """Register the first loadable font file in paths under font_name"""
+    for font_path in paths:
+        if os.path.exists(font_path):
+            try:
+                pdfmetrics.registerFont(TTFont(font_name, font_path))
+                return True
+            except Exception:
+                continue
+    return False
+
+
+def load_pdf_fonts():
+    """
+    Probe the font paths and register the Unicode fonts with ReportLab
+
+    This is the uncached work behind get_pdf_fonts(); call that instead.
+
+    Returns:
+        PDFFonts: Names of the regular and bold fonts to use
+    """
+    try:
+        if not _register_first(UNICODE_FONT_NAME, FONT_PATHS):
+            return FALLBACK_FONTS
+
+        bold = UNICODE_FONT_NAME
+        if _register_first(UNICODE_BOLD_FONT_NAME, BOLD_FONT_PATHS):
+            addMapping(UNICODE_FONT_NAME, 0, 0, UNICODE_FONT_NAME)
+            addMapping(UNICODE_FONT_NAME, 1, 0, UNICODE_BOLD_FONT_NAME)
+            bold = UNICODE_BOLD_FONT_NAME
+        return PDFFonts(UNICODE_FONT_NAME, bold)
+    except Exception as e:
+        logger.warning('PDF font registration failed: %s', e)
+        return FALLBACK_FONTS
+
+
+@lru_cache(maxsize=None)
+def get_pdf_fonts():
+    """Registered PDF fonts, resolved once per process"""
+    return load_pdf_fonts()
+
+
+@lru_cache(maxsize=None)
+def get_stylesheet():
+    """
+    ReportLab's sample stylesheet, built once per process
+
+    The returned styles are shared; derive new ones with pdf_style() instead
+    of modifying them.
+    """
+    return getSampleStyleSheet()
+
+
+@lru_cache(maxsize=None)
+def pdf_style(name, parent='Normal', **attrs):
+    """
+    Shared ParagraphStyle derived from a sample stylesheet style
+
+    Styles are cached per (name, parent, attrs), so callers can declare them
+    inline without rebuilding them for every PDF. All attribute values must be
+    hashable (ReportLab colors are).
+
+    Args:
+        name: Style name
+        parent: Name of the sample stylesheet style to inherit from
+        **attrs: ParagraphStyle attributes such as fontSize or textColor
+    """
+    return ParagraphStyle(name, parent=get_stylesheet()[parent], **attrs)
+
+
+def warm_pdf_registry():
+    """Resolve fonts and the base stylesheet ahead of the first PDF request"""
+    get_pdf_fonts()
+    get_stylesheet()
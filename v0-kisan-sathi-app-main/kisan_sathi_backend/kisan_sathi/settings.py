@@ -184,6 +184,52 @@ SIMPLE_JWT = {
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Celery
+# Without a broker (local development, tests) tasks run inline in the request
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', '')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or None
+CELERY_TASK_ALWAYS_EAGER = not CELERY_BROKER_URL
+CELERY_TASK_EAGER_PROPAGATES = True
+# Periodic tasks, run by: celery -A kisan_sathi beat
+CELERY_BEAT_SCHEDULE = {
+    'marketplace-trending-scores': {
+        'task': 'marketplace.tasks.refresh_trending_scores',
+        'schedule': 15 * 60,
+    },
+    'marketplace-product-counters': {
+        'task': 'marketplace.tasks.flush_product_counters',
+        'schedule': 60,
+    },
+    'marketplace-daily-metrics': {
+        'task': 'marketplace.tasks.rollup_recent_metrics',
+        'schedule': 30 * 60,
+    },
+    'marketplace-notifications': {
+        'task': 'marketplace.tasks.deliver_notifications',
+        'schedule': 60,
+    },
+    'marketplace-notification-purge': {
+        'task': 'marketplace.tasks.purge_notifications',
+        'schedule': 24 * 60 * 60,
+    },
+    'marketplace-cart-sweep': {
+        'task': 'marketplace.tasks.sweep_carts',
+        'schedule': 60 * 60,
+    },
+}
+
+# Email
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@kisansathi.com')
+
+# Cache
+# Local memory per process by default; set REDIS_URL to share one cache (and
+# its invalidations) between all web processes
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
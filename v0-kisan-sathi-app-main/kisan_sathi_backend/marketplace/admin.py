@@ -10,6 +10,7 @@ from .models import (
     ProductReview, FarmerRating, Wishlist,
     Notification, Coupon, CouponUsage, DailyMetrics
 )
+from . import ratings
 
 
 @admin.register(FarmerProfile)
@@ -62,7 +63,10 @@ class CropProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'farmer', 'category', 'price_per_unit', 'quantity_available', 'listing_status', 'rating', 'is_featured']
     list_filter = ['listing_status', 'is_featured', 'is_organic_certified', 'quality_grade', 'category']
     search_fields = ['name', 'farmer__farm_name', 'slug']
-    readonly_fields = ['views_count', 'wishlist_count', 'cart_add_count', 'sales_count', 'rating', 'review_count']
+    readonly_fields = [
+        'views_count', 'wishlist_count', 'cart_add_count', 'sales_count', 'rating', 'review_count',
+        'is_trending', 'trending_score'
+    ]
     prepopulated_fields = {'slug': ('name',)}
     
     fieldsets = (
@@ -91,7 +95,8 @@ class CropProductAdmin(admin.ModelAdmin):
             'fields': ('listing_status', 'is_featured', 'is_trending')
         }),
         ('Metrics', {
-            'fields': ('views_count', 'wishlist_count', 'cart_add_count', 'sales_count', 'rating', 'review_count')
+            'fields': ('views_count', 'wishlist_count', 'cart_add_count', 'sales_count', 'rating', 'review_count',
+                       'trending_score')
         }),
     )
 
@@ -134,7 +139,7 @@ class ProductReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'flag_reviews']
     
     def approve_reviews(self, request, queryset):
-        queryset.update(is_approved=True)
+        ratings.approve_reviews(queryset, moderator=request.user)
     approve_reviews.short_description = "Approve selected reviews"
     
     def flag_reviews(self, request, queryset):
@@ -144,26 +149,33 @@ class ProductReviewAdmin(admin.ModelAdmin):
 
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
-    list_display = ['code', 'discount_type', 'discount_value', 'valid_from', 'valid_until', 'is_active']
+    list_display = ['code', 'discount_type', 'discount_value', 'times_used', 'total_usage_limit',
+                    'valid_from', 'valid_until', 'is_active']
     list_filter = ['discount_type', 'is_active', 'applicable_to']
+    readonly_fields = ['times_used']
     search_fields = ['code', 'description']
     date_hierarchy = 'valid_from'
 
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ['user', 'notification_type', 'title', 'priority', 'is_read', 'created_at']
+    list_display = ['user', 'notification_type', 'title', 'priority', 'is_read', 'scheduled_for', 'sent_at']
     list_filter = ['notification_type', 'priority', 'is_read', 'created_at']
+    readonly_fields = ['channels_sent', 'sent_at']
     search_fields = ['user__email', 'title', 'message']
     date_hierarchy = 'created_at'
 
 
 @admin.register(DailyMetrics)
 class DailyMetricsAdmin(admin.ModelAdmin):
-    list_display = ['date', 'total_orders', 'total_revenue', 'avg_order_value', 'new_farmers', 'new_buyers']
+    list_display = [
+        'date', 'total_orders', 'total_revenue', 'avg_order_value', 'new_farmers', 'new_buyers',
+        'total_views', 'conversion_rate'
+    ]
     list_filter = ['date']
     date_hierarchy = 'date'
-    readonly_fields = ['date', 'total_orders', 'total_revenue', 'avg_order_value']
+    # Written by the rollup job (rollup_daily_metrics) and the counter flushes
+    readonly_fields = [field.name for field in DailyMetrics._meta.fields]
 
 
 # Register remaining models
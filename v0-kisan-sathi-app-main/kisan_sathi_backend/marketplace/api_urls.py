@@ -8,7 +8,7 @@ from .views import (
     CropCategoryViewSet, CropProductViewSet,
     CartItemViewSet, OrderViewSet,
     ProductReviewViewSet, WishlistViewSet,
-    NotificationViewSet, CouponViewSet
+    NotificationViewSet, CouponViewSet, DailyMetricsViewSet
 )
 
 # API Router for REST endpoints
@@ -24,6 +24,7 @@ router.register(r'reviews', ProductReviewViewSet, basename='review')
 router.register(r'wishlist', WishlistViewSet, basename='wishlist')
 router.register(r'notifications', NotificationViewSet, basename='notification')
 router.register(r'coupons', CouponViewSet, basename='coupon')
+router.register(r'metrics', DailyMetricsViewSet, basename='metrics')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -5,3 +5,6 @@ class MarketplaceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'marketplace'
     verbose_name = 'Marketplace'
+
+    def ready(self):
+        from . import signals  # noqa: F401
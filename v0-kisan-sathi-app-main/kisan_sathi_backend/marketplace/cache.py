@@ -0,0 +1,98 @@
+"""
+Cached catalog responses for the marketplace home page
+
+Featured, trending and the category tree change rarely but are read on
+every home page load. Their serialized data is cached together with an
+ETag, so a repeat request is a cache read and a client sending
+If-None-Match gets a 304 without touching the database.
+
+Entries are keyed by a catalog version that the signal handlers in
+signals.py bump whenever a product or category changes, which makes every
+old entry unreachable at once. Stock and sales counters change through
+UPDATE queries without signals, so entries also expire after
+CATALOG_CACHE_TIMEOUT.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_CACHE_TIMEOUT = 60 * 5
+CATALOG_VERSION_KEY = 'marketplace:catalog:version'
+
+# CropProduct fields shown by the cached responses; saves that touch only
+# other fields (views_count, wishlist_count, ...) keep the cache
+CATALOG_PRODUCT_FIELDS = {
+    'name', 'slug', 'farmer', 'category', 'price_per_unit', 'original_price', 'unit',
+    'quantity_available', 'primary_image_url', 'rating', 'review_count',
+    'is_organic_certified', 'quality_grade', 'listing_status', 'is_featured',
+    'is_trending', 'sales_count', 'is_deleted',
+}
+
+
+def cache_version(key):
+    """Current value of the version counter stored under key"""
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a restarted cache never reuses old keys
+        version = int(timezone.now().timestamp() * 1000)
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_cache_version(key):
+    """Move the version counter under key on, orphaning entries keyed by it"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache_version(key)
+
+
+def catalog_version():
+    return cache_version(CATALOG_VERSION_KEY)
+
+
+def invalidate_catalog():
+    """Make every cached catalog response stale"""
+    bump_cache_version(CATALOG_VERSION_KEY)
+
+
+def etag_for(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.md5(body.encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    tags = {tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')}
+    # Weak comparison: proxies may mark the tag weak (W/"...")
+    tags |= {tag[2:] for tag in tags if tag.startswith('W/')}
+    return etag in tags or '*' in tags
+
+
+def cached_catalog_response(request, name, build):
+    """
+    Response for build() cached under name, honouring If-None-Match
+
+    build returns serialized (JSON-ready) data and only runs on a miss.
+    """
+    key = f'marketplace:catalog:{catalog_version()}:{name}'
+    entry = cache.get(key)
+    if entry is None:
+        data = build()
+        entry = (etag_for(data), data)
+        cache.set(key, entry, CATALOG_CACHE_TIMEOUT)
+
+    etag, data = entry
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    # Clients may keep the response but must revalidate it with the ETag
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
@@ -0,0 +1,99 @@
+"""
+Cart lifetime: anonymous session carts, their merge on login and expiry
+
+Visitors who are not logged in keep a cart under the id they send in the
+X-Cart-Session header. When they log in as a buyer, merge_session_cart()
+folds those lines into the buyer's cart with one bulk upsert: quantities of
+a product already in the cart are added together, and the session lines
+are deleted.
+
+Every cart line expires CART_TTL after it was last added to or merged.
+sweep_expired_carts() deletes expired lines in chunks through the
+expires_at index, so each DELETE stays short and the table does not grow.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CartItem
+
+CART_TTL = timedelta(days=7)
+CART_SESSION_HEADER = 'X-Cart-Session'
+SWEEP_CHUNK_SIZE = 1000
+
+
+def cart_expiry(now=None):
+    return (now or timezone.now()) + CART_TTL
+
+
+def cart_session_id(request):
+    """The anonymous cart id the client sent, or ''"""
+    return request.headers.get(CART_SESSION_HEADER, '').strip()[:255]
+
+
+def merge_session_cart(buyer, session_id):
+    """
+    Move the live lines of an anonymous cart into buyer's cart
+
+    Returns:
+        int: Products merged
+    """
+    if not session_id:
+        return 0
+    now = timezone.now()
+    with transaction.atomic():
+        session_lines = list(
+            CartItem.objects.select_for_update()
+            .filter(buyer__isnull=True, session_id=session_id, expires_at__gt=now)
+            .order_by('created_at')
+        )
+        if not session_lines:
+            return 0
+
+        merged = {}
+        quantities = defaultdict(int)
+        for line in session_lines:
+            merged.setdefault(line.product_id, line)
+            quantities[line.product_id] += line.quantity
+        # The buyer's own lines are locked so a concurrent add is not lost
+        existing = {
+            product_id: (quantity, unit_price)
+            for product_id, quantity, unit_price in CartItem.objects.select_for_update()
+            .filter(buyer=buyer, product_id__in=merged, expires_at__gt=now)
+            .values_list('product_id', 'quantity', 'unit_price')
+        }
+
+        lines = []
+        for product_id, line in merged.items():
+            # A live line the buyer already has keeps its price snapshot; an
+            # expired one is overwritten like a new line
+            quantity, unit_price = existing.get(product_id, (0, line.unit_price))
+            lines.append(CartItem(
+                buyer=buyer, product_id=product_id, quantity=quantity + quantities[product_id],
+                unit_price=unit_price, added_via=line.added_via, expires_at=cart_expiry(now),
+            ))
+        CartItem.objects.bulk_create(
+            lines, update_conflicts=True, unique_fields=['buyer', 'product'],
+            update_fields=['quantity', 'unit_price', 'expires_at', 'updated_at'],
+        )
+        CartItem.objects.filter(pk__in=[line.pk for line in session_lines]).delete()
+    return len(lines)
+
+
+def sweep_expired_carts(now=None, chunk_size=SWEEP_CHUNK_SIZE):
+    """
+    Delete expired cart lines, chunk_size per DELETE
+
+    Returns:
+        int: Lines deleted
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(CartItem.objects.filter(expires_at__lte=now)
+                   .order_by().values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += CartItem.objects.filter(pk__in=ids).delete()[0]
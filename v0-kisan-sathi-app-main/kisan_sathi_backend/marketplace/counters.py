@@ -0,0 +1,193 @@
+"""
+Buffered engagement counters for CropProduct
+
+Product page views, cart adds and wishlist changes are too frequent to
+write one UPDATE each on the request path. increment() adds to a buffer
+instead, and flush_counters() folds everything buffered into the table
+with one UPDATE per batch of products, each counter raised by a
+CASE ... END of per-product deltas on top of its current value.
+
+Without REDIS_URL the buffer lives in process memory and each web process
+flushes its own buffer from increment() once COUNTER_FLUSH_INTERVAL has
+passed; counts since the last flush are lost if the process dies. With
+REDIS_URL all processes share one Redis hash and whichever process first
+sees the interval expire flushes it. The flush_product_counters Celery beat
+task flushes the shared hash as well, so counts never wait for traffic.
+"""
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from .metrics import record_engagement
+from .models import CropProduct
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ('views_count', 'cart_add_count', 'wishlist_count')
+COUNTER_FLUSH_INTERVAL = 10  # seconds
+COUNTER_MAX_PENDING = 1000  # Products buffered before an early flush
+COUNTER_BATCH_SIZE = 500  # Products per UPDATE
+
+
+class CounterBuffer(ABC):
+    """Pending counter deltas: {product_id: {field: delta}}"""
+
+    @abstractmethod
+    def add(self, product_id, field, amount):
+        """Buffer amount more of product_id's field"""
+
+    @abstractmethod
+    def flush_due(self):
+        """True once per interval, for the caller that should flush"""
+
+    @abstractmethod
+    def drain(self):
+        """Remove and return everything buffered"""
+
+    def restore(self, deltas):
+        """Put back deltas that could not be written"""
+        for product_id, counts in deltas.items():
+            for field, amount in counts.items():
+                self.add(product_id, field, amount)
+
+
+class MemoryCounterBuffer(CounterBuffer):
+    """Per-process buffer"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(dict)
+        self.last_flush = time.monotonic()
+
+    def add(self, product_id, field, amount):
+        with self.lock:
+            counts = self.pending[str(product_id)]
+            counts[field] = counts.get(field, 0) + amount
+
+    def flush_due(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.pending and (now - self.last_flush >= COUNTER_FLUSH_INTERVAL
+                                 or len(self.pending) >= COUNTER_MAX_PENDING):
+                self.last_flush = now
+                return True
+            return False
+
+    def drain(self):
+        with self.lock:
+            deltas, self.pending = self.pending, defaultdict(dict)
+        return dict(deltas)
+
+
+class RedisCounterBuffer(CounterBuffer):
+    """Buffer shared by all processes, as a Redis hash of 'product_id:field' -> delta"""
+    key = 'marketplace:counters'
+    lock_key = 'marketplace:counters:flush-lock'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def add(self, product_id, field, amount):
+        self.client.hincrby(self.key, f'{product_id}:{field}', amount)
+
+    def flush_due(self):
+        return bool(self.client.set(self.lock_key, 1, nx=True, ex=COUNTER_FLUSH_INTERVAL))
+
+    def drain(self):
+        import redis
+        # Renaming is atomic, so increments arriving meanwhile start a new hash
+        draining = f'{self.key}:draining:{uuid.uuid4().hex}'
+        try:
+            self.client.rename(self.key, draining)
+        except redis.ResponseError:  # Nothing buffered
+            return {}
+        entries = self.client.hgetall(draining)
+        self.client.delete(draining)
+
+        deltas = defaultdict(dict)
+        for entry, amount in entries.items():
+            product_id, field = entry.decode().rsplit(':', 1)
+            deltas[product_id][field] = int(amount)
+        return dict(deltas)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                redis_url = getattr(settings, 'REDIS_URL', '')
+                _buffer = RedisCounterBuffer(redis_url) if redis_url else MemoryCounterBuffer()
+    return _buffer
+
+
+def write_deltas(deltas, batch_size=COUNTER_BATCH_SIZE):
+    """Add deltas to the stored counters; one UPDATE per batch"""
+    items = [(product_id, counts) for product_id, counts in deltas.items() if any(counts.values())]
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        updates = {}
+        for field in COUNTER_FIELDS:
+            whens = [When(pk=product_id, then=Value(counts[field]))
+                     for product_id, counts in batch if counts.get(field)]
+            if whens:
+                delta = Case(*whens, default=Value(0), output_field=IntegerField())
+                # Wishlist removals subtract; never store a negative count
+                updates[field] = Greatest(F(field) + delta, Value(0))
+        CropProduct.objects.filter(pk__in=[product_id for product_id, _ in batch]).update(**updates)
+    record_engagement(
+        views=sum(counts.get('views_count', 0) for _, counts in items),
+        cart_adds=sum(counts.get('cart_add_count', 0) for _, counts in items),
+    )
+    return len(items)
+
+
+def flush_counters(batch_size=COUNTER_BATCH_SIZE):
+    """
+    Write everything buffered to the database
+
+    Returns:
+        int: Products updated
+    """
+    buffer = get_buffer()
+    deltas = buffer.drain()
+    if not deltas:
+        return 0
+    try:
+        with transaction.atomic():
+            return write_deltas(deltas, batch_size)
+    except Exception:
+        buffer.restore(deltas)
+        raise
+
+
+def _flush_quietly():
+    try:
+        flush_counters()
+    except Exception:
+        # Counts stay buffered for the next flush; never fail the request
+        logger.exception('Flushing product counters failed')
+
+
+def increment(product_id, field, amount=1):
+    """Buffer a change to one of product_id's COUNTER_FIELDS"""
+    if field not in COUNTER_FIELDS:
+        raise ValueError(f'Not a buffered counter: {field}')
+    buffer = get_buffer()
+    buffer.add(product_id, field, amount)
+    if buffer.flush_due():
+        # Wait for the caller's transaction so the flush never holds its locks
+        transaction.on_commit(_flush_quietly)
@@ -0,0 +1,202 @@
+"""
+Coupon validation and redemption
+
+A coupon's conditions are compiled once into CouponRules, together with the
+sets of product and category ids it applies to (each listed category
+expanded to its whole subtree). Rules are cached by code under a version
+that signals.py bumps whenever a coupon or category changes, so checking a
+coupon against a product is a few set lookups and no queries.
+
+Usage limits are enforced where the order is written. redeem_coupon() runs
+inside the order transaction: one conditional UPDATE both checks
+total_usage_limit and increments times_used, like the stock reservation in
+orders.py, and holds the coupon row while the buyer's own usages are
+counted, so concurrent orders can never redeem a coupon more often than
+its limits allow. The CouponUsage row is written in the same transaction,
+and any failure rolls back the order and its stock with it.
+
+applicable_categories and applicable_products list ids; categories may
+also be given by slug. buy_x_get_y coupons cannot be redeemed, as coupons
+do not record X and Y.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import bump_cache_version, cache_version
+from .models import Coupon, CouponUsage, CouponUserType, CropCategory, DiscountType, Order
+from .orders import OrderError
+from .pricing import money
+
+COUPON_CACHE_TIMEOUT = 60 * 15
+COUPON_VERSION_KEY = 'marketplace:coupons:version'
+UNKNOWN_COUPON = 'unknown'  # Cached for codes that do not exist
+
+
+class CouponError(OrderError):
+    """A coupon that cannot be used; the message is safe to show to buyers"""
+
+
+def _uuids(values):
+    ids = set()
+    for value in values if isinstance(values, list) else []:
+        try:
+            ids.add(uuid.UUID(str(value)))
+        except ValueError:
+            continue
+    return ids
+
+
+class CouponRules:
+    """A coupon's conditions with its applicability compiled into id sets"""
+    __slots__ = (
+        'pk', 'code', 'discount_type', 'discount_value', 'max_discount_amount', 'min_order_value',
+        'max_uses_per_user', 'total_usage_limit', 'applicable_to', 'valid_from', 'valid_until',
+        'is_active', 'products', 'categories',
+    )
+
+    def __init__(self, coupon, products=frozenset(), categories=frozenset()):
+        for field in self.__slots__[:-2]:
+            setattr(self, field, getattr(coupon, field))
+        self.products = frozenset(products)
+        self.categories = frozenset(categories)
+
+    def applies_to(self, product):
+        if not (self.products or self.categories):
+            return True
+        return product.pk in self.products or product.category_id in self.categories
+
+    def check(self, product=None, subtotal=None, now=None):
+        """Raise CouponError unless the coupon can be used on subtotal of product"""
+        now = now or timezone.now()
+        if not self.is_active:
+            raise CouponError('Invalid coupon code')
+        if now < self.valid_from:
+            raise CouponError('Coupon is not active yet')
+        if now > self.valid_until:
+            raise CouponError('Coupon expired')
+        if self.discount_type == DiscountType.BUY_X_GET_Y:
+            raise CouponError('This coupon cannot be applied to orders')
+        if product is not None and not self.applies_to(product):
+            raise CouponError(f'Coupon {self.code} does not apply to {product.name}')
+        if subtotal is not None and self.min_order_value and subtotal < self.min_order_value:
+            raise CouponError(f'Minimum order value for this coupon is {self.min_order_value}')
+
+    def discount_for(self, subtotal, delivery_charges):
+        """Discount on an order of subtotal; never more than what it is taken off"""
+        if self.discount_type == DiscountType.FREE_SHIPPING:
+            discount = delivery_charges
+        elif self.discount_type == DiscountType.PERCENTAGE:
+            discount = money(subtotal * min(self.discount_value, 100) / 100)
+        else:
+            discount = min(self.discount_value, money(subtotal))
+        if self.max_discount_amount is not None:
+            discount = min(discount, self.max_discount_amount)
+        return discount
+
+
+def compile_coupon(coupon):
+    """CouponRules for coupon, resolving its categories to their subtrees"""
+    listed = [str(value) for value in coupon.applicable_categories or []]
+    categories = set()
+    if listed:
+        roots = CropCategory.objects.filter(
+            Q(pk__in=_uuids(listed)) | Q(slug__in=listed)
+        ).values_list('pk', 'path')
+        subtrees = Q()
+        for pk, path in roots:
+            categories.add(pk)
+            if path:
+                subtrees |= Q(path__startswith=path)
+        if subtrees:
+            categories.update(CropCategory.objects.filter(subtrees).values_list('pk', flat=True))
+    return CouponRules(coupon, products=_uuids(coupon.applicable_products), categories=categories)
+
+
+def coupon_rules(code):
+    """Cached CouponRules for code, or None if there is no such coupon"""
+    key = f'marketplace:coupon:{cache_version(COUPON_VERSION_KEY)}:{code}'
+    rules = cache.get(key)
+    if rules is None:
+        coupon = Coupon.objects.filter(code=code).first()
+        rules = compile_coupon(coupon) if coupon else UNKNOWN_COUPON
+        cache.set(key, rules, COUPON_CACHE_TIMEOUT)
+    return None if rules == UNKNOWN_COUPON else rules
+
+
+def invalidate_coupons():
+    """Make every cached CouponRules stale"""
+    bump_cache_version(COUPON_VERSION_KEY)
+
+
+def check_buyer(rules, buyer):
+    """Raise CouponError if buyer may not use the coupon (again)"""
+    if rules.applicable_to == CouponUserType.SPECIFIC_USERS:
+        # Coupons do not record which users they were issued to
+        raise CouponError('This coupon is not available for your account')
+    if rules.applicable_to in (CouponUserType.NEW_USERS, CouponUserType.EXISTING_USERS):
+        ordered = Order.objects.filter(buyer=buyer).exists()
+        if ordered != (rules.applicable_to == CouponUserType.EXISTING_USERS):
+            raise CouponError('This coupon is not available for your account')
+    if CouponUsage.objects.filter(coupon_id=rules.pk, user_id=buyer.user_id).count() >= rules.max_uses_per_user:
+        raise CouponError('You have already used this coupon')
+
+
+def check_coupon(code, buyer=None, product=None, subtotal=None):
+    """
+    Every check redeem_coupon() makes, without redeeming
+
+    Returns:
+        CouponRules: The coupon's rules
+
+    Raises:
+        CouponError: Why the coupon cannot be used
+    """
+    rules = coupon_rules(code)
+    if rules is None:
+        raise CouponError('Invalid coupon code')
+    rules.check(product, subtotal)
+    times_used = Coupon.objects.filter(pk=rules.pk).values_list('times_used', flat=True).first()
+    if rules.total_usage_limit is not None and (times_used or 0) >= rules.total_usage_limit:
+        raise CouponError('This coupon has reached its usage limit')
+    if buyer is not None:
+        check_buyer(rules, buyer)
+    return rules
+
+
+def redeem_coupon(code, order):
+    """
+    Apply code to an unsaved order and claim one use of it
+
+    Must run in the order's transaction. Sets the order's discount and total;
+    the returned CouponUsage is saved by the caller once the order is.
+
+    Raises:
+        CouponError: The coupon cannot be used on this order
+    """
+    rules = coupon_rules(code)
+    if rules is None:
+        raise CouponError('Invalid coupon code')
+    now = timezone.now()
+    rules.check(order.product, order.subtotal, now)
+
+    # The limit is read from the row the UPDATE locks, not from the cache
+    claimed = Coupon.objects.filter(
+        Q(total_usage_limit__isnull=True) | Q(times_used__lt=F('total_usage_limit')),
+        pk=rules.pk,
+        is_active=True,
+        valid_from__lte=now,
+        valid_until__gte=now,
+    ).update(times_used=F('times_used') + 1)
+    if not claimed:
+        raise CouponError('This coupon has reached its usage limit')
+    check_buyer(rules, order.buyer)
+
+    discount = rules.discount_for(order.subtotal, order.delivery_charges)
+    order.coupon_code = rules.code
+    order.discount_type = rules.discount_type
+    order.discount_amount = discount
+    order.total_amount -= discount
+    return CouponUsage(coupon_id=rules.pk, user_id=order.buyer.user_id, order=order, discount_applied=discount)
@@ -0,0 +1,148 @@
+"""
+Geo-proximity search over FarmerProfile latitude/longitude
+
+Each farmer stores a geohash of their location in an indexed column. A
+radius search turns the radius into a bounding box, covers the box with at
+most GEO_MAX_CELLS geohash cells and reads only those cells as index range
+scans (geohash >= cell AND geohash < cell + '~'). Rows inside the box are
+then ranked by exact haversine distance, computed in SQL so results can be
+filtered, ordered and paginated in the database.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+GEOHASH_PRECISION = 9  # ~5 m cells
+GEO_MAX_CELLS = 16
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 500
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Sorts after every geohash character, so cell + '~' bounds the cell's range
+_CELL_END = '~'
+
+
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Geohash of a point"""
+    lat, lng = float(lat), float(lng)
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(latitude, longitude) size in degrees of a geohash cell"""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def bounding_box(lat, lng, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) containing the circle"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(lat - lat_delta, -90.0), min(lat + lat_delta, 90.0)
+    # Longitude degrees shrink towards the poles; use the widest latitude
+    widest = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if widest < 1e-6:
+        return min_lat, max_lat, -180.0, 180.0
+    lng_delta = lat_delta / widest
+    return min_lat, max_lat, max(lng - lng_delta, -180.0), min(lng + lng_delta, 180.0)
+
+
+def covering_cells(min_lat, max_lat, min_lng, max_lng, max_cells=GEO_MAX_CELLS):
+    """Geohash cells covering the box, at the finest precision needing <= max_cells"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lng_step = cell_size(precision)
+        rows = int((max_lat - min_lat) / lat_step) + 2
+        cols = int((max_lng - min_lng) / lng_step) + 2
+        if rows * cols <= max_cells:
+            break
+    # Steps of one cell, clamped to the box, visit every cell it touches
+    return sorted({
+        encode(min(min_lat + row * lat_step, max_lat), min(min_lng + col * lng_step, max_lng), precision)
+        for row in range(rows) for col in range(cols)
+    })
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_expression(lat, lng, prefix=''):
+    """Haversine distance in km from (lat, lng) to the row's location"""
+    row_lat = Cast(F(f'{prefix}latitude'), FloatField())
+    row_lng = Cast(F(f'{prefix}longitude'), FloatField())
+    a = (
+        Power(Sin(Radians(row_lat - Value(lat)) / 2), 2)
+        + Value(math.cos(math.radians(lat))) * Cos(Radians(row_lat)) * Power(Sin(Radians(row_lng - Value(lng)) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+def within_box(lat, lng, radius_km, prefix=''):
+    """Q for rows in the circle's bounding box, prefiltered by geohash cell"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    cells = Q()
+    for cell in covering_cells(min_lat, max_lat, min_lng, max_lng):
+        cells |= Q(**{f'{prefix}geohash__gte': cell, f'{prefix}geohash__lt': cell + _CELL_END})
+    return cells & Q(**{
+        f'{prefix}latitude__range': (min_lat, max_lat),
+        f'{prefix}longitude__range': (min_lng, max_lng),
+    })
+
+
+def nearby(queryset, lat, lng, radius_km, prefix=''):
+    """
+    Rows within radius_km of (lat, lng), annotated with distance_km
+
+    prefix is the path to the FarmerProfile ('farmer__' for products).
+    Ordering is left to the caller.
+    """
+    return (
+        queryset.filter(within_box(lat, lng, radius_km, prefix))
+        .annotate(distance_km=distance_expression(lat, lng, prefix))
+        .filter(distance_km__lte=radius_km)
+    )
+
+
+def parse_near(near, radius_km=None):
+    """
+    (lat, lng, radius_km) from ?near=lat,lng&radius_km= values
+
+    Raises:
+        ValueError: With a message that is safe to show to clients
+    """
+    try:
+        lat, lng = (float(part) for part in near.split(','))
+    except ValueError:
+        raise ValueError('near must be "latitude,longitude"')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('near is outside valid latitude/longitude ranges')
+    try:
+        radius = float(radius_km) if radius_km not in (None, '') else DEFAULT_RADIUS_KM
+    except ValueError:
+        raise ValueError('radius_km must be a number')
+    if not 0 < radius <= MAX_RADIUS_KM:
+        raise ValueError(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+    return lat, lng, radius
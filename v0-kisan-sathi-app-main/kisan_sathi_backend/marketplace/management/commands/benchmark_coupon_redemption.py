@@ -0,0 +1,109 @@
+"""
+Concurrency load test for coupon redemption
+"""
+import threading
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from marketplace.coupons import CouponError
+from marketplace.models import Coupon, CouponUsage, DiscountType, Order
+from marketplace.orders import place_order
+
+from .benchmark_order_placement import Command as OrderPlacementBenchmark
+
+
+class Command(OrderPlacementBenchmark):
+    help = (
+        'Runs N threads placing orders with one usage-limited coupon until it runs out '
+        'and checks that it was never redeemed beyond its limits. Benchmark data is '
+        'deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent buyers')
+        parser.add_argument('--limit', type=int, default=25, help='Coupon total_usage_limit')
+        parser.add_argument('--per-user', type=int, default=3, help='Coupon max_uses_per_user')
+
+    def handle(self, *args, **options):
+        threads = max(options['threads'], 1)
+        limit = max(options['limit'], 1)
+        per_user = max(options['per_user'], 1)
+
+        # Enough stock that only the coupon can stop the buyers
+        created = self.setup(threads, Decimal(threads * per_user + 1))
+        created['coupon'] = Coupon.objects.create(
+            code=f'BENCH-{uuid.uuid4().hex[:8].upper()}', discount_type=DiscountType.FIXED_AMOUNT,
+            discount_value=Decimal('5'), max_uses_per_user=per_user, total_usage_limit=limit,
+            valid_from=timezone.now() - timedelta(minutes=1), valid_until=timezone.now() + timedelta(hours=1),
+        )
+        try:
+            elapsed, failures = self.run(created, threads)
+            self.report(created['coupon'], threads, limit, per_user, elapsed, failures)
+        finally:
+            self.cleanup(created)
+
+    def run(self, created, threads):
+        product_id = created['product'].pk
+        code = created['coupon'].code
+        failures = []
+        start = threading.Barrier(threads)
+
+        def redeem(buyer, address):
+            try:
+                start.wait()
+                while True:
+                    try:
+                        place_order(buyer, product_id, Decimal('1'), address, payment_method='cod',
+                                    coupon_code=code)
+                    except CouponError:
+                        return
+                    except Exception as exc:
+                        failures.append(exc)
+                        return
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=redeem, args=pair) for pair in created['buyers']]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - started, failures
+
+    def report(self, coupon, threads, limit, per_user, elapsed, failures):
+        coupon.refresh_from_db()
+        usages = CouponUsage.objects.filter(coupon=coupon)
+        totals = usages.aggregate(count=Count('pk'), discount=Sum('discount_applied'))
+        most_by_one_buyer = usages.values('user').annotate(count=Count('pk')).aggregate(most=Max('count'))['most']
+        orders = Order.objects.filter(coupon_code=coupon.code).count()
+        expected = min(limit, threads * per_user)
+
+        self.stdout.write(f"Redemptions:     {totals['count']} (limit {limit}, expected {expected})")
+        self.stdout.write(f'times_used:      {coupon.times_used}')
+        self.stdout.write(f'Orders w/coupon: {orders}')
+        self.stdout.write(f'Most by a buyer: {most_by_one_buyer or 0} (limit {per_user})')
+        self.stdout.write(f"Discount given:  {totals['discount'] or 0}")
+        self.stdout.write(f"Throughput:      {totals['count'] / elapsed:.1f} redemptions/sec ({elapsed:.2f}s)")
+        for exc in failures:
+            self.stdout.write(self.style.WARNING(f'Buyer gave up: {exc!r}'))
+
+        consistent = (
+            totals['count'] == coupon.times_used == orders
+            and coupon.times_used <= limit
+            and (most_by_one_buyer or 0) <= per_user
+        )
+        if not consistent:
+            raise CommandError('Coupon usage is inconsistent: the coupon was over-redeemed')
+        self.stdout.write(self.style.SUCCESS('No over-redemption: usages == times_used <= limits'))
+
+    def cleanup(self, created):
+        created['coupon'].delete()
+        super().cleanup(created)
@@ -0,0 +1,129 @@
+"""
+Benchmark for geo-proximity farmer search
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from marketplace.geo import bounding_box, distance_expression, encode, haversine_km, nearby
+from marketplace.models import FarmerProfile
+
+User = get_user_model()
+
+SEED_BATCH_SIZE = 5000
+
+# Synthetic farms are spread over India's bounding box
+LAT_RANGE = (8.0, 35.0)
+LNG_RANGE = (68.0, 97.0)
+
+
+def search_queries(lat, lng, radius_km):
+    """(label, queryset) pairs for each strategy, nearest first"""
+    farmers = FarmerProfile.objects.all()
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    distance = distance_expression(lat, lng)
+    return [
+        ('full scan + haversine', farmers.filter(latitude__isnull=False)
+            .annotate(distance_km=distance).filter(distance_km__lte=radius_km)),
+        ('lat/lng box + haversine', farmers.filter(latitude__range=(min_lat, max_lat),
+                                                   longitude__range=(min_lng, max_lng))
+            .annotate(distance_km=distance).filter(distance_km__lte=radius_km)),
+        ('geohash cells + haversine', nearby(farmers, lat, lng, radius_km)),
+    ]
+
+
+def plan_summary(queryset):
+    """Distinct table accesses in the query plan, e.g. 'SEARCH ... USING INDEX ...'"""
+    steps = []
+    for line in queryset.explain().splitlines():
+        step = line.lstrip('0123456789 ')
+        if step.startswith(('SCAN', 'SEARCH')) and step not in steps:
+            steps.append(step)
+    return '; '.join(steps) or queryset.explain()
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds throwaway farmers at random locations and compares radius search '
+        'strategies for speed and correctness. Everything is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farmers', type=int, default=100_000, help='Farmers to seed')
+        parser.add_argument('--radius', type=float, default=25, help='Search radius in km')
+        parser.add_argument('--queries', type=int, default=50, help='Random search centres')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with transaction.atomic():
+            points = self.seed(max(options['farmers'], 1), rng)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            centres = [rng.choice(points) for _ in range(max(options['queries'], 1))]
+            self.measure(centres, points, options['radius'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark data rolled back'))
+
+    def seed(self, count, rng):
+        """Create users and farmer profiles; return their (lat, lng) points"""
+        self.stdout.write(f'Seeding {count} farmers...')
+        started = time.perf_counter()
+        if User.objects.filter(phone__startswith='+91800').exists():
+            raise CommandError('Users with phone +91800... already exist; the benchmark needs that range')
+
+        points = []
+        for offset in range(0, count, SEED_BATCH_SIZE):
+            size = min(SEED_BATCH_SIZE, count - offset)
+            users = User.objects.bulk_create(
+                User(username=f'bench-geo-{i}', phone=f'+91800{i:07d}', email=f'bench-geo-{i}@example.com',
+                     first_name='Bench', password='!')
+                for i in range(offset, offset + size)
+            )
+            profiles = []
+            for user in users:
+                lat = Decimal(f'{rng.uniform(*LAT_RANGE):.6f}')
+                lng = Decimal(f'{rng.uniform(*LNG_RANGE):.6f}')
+                points.append((float(lat), float(lng)))
+                # bulk_create skips save(), which normally sets the geohash
+                profiles.append(FarmerProfile(
+                    user=user, farm_name='Benchmark Farm', farm_size_acres=Decimal('1'),
+                    address='Benchmark', district='Benchmark', state='Benchmark', pincode='000000',
+                    latitude=lat, longitude=lng, geohash=encode(lat, lng)
+                ))
+            FarmerProfile.objects.bulk_create(profiles)
+
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+        return points
+
+    def measure(self, centres, points, radius_km):
+        timings, mismatches = {}, 0
+        plans = {}
+        for lat, lng in centres:
+            expected = sum(1 for point in points if haversine_km(lat, lng, *point) <= radius_km)
+            for label, queryset in search_queries(lat, lng, radius_km):
+                plans.setdefault(label, plan_summary(queryset))
+                started = time.perf_counter()
+                found = list(queryset.order_by('distance_km').values_list('pk', 'distance_km'))
+                timings.setdefault(label, []).append(time.perf_counter() - started)
+                in_order = all(a[1] <= b[1] for a, b in zip(found, found[1:]))
+                # Floating point may put a farm exactly on the edge either side
+                if abs(len(found) - expected) > 1 or not in_order:
+                    mismatches += 1
+
+        self.stdout.write(f'{len(centres)} searches, radius {radius_km} km, {len(points)} farmers')
+        for label, samples in timings.items():
+            samples.sort()
+            average = sum(samples) / len(samples) * 1000
+            median = samples[len(samples) // 2] * 1000
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f'  avg {average:8.2f} ms  median {median:8.2f} ms')
+            self.stdout.write(f'  plan: {plans[label]}')
+        if mismatches:
+            raise CommandError(f'{mismatches} searches disagreed with the brute-force distance check')
+        self.stdout.write(self.style.SUCCESS('All strategies matched the brute-force distance check'))
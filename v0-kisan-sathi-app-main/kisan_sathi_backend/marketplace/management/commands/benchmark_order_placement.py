@@ -0,0 +1,139 @@
+"""
+Concurrency benchmark for order placement
+"""
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from marketplace.models import (
+    BuyerProfile, CropCategory, CropProduct, DeliveryAddress, FarmerProfile,
+    ListingStatus, Order, Unit
+)
+from marketplace.orders import OutOfStock, place_order
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs N threads ordering one product until it sells out and checks that '
+        'no stock was oversold. Benchmark data is deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent buyers')
+        parser.add_argument('--stock', type=int, default=500, help='Units of stock to sell')
+        parser.add_argument('--quantity', type=int, default=1, help='Units per order')
+
+    def handle(self, *args, **options):
+        threads = max(options['threads'], 1)
+        stock = Decimal(max(options['stock'], 1))
+        quantity = Decimal(max(options['quantity'], 1))
+
+        created = self.setup(threads, stock)
+        try:
+            elapsed, failures = self.run(created, threads, quantity)
+            self.report(created['product'], stock, quantity, elapsed, failures)
+        finally:
+            self.cleanup(created)
+
+    @transaction.atomic
+    def setup(self, threads, stock):
+        tag = uuid.uuid4().hex[:8]
+        users = [
+            User(username=f'bench-order-{tag}-{i}', phone=f'+91600{i:07d}',
+                 email=f'bench-order-{tag}-{i}@example.com', first_name='Bench', password='!')
+            for i in range(threads + 1)
+        ]
+        # Phone numbers must be unique; skip if a previous run was interrupted
+        if User.objects.filter(phone__in=[user.phone for user in users]).exists():
+            raise CommandError('Benchmark users already exist; delete users with phone +91600... first')
+        users = User.objects.bulk_create(users)
+
+        farmer = FarmerProfile.objects.create(
+            user=users[0], farm_name='Benchmark Farm', farm_size_acres=Decimal('1'),
+            address='Benchmark', district='Benchmark', state='Benchmark', pincode='000000'
+        )
+        category = CropCategory.objects.create(name='Benchmark', slug=f'benchmark-{tag}')
+        product = CropProduct.objects.create(
+            farmer=farmer, category=category, name='Benchmark Wheat', slug=f'benchmark-wheat-{tag}',
+            quantity_available=stock, unit=Unit.KG, price_per_unit=Decimal('25'),
+            listing_status=ListingStatus.ACTIVE
+        )
+        buyers = []
+        for user in users[1:]:
+            buyer = BuyerProfile.objects.create(
+                user=user, business_type='individual', default_address='Benchmark',
+                city='Benchmark', state='Benchmark', pincode='000000'
+            )
+            address = DeliveryAddress.objects.create(
+                buyer=buyer, contact_name='Bench', contact_phone='9999999999',
+                address_line1='Benchmark', city='Benchmark', state='Benchmark', pincode='000000'
+            )
+            buyers.append((buyer, address))
+        return {'users': users, 'category': category, 'product': product, 'buyers': buyers}
+
+    def run(self, created, threads, quantity):
+        product_id = created['product'].pk
+        failures = []
+        start = threading.Barrier(threads)
+
+        def buy(buyer, address):
+            try:
+                start.wait()
+                while True:
+                    try:
+                        place_order(buyer, product_id, quantity, address, payment_method='cod')
+                    except OutOfStock:
+                        return
+                    except Exception as exc:
+                        failures.append(exc)
+                        return
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buy, args=pair) for pair in created['buyers']]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - started, failures
+
+    def report(self, product, stock, quantity, elapsed, failures):
+        product.refresh_from_db()
+        orders = Order.objects.filter(product=product).aggregate(
+            count=Count('pk'), sold=Sum('quantity_ordered')
+        )
+        sold = orders['sold'] or Decimal('0')
+        expected_orders = int(stock // quantity)
+
+        self.stdout.write(f"Orders placed:   {orders['count']} (expected {expected_orders})")
+        self.stdout.write(f'Units sold:      {sold} of {stock}')
+        self.stdout.write(f'Stock left:      {product.quantity_available}')
+        self.stdout.write(f'Sales count:     {product.sales_count}')
+        self.stdout.write(f"Throughput:      {orders['count'] / elapsed:.1f} orders/sec ({elapsed:.2f}s)")
+        for exc in failures:
+            self.stdout.write(self.style.WARNING(f'Buyer gave up: {exc!r}'))
+
+        consistent = (
+            sold + product.quantity_available == stock
+            and product.quantity_available >= 0
+            and product.sales_count == orders['count']
+        )
+        if not consistent:
+            raise CommandError('Stock is inconsistent: the product was oversold')
+        self.stdout.write(self.style.SUCCESS('No overselling: sold + remaining stock == initial stock'))
+
+    def cleanup(self, created):
+        Order.objects.filter(product=created['product']).delete()
+        created['product'].delete()
+        created['category'].delete()
+        # Profiles and addresses cascade from the users
+        User.objects.filter(pk__in=[user.pk for user in created['users']]).delete()
@@ -0,0 +1,21 @@
+"""
+Rebuild the product search index
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from marketplace.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the marketplace product search index from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Products indexed per batch')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_index(batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} products with {type(get_backend()).__name__}'
+        ))
@@ -0,0 +1,23 @@
+"""
+Recompute denormalized product and farmer ratings and sales totals
+"""
+from django.core.management.base import BaseCommand
+
+from marketplace.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes product and farmer ratings, review counts and farmer sales totals '
+        'from reviews, farmer ratings and delivered orders, fixing any that drifted'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        drift = reconcile_ratings(dry_run=options['dry_run'])
+        verb = 'drifted' if options['dry_run'] else 'fixed'
+        for label, count in drift.items():
+            self.stdout.write(f'{label}: {count} {verb}')
+        self.stdout.write(self.style.SUCCESS('Ratings reconciled'))
@@ -0,0 +1,45 @@
+"""
+Roll up DailyMetrics for a day or backfill a date range
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from marketplace.metrics import backfill_daily_metrics
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Invalid date (expected YYYY-MM-DD): {value}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Computes orders, revenue, sign-ups and listings per day into DailyMetrics. '
+        'Defaults to yesterday; re-running a day overwrites it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=parse_date, help='Day to roll up (YYYY-MM-DD)')
+        parser.add_argument('--start', type=parse_date, help='First day of a backfill range')
+        parser.add_argument('--end', type=parse_date, help='Last day of a backfill range (default today)')
+        parser.add_argument('--workers', type=int, default=4, help='Chunks rolled up in parallel')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Days per chunk')
+
+    def handle(self, *args, **options):
+        if options['date'] and options['start']:
+            raise CommandError('Use either --date or --start/--end')
+        if options['start']:
+            start, end = options['start'], options['end'] or timezone.localdate()
+        else:
+            start = end = options['date'] or timezone.localdate() - timedelta(days=1)
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        days = backfill_daily_metrics(
+            start, end, workers=max(options['workers'], 1), chunk_days=max(options['chunk_days'], 1)
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {days} days ({start} to {end})'))
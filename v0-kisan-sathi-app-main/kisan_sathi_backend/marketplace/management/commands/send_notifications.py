@@ -0,0 +1,21 @@
+"""
+Deliver due marketplace notifications and purge expired ones
+"""
+from django.core.management.base import BaseCommand
+
+from marketplace.notifications import deliver_due_notifications, purge_expired_notifications
+
+
+class Command(BaseCommand):
+    help = 'Sends due notifications in batches per channel (in-app, email, SMS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge', action='store_true', help='Also delete expired notifications')
+
+    def handle(self, *args, **options):
+        sent = deliver_due_notifications()
+        for channel, count in sorted(sent.items()):
+            self.stdout.write(f'{channel}: {count} sent')
+        if options['purge']:
+            self.stdout.write(f'Purged {purge_expired_notifications()} expired notifications')
+        self.stdout.write(self.style.SUCCESS('Notifications delivered'))
@@ -0,0 +1,20 @@
+"""
+Score new product engagement and refresh the trending flags
+"""
+from django.core.management.base import BaseCommand
+
+from marketplace.trending import TRENDING_TOP_N, update_trending_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Folds product views, wishlists, cart adds and sales since the last run into the '
+        'time-decayed trending scores and flags the top products as trending'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=TRENDING_TOP_N, help='Products to flag as trending')
+
+    def handle(self, *args, **options):
+        scored = update_trending_scores(top_n=max(options['top'], 1))
+        self.stdout.write(self.style.SUCCESS(f'Updated trending scores for {scored} products'))
@@ -0,0 +1,143 @@
+"""
+DailyMetrics rollups
+
+rollup_daily_metrics() computes a range of days with one query per source
+table, grouped by day, and upserts one DailyMetrics row per day; re-running
+a day overwrites it with the same values, so the job is idempotent and
+safe to repeat. backfill_daily_metrics() splits a long range into chunks
+rolled up in parallel.
+
+Views and cart adds have no event history to group, so they are not part
+of the rollup: record_engagement() adds each counter flush from
+counters.py to the current day's row as it happens, and the rollup keeps
+those totals (and derives the conversion rate from them).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    BuyerProfile, CropProduct, DailyMetrics, FarmerProfile, ListingStatus, Order, OrderStatus
+)
+
+ROLLUP_FIELDS = [
+    'total_orders', 'total_revenue', 'avg_order_value', 'new_farmers', 'new_buyers',
+    'active_users', 'new_listings', 'total_active_listings', 'conversion_rate',
+]
+
+
+def day_bounds(start, end):
+    """Aware datetimes covering start..end inclusive, in the current timezone"""
+    tz = timezone.get_current_timezone()
+    return (timezone.make_aware(datetime.combine(start, time.min), tz),
+            timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz))
+
+
+def _per_day(queryset, field, since, until, **aggregates):
+    """{date: {name: value}} for rows whose field falls in [since, until)"""
+    rows = (queryset.filter(**{f'{field}__gte': since, f'{field}__lt': until})
+            .annotate(day=TruncDate(field)).order_by().values('day')
+            .annotate(**aggregates))
+    return {row.pop('day'): row for row in rows}
+
+
+def _percentage(part, whole):
+    if not whole:
+        return Decimal('0')
+    return min(Decimal(part * 100) / whole, Decimal(100)).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+def rollup_daily_metrics(start, end=None):
+    """
+    Compute and store DailyMetrics for start..end inclusive
+
+    Returns:
+        int: Days written
+    """
+    end = end or start
+    since, until = day_bounds(start, end)
+
+    orders = _per_day(
+        Order.objects.exclude(order_status=OrderStatus.CANCELLED), 'created_at', since, until,
+        count=Count('pk'), revenue=Sum('total_amount'), buyers=Count('buyer', distinct=True),
+    )
+    farmers = _per_day(FarmerProfile.objects.all(), 'created_at', since, until, count=Count('pk'))
+    buyers = _per_day(BuyerProfile.objects.all(), 'created_at', since, until, count=Count('pk'))
+    listings = _per_day(CropProduct.objects.all(), 'created_at', since, until, count=Count('pk'))
+    # Listing history is not kept: a day's active listings are those live
+    # now that had been created by the end of that day
+    live = CropProduct.objects.filter(listing_status=ListingStatus.ACTIVE, is_deleted=False)
+    active_before = live.filter(created_at__lt=since).count()
+    active = _per_day(live, 'created_at', since, until, count=Count('pk'))
+    views = dict(DailyMetrics.objects.filter(date__range=(start, end)).values_list('date', 'total_views'))
+
+    days = []
+    day = start
+    while day <= end:
+        placed = orders.get(day, {})
+        total_orders = placed.get('count', 0)
+        revenue = placed.get('revenue') or Decimal('0')
+        active_before += active.get(day, {}).get('count', 0)
+        days.append(DailyMetrics(
+            date=day,
+            total_orders=total_orders,
+            total_revenue=revenue,
+            avg_order_value=(revenue / total_orders).quantize(Decimal('0.01'), ROUND_HALF_UP) if total_orders else 0,
+            new_farmers=farmers.get(day, {}).get('count', 0),
+            new_buyers=buyers.get(day, {}).get('count', 0),
+            active_users=placed.get('buyers', 0),
+            new_listings=listings.get(day, {}).get('count', 0),
+            total_active_listings=active_before,
+            conversion_rate=_percentage(total_orders, views.get(day, 0)),
+        ))
+        day += timedelta(days=1)
+
+    # Upsert: engagement totals already on the row are left alone
+    DailyMetrics.objects.bulk_create(
+        days, update_conflicts=True, unique_fields=['date'], update_fields=ROLLUP_FIELDS
+    )
+    return len(days)
+
+
+def _rollup_chunk(start, end):
+    try:
+        return rollup_daily_metrics(start, end)
+    finally:
+        # Each worker thread opened its own connection
+        connection.close()
+
+
+def backfill_daily_metrics(start, end, workers=4, chunk_days=31):
+    """
+    Roll up start..end in chunks of chunk_days, workers at a time
+
+    Returns:
+        int: Days written
+    """
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+    if workers <= 1 or len(chunks) == 1:
+        return sum(rollup_daily_metrics(*chunk) for chunk in chunks)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(lambda chunk: _rollup_chunk(*chunk), chunks))
+
+
+def record_engagement(views=0, cart_adds=0):
+    """Add flushed view and cart add counts to today's DailyMetrics"""
+    if not (views or cart_adds):
+        return
+    today = timezone.localdate()
+    with transaction.atomic():
+        DailyMetrics.objects.get_or_create(date=today)
+        DailyMetrics.objects.filter(date=today).update(
+            total_views=F('total_views') + views,
+            total_cart_adds=F('total_cart_adds') + cart_adds,
+        )
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:05
+
+import uuid
+
+from django.db import migrations
+
+SEARCH_TABLE = 'marketplace_product_search'
+
+CREATE_SEARCH_TABLE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+    'product_id UNINDEXED, name, variety, category, farm, body, phonetic, '
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+DROP_SEARCH_TABLE = f'DROP TABLE IF EXISTS {SEARCH_TABLE}'
+
+
+def _json_text(column):
+    # Every string inside a JSON column, space separated
+    return f"COALESCE((SELECT group_concat(value, ' ') FROM json_tree({column}) WHERE type = 'text'), '')"
+
+
+# Phonetic keys are computed in Python, so they are left empty here and
+# filled in by `manage.py rebuild_search_index` or the next save of a product
+BACKFILL_SEARCH_TABLE = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, product_id, name, variety, category, farm, body, phonetic)
+    SELECT product_search_rowid(p.id), p.id, p.name, p.variety, c.name, f.farm_name,
+           {_json_text('p.translations')} || ' ' || {_json_text('p.meta_keywords')} || ' ' || p.description,
+           ''
+    FROM marketplace_crop_products p
+    JOIN marketplace_crop_categories c ON c.id = p.category_id
+    JOIN marketplace_farmer_profiles f ON f.id = p.farmer_id
+    WHERE NOT p.is_deleted
+"""
+
+
+def product_search_rowid(product_id):
+    # The top 63 bits of the product UUID, so they fit SQLite's signed rowid
+    return uuid.UUID(product_id).int >> 65
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases use DatabaseSearchBackend, which needs no table
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.connection.ensure_connection()
+    schema_editor.connection.connection.create_function(
+        'product_search_rowid', 1, product_search_rowid, deterministic=True
+    )
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(BACKFILL_SEARCH_TABLE)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_SEARCH_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0002_cropproduct_primary_image_productimage_image_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
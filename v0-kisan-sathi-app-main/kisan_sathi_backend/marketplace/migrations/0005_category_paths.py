@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:20
+
+from django.db import migrations
+
+
+def backfill_category_paths(apps, schema_editor):
+    CropCategory = apps.get_model('marketplace', 'CropCategory')
+    # Parents are processed before their children, one level at a time
+    parents = {None: ('', -1)}
+    pending = list(CropCategory.objects.only('id', 'parent_id'))
+    while pending:
+        ready = [category for category in pending if category.parent_id in parents]
+        if not ready:
+            break  # Cycles are left untouched
+        for category in ready:
+            parent_path, parent_level = parents[category.parent_id]
+            category.path = f'{parent_path}{category.id.hex}/'
+            category.level = parent_level + 1
+            parents[category.id] = (category.path, category.level)
+        CropCategory.objects.bulk_update(ready, ['path', 'level'], batch_size=500)
+        pending = [category for category in pending if category.id not in parents]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0004_farmer_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
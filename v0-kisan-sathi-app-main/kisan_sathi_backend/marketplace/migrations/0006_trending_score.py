@@ -0,0 +1,83 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:40
+
+import math
+from datetime import datetime, timedelta, timezone
+
+from django.db import migrations, models
+
+# Frozen copies of the trending.py settings this migration was written with
+TRENDING_HALF_LIFE = timedelta(hours=24)
+TRENDING_LANDMARK = datetime(2024, 1, 1, tzinfo=timezone.utc)
+TRENDING_WEIGHTS = {
+    'sales_count': ('trending_sales_seen', 10.0),
+    'cart_add_count': ('trending_cart_adds_seen', 3.0),
+    'wishlist_count': ('trending_wishlists_seen', 2.0),
+    'views_count': ('trending_views_seen', 0.2),
+}
+
+
+def log_weight(weight, when):
+    """Log of weight as an event at when, relative to the landmark"""
+    decay_rate = math.log(2) / TRENDING_HALF_LIFE.total_seconds()
+    return math.log(weight) + decay_rate * (when - TRENDING_LANDMARK).total_seconds()
+
+
+def seed_trending_scores(apps, schema_editor):
+    CropProduct = apps.get_model('marketplace', 'CropProduct')
+    products = []
+    for product in CropProduct.objects.iterator():
+        # Lifetime engagement counts as activity at the last update, so
+        # existing listings do not all start level; later runs add new events
+        weight = sum(getattr(product, counter) * event_weight
+                     for counter, (_, event_weight) in TRENDING_WEIGHTS.items())
+        for counter, (seen, _) in TRENDING_WEIGHTS.items():
+            setattr(product, seen, getattr(product, counter))
+        if weight > 0:
+            product.trending_score = log_weight(weight, product.updated_at)
+        products.append(product)
+    fields = ['trending_score'] + [seen for seen, _ in TRENDING_WEIGHTS.values()]
+    CropProduct.objects.bulk_update(products, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0005_category_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cropproduct',
+            name='trending_cart_adds_seen',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cropproduct',
+            name='trending_sales_seen',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cropproduct',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cropproduct',
+            name='trending_views_seen',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cropproduct',
+            name='trending_wishlists_seen',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='cropproduct',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['listing_status', '-trending_score'], name='product_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cropproduct',
+            index=models.Index(condition=models.Q(models.Q(('views_count', models.F('trending_views_seen')), _negated=True), models.Q(('wishlist_count', models.F('trending_wishlists_seen')), _negated=True), models.Q(('cart_add_count', models.F('trending_cart_adds_seen')), _negated=True), models.Q(('sales_count', models.F('trending_sales_seen')), _negated=True), _connector='OR'), fields=['id'], name='product_trending_pending_idx'),
+        ),
+        migrations.RunPython(seed_trending_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:45
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def average_rating(total, count):
+    # Rounded half up to 2 places, as the rating UPDATEs compute it
+    if count <= 0:
+        return Decimal('0')
+    return Decimal((total * 200 + count) // (count * 2)) / 100
+
+
+def populate_rating_totals(apps, schema_editor):
+    from django.db.models import Count, Sum
+
+    ProductReview = apps.get_model('marketplace', 'ProductReview')
+    FarmerRating = apps.get_model('marketplace', 'FarmerRating')
+    Order = apps.get_model('marketplace', 'Order')
+    CropProduct = apps.get_model('marketplace', 'CropProduct')
+    FarmerProfile = apps.get_model('marketplace', 'FarmerProfile')
+
+    reviews = {
+        row['product_id']: (row['total'], row['count'])
+        for row in ProductReview.objects.filter(is_approved=True).order_by().values('product_id')
+        .annotate(total=Sum('rating'), count=Count('pk'))
+    }
+    ratings = {
+        row['farmer_id']: (row['total'], row['count'])
+        for row in FarmerRating.objects.order_by().values('farmer_id')
+        .annotate(total=Sum('rating'), count=Count('pk'))
+    }
+    sales = {
+        row['farmer_id']: (row['sales'], row['count'])
+        for row in Order.objects.filter(order_status='delivered').order_by().values('farmer_id')
+        .annotate(sales=Sum('total_amount'), count=Count('pk'))
+    }
+
+    products = []
+    for product in CropProduct.objects.only('pk', 'rating_total', 'review_count', 'rating').iterator():
+        total, count = reviews.get(product.pk, (0, 0))
+        product.rating_total, product.review_count, product.rating = total, count, average_rating(total, count)
+        products.append(product)
+    CropProduct.objects.bulk_update(products, ['rating_total', 'review_count', 'rating'], batch_size=500)
+
+    farmers = []
+    fields = ['rating_total', 'review_count', 'rating', 'total_sales', 'total_orders']
+    for farmer in FarmerProfile.objects.only('pk', *fields).iterator():
+        total, count = ratings.get(farmer.pk, (0, 0))
+        farmer.rating_total, farmer.review_count, farmer.rating = total, count, average_rating(total, count)
+        farmer.total_sales, farmer.total_orders = sales.get(farmer.pk, (Decimal('0'), 0))
+        farmers.append(farmer)
+    FarmerProfile.objects.bulk_update(farmers, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0006_trending_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cropproduct',
+            name='rating_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='rating_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rating_totals, migrations.RunPython.noop),
+    ]
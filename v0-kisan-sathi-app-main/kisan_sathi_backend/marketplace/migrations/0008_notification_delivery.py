@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def mark_existing_delivered(apps, schema_editor):
+    # Notifications so far were only ever shown in the app; do not send
+    # them again by email or SMS on the first delivery run
+    Notification = apps.get_model('marketplace', 'Notification')
+    Notification.objects.filter(scheduled_for__isnull=True).update(scheduled_for=models.F('created_at'))
+    Notification.objects.filter(sent_at__isnull=True).update(sent_at=models.F('created_at'), channels_sent=['in_app'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0007_rating_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='channels',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('order_placed', 'Order Placed'), ('order_confirmed', 'Order Confirmed'), ('order_shipped', 'Order Shipped'), ('order_delivered', 'Order Delivered'), ('order_cancelled', 'Order Cancelled'), ('payment_received', 'Payment Received'), ('payment_failed', 'Payment Failed'), ('low_stock', 'Low Stock'), ('out_of_stock', 'Out of Stock'), ('product_back_in_stock', 'Product Back in Stock'), ('new_review', 'New Review'), ('price_drop', 'Price Drop'), ('new_message', 'New Message'), ('verification_approved', 'Verification Approved'), ('verification_rejected', 'Verification Rejected'), ('new_listing', 'New Listing Nearby'), ('promotional', 'Promotional'), ('system_alert', 'System Alert')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='scheduled_for',
+            field=models.DateTimeField(blank=True, db_index=True, default=django.utils.timezone.now, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['scheduled_for'], name='notification_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False)), fields=['expires_at'], name='notification_expiry_idx'),
+        ),
+        migrations.RunPython(mark_existing_delivered, migrations.RunPython.noop),
+    ]
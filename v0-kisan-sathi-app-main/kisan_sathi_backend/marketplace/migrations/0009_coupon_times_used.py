@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:55
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_usages(apps, schema_editor):
+    Coupon = apps.get_model('marketplace', 'Coupon')
+    CouponUsage = apps.get_model('marketplace', 'CouponUsage')
+    usages = (CouponUsage.objects.filter(coupon=models.OuterRef('pk')).order_by()
+              .values('coupon').annotate(count=models.Count('pk')).values('count'))
+    Coupon.objects.update(times_used=Coalesce(models.Subquery(usages), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0008_notification_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='times_used',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_usages, migrations.RunPython.noop),
+    ]
@@ -5,6 +5,7 @@ Supports 100K+ concurrent users, 10K+ daily orders
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import uuid
 
@@ -143,6 +144,7 @@ class FarmerProfile(TimeStampedModel):
     pincode = models.CharField(max_length=10, db_index=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, editable=False, db_index=True)  # See geo.py
     
     # Verification
     verification_status = models.CharField(
@@ -173,6 +175,7 @@ class FarmerProfile(TimeStampedModel):
         validators=[MinValueValidator(0), MaxValueValidator(5)]
     )
     review_count = models.IntegerField(default=0)
+    rating_total = models.IntegerField(default=0, editable=False)  # Sum of FarmerRating.rating
     
     # Compliance
     fssai_license = models.CharField(max_length=100, blank=True)
@@ -198,6 +201,17 @@ class FarmerProfile(TimeStampedModel):
     def __str__(self):
         return f"{self.farm_name} - {self.user.get_full_name()}"
 
+    def save(self, *args, **kwargs):
+        from .geo import encode
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
 
 # ============================================================================
 # BUYER PROFILES
@@ -327,6 +341,28 @@ class CropCategory(TimeStampedModel):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # path is the ancestors' ids then this id, each followed by "/", so a
+        # subtree is one path__startswith query (see descendants())
+        previous_path = None
+        if not self._state.adding:
+            previous_path = CropCategory.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+        self.level = self.parent.level + 1 if self.parent else 0
+        self.path = f"{self.parent.path if self.parent else ''}{self.pk.hex}/"
+        super().save(*args, **kwargs)
+
+        if previous_path and previous_path != self.path:
+            # Moved: rewrite the old subtree under the new path
+            moved = list(CropCategory.objects.filter(path__startswith=previous_path).exclude(pk=self.pk))
+            for category in moved:
+                category.path = self.path + category.path[len(previous_path):]
+                category.level = category.path.count('/') - 1
+            CropCategory.objects.bulk_update(moved, ['path', 'level'])
+
+    def descendants(self):
+        """Every category below this one, in one query"""
+        return CropCategory.objects.filter(path__startswith=self.path).exclude(pk=self.pk)
+
 
 # Continuing in next part due to length...
 
@@ -402,7 +438,7 @@ class CropProduct(TimeStampedModel, SoftDeleteModel):
         db_index=True
     )
     is_featured = models.BooleanField(default=False, db_index=True)
-    is_trending = models.BooleanField(default=False)
+    is_trending = models.BooleanField(default=False)  # Top products by trending_score, set by trending.py
     
     # Engagement Metrics
     views_count = models.IntegerField(default=0)
@@ -410,6 +446,14 @@ class CropProduct(TimeStampedModel, SoftDeleteModel):
     cart_add_count = models.IntegerField(default=0)
     sales_count = models.IntegerField(default=0)
     
+    # Trending (see trending.py): a time-decayed score kept in log space, and
+    # the engagement counts already folded into it
+    trending_score = models.FloatField(default=0, editable=False)
+    trending_views_seen = models.IntegerField(default=0, editable=False)
+    trending_wishlists_seen = models.IntegerField(default=0, editable=False)
+    trending_cart_adds_seen = models.IntegerField(default=0, editable=False)
+    trending_sales_seen = models.IntegerField(default=0, editable=False)
+    
     # Rating
     rating = models.DecimalField(
         max_digits=3,
@@ -418,6 +462,7 @@ class CropProduct(TimeStampedModel, SoftDeleteModel):
         validators=[MinValueValidator(0), MaxValueValidator(5)]
     )
     review_count = models.IntegerField(default=0)
+    rating_total = models.IntegerField(default=0, editable=False)  # Sum of approved review ratings
     
     # Availability
     available_from = models.DateField(null=True, blank=True)
@@ -436,6 +481,22 @@ class CropProduct(TimeStampedModel, SoftDeleteModel):
             models.Index(fields=['listing_status', '-rating']),
             models.Index(fields=['price_per_unit']),
             models.Index(fields=['-is_featured', '-rating']),
+            models.Index(
+                fields=['listing_status', '-trending_score'], name='product_trending_idx',
+                condition=models.Q(is_deleted=False)
+            ),
+            # Only products with engagement not yet scored, so each trending
+            # run reads just those (trending.pending_products() filters on
+            # this exact condition, which SQLite needs to use the index)
+            models.Index(
+                fields=['id'], name='product_trending_pending_idx',
+                condition=(
+                    ~models.Q(views_count=models.F('trending_views_seen'))
+                    | ~models.Q(wishlist_count=models.F('trending_wishlists_seen'))
+                    | ~models.Q(cart_add_count=models.F('trending_cart_adds_seen'))
+                    | ~models.Q(sales_count=models.F('trending_sales_seen'))
+                )
+            ),
         ]
 
     def __str__(self):
@@ -645,14 +706,18 @@ class Order(TimeStampedModel):
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generate order number
-            from django.utils import timezone
-            import random
-            year = timezone.now().year
-            random_num = random.randint(100000, 999999)
-            self.order_number = f"ORD-{year}-{random_num}"
+            self.order_number = self.generate_order_number()
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def generate_order_number():
+        """Random ORD-<year>-<6 digits> number; bulk_create callers must set it themselves"""
+        from django.utils import timezone
+        import random
+        year = timezone.now().year
+        random_num = random.randint(100000, 999999)
+        return f"ORD-{year}-{random_num}"
+
 
 # ============================================================================
 # ORDER STATUS HISTORY
@@ -859,10 +924,17 @@ class NotificationType(models.TextChoices):
     NEW_MESSAGE = 'new_message', _('New Message')
     VERIFICATION_APPROVED = 'verification_approved', _('Verification Approved')
     VERIFICATION_REJECTED = 'verification_rejected', _('Verification Rejected')
+    NEW_LISTING = 'new_listing', _('New Listing Nearby')
     PROMOTIONAL = 'promotional', _('Promotional')
     SYSTEM_ALERT = 'system_alert', _('System Alert')
 
 
+class NotificationChannel(models.TextChoices):
+    IN_APP = 'in_app', _('In App')
+    EMAIL = 'email', _('Email')
+    SMS = 'sms', _('SMS')
+
+
 class NotificationPriority(models.TextChoices):
     LOW = 'low', _('Low')
     MEDIUM = 'medium', _('Medium')
@@ -890,12 +962,13 @@ class Notification(TimeStampedModel):
     related_product = models.ForeignKey(CropProduct, on_delete=models.CASCADE, null=True, blank=True)
     
     # Delivery status
+    channels = models.JSONField(default=list, blank=True)  # Empty: the priority's default channels
     channels_sent = models.JSONField(default=list, blank=True)  # ['in_app', 'email', 'sms']
     is_read = models.BooleanField(default=False, db_index=True)
     read_at = models.DateTimeField(null=True, blank=True)
     
     # Scheduling
-    scheduled_for = models.DateTimeField(null=True, blank=True, db_index=True)
+    scheduled_for = models.DateTimeField(null=True, blank=True, db_index=True, default=timezone.now)
     sent_at = models.DateTimeField(null=True, blank=True)
     expires_at = models.DateTimeField(null=True, blank=True)
 
@@ -905,6 +978,15 @@ class Notification(TimeStampedModel):
         indexes = [
             models.Index(fields=['user', 'is_read', '-created_at']),
             models.Index(fields=['notification_type', '-created_at']),
+            # Undelivered notifications by due time, for the delivery poll
+            models.Index(
+                fields=['scheduled_for'], name='notification_due_idx',
+                condition=models.Q(sent_at__isnull=True)
+            ),
+            models.Index(
+                fields=['expires_at'], name='notification_expiry_idx',
+                condition=models.Q(expires_at__isnull=False)
+            ),
         ]
 
     def __str__(self):
@@ -942,6 +1024,8 @@ class Coupon(TimeStampedModel):
     min_order_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     max_uses_per_user = models.IntegerField(default=1)
     total_usage_limit = models.IntegerField(null=True, blank=True)
+    # Redemptions so far, kept by coupons.redeem_coupon() with F() updates
+    times_used = models.IntegerField(default=0, editable=False)
     
     # Applicability
     applicable_to = models.CharField(max_length=20, choices=CouponUserType.choices, default=CouponUserType.ALL)
@@ -0,0 +1,264 @@
+"""
+Notification creation and delivery
+
+Notifications are rows first: notify() and broadcast() only insert them
+(broadcast in bulk_create batches), and deliver_due_notifications() later
+polls the undelivered ones that are due through a partial index, groups
+each batch by channel and sends it:
+
+- in_app: nothing to send, the row is what the app lists
+- email: send_mail over one SMTP connection per batch
+- sms: the backend named by MARKETPLACE_SMS_BACKEND (logs by default)
+
+A notification goes out on its own channels, or its priority's defaults
+when it has none. Expired notifications are never sent and are purged in
+chunks by purge_expired_notifications().
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import get_connection, send_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Notification, NotificationChannel, NotificationPriority, NotificationType
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+NOTIFICATION_BATCH_SIZE = 500
+BROADCAST_BATCH_SIZE = 1000
+PURGE_CHUNK_SIZE = 1000
+NEW_LISTING_TTL = timedelta(days=7)
+
+CHANNELS_BY_PRIORITY = {
+    NotificationPriority.LOW: [NotificationChannel.IN_APP],
+    NotificationPriority.MEDIUM: [NotificationChannel.IN_APP, NotificationChannel.EMAIL],
+    NotificationPriority.HIGH: [NotificationChannel.IN_APP, NotificationChannel.EMAIL, NotificationChannel.SMS],
+    NotificationPriority.URGENT: [NotificationChannel.IN_APP, NotificationChannel.EMAIL, NotificationChannel.SMS],
+}
+
+
+# ============================================================================
+# SMS BACKENDS
+# ============================================================================
+
+class ConsoleSMSBackend:
+    """Logs messages instead of sending them; replace via MARKETPLACE_SMS_BACKEND"""
+
+    def send_messages(self, messages):
+        """Send (phone, text) pairs; returns how many were sent"""
+        for phone, text in messages:
+            logger.info('SMS to %s: %s', phone, text)
+        return len(messages)
+
+
+_sms_backend = None
+
+
+def get_sms_backend():
+    global _sms_backend
+    if _sms_backend is None:
+        path = getattr(settings, 'MARKETPLACE_SMS_BACKEND', None)
+        _sms_backend = import_string(path)() if path else ConsoleSMSBackend()
+    return _sms_backend
+
+
+# ============================================================================
+# CHANNELS
+# ============================================================================
+
+def send_in_app(notifications):
+    return list(notifications)
+
+
+def send_email(notifications):
+    """Email each notification whose user has an address; returns those sent"""
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        logger.exception('Could not connect to send %d notification emails', len(notifications))
+        return []
+
+    sent = []
+    try:
+        for notification in notifications:
+            if not notification.user.email:
+                continue
+            try:
+                send_mail(notification.title, notification.message, settings.DEFAULT_FROM_EMAIL,
+                          [notification.user.email], connection=connection)
+            except Exception:
+                logger.exception('Email for notification %s failed', notification.pk)
+                continue
+            sent.append(notification)
+    finally:
+        connection.close()
+    return sent
+
+
+def send_sms(notifications):
+    recipients = [notification for notification in notifications if notification.user.phone]
+    try:
+        get_sms_backend().send_messages(
+            [(str(notification.user.phone), f'{notification.title}: {notification.message}')
+             for notification in recipients]
+        )
+    except Exception:
+        logger.exception('SMS batch of %d failed', len(recipients))
+        return []
+    return recipients
+
+
+SENDERS = {
+    NotificationChannel.IN_APP: send_in_app,
+    NotificationChannel.EMAIL: send_email,
+    NotificationChannel.SMS: send_sms,
+}
+
+
+def channels_for(notification):
+    channels = notification.channels or CHANNELS_BY_PRIORITY.get(notification.priority, [NotificationChannel.IN_APP])
+    return [str(channel) for channel in channels]
+
+
+# ============================================================================
+# CREATION
+# ============================================================================
+
+def notify(user, notification_type, title, message, **fields):
+    """Create one notification; it is sent by the next delivery run"""
+    return Notification.objects.create(
+        user=user, notification_type=notification_type, title=title, message=message, **fields
+    )
+
+
+def broadcast(users, notification_type, title, message, batch_size=BROADCAST_BATCH_SIZE, **fields):
+    """
+    Create the same notification for every user in the users queryset
+
+    Returns:
+        int: Notifications created
+    """
+    created = 0
+    user_ids = users.order_by().values_list('pk', flat=True).iterator(chunk_size=batch_size)
+    batch = []
+    for user_id in user_ids:
+        batch.append(Notification(
+            user_id=user_id, notification_type=notification_type, title=title, message=message, **fields
+        ))
+        if len(batch) >= batch_size:
+            created += len(Notification.objects.bulk_create(batch))
+            batch = []
+    if batch:
+        created += len(Notification.objects.bulk_create(batch))
+    return created
+
+
+def broadcast_new_listing(product):
+    """Tell the buyers in the product's district about a new listing"""
+    farmer = product.farmer
+    buyers = User.objects.filter(buyer_profile__isnull=False, district__iexact=farmer.district).exclude(pk=farmer.user_id)
+    return broadcast(
+        buyers,
+        NotificationType.NEW_LISTING,
+        title=f'New in {farmer.district}: {product.name}',
+        message=f'{farmer.farm_name} listed {product.name} at {product.price_per_unit}/{product.unit}.',
+        priority=NotificationPriority.LOW,
+        related_product=product,
+        expires_at=timezone.now() + NEW_LISTING_TTL,
+    )
+
+
+# ============================================================================
+# DELIVERY
+# ============================================================================
+
+def due_notifications(now=None):
+    """Undelivered, unexpired notifications whose time has come"""
+    now = now or timezone.now()
+    index = next(index for index in Notification._meta.indexes if index.name == 'notification_due_idx')
+    # index.condition verbatim, so the database can use the partial index
+    return Notification.objects.filter(index.condition, scheduled_for__lte=now).filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+    )
+
+
+def claim_due_notifications(now, batch_size=NOTIFICATION_BATCH_SIZE):
+    """
+    Stamp up to batch_size due notifications as sent and return them
+
+    The claim is its own short transaction, so no lock is held while they
+    are sent and two delivery runs never send the same notification.
+    """
+    with transaction.atomic():
+        ids = list(
+            due_notifications(now).select_for_update(of=('self',)).order_by('scheduled_for')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        claimed_at = timezone.now()
+        Notification.objects.filter(pk__in=ids, sent_at__isnull=True).update(sent_at=claimed_at)
+    return list(Notification.objects.filter(pk__in=ids, sent_at=claimed_at).select_related('user'))
+
+
+def deliver_due_notifications(now=None, batch_size=NOTIFICATION_BATCH_SIZE):
+    """
+    Send every due notification on its channels
+
+    Each batch is claimed first and sent outside any transaction; the
+    channels that arrived are recorded afterwards. A run that dies while
+    sending leaves its batch claimed but unsent rather than sent twice.
+
+    Returns:
+        dict: Channel -> notifications sent on it
+    """
+    now = now or timezone.now()
+    totals = defaultdict(int)
+    while True:
+        batch = claim_due_notifications(now, batch_size)
+        if not batch:
+            break
+        by_channel = defaultdict(list)
+        for notification in batch:
+            for channel in channels_for(notification):
+                if channel not in notification.channels_sent:
+                    by_channel[channel].append(notification)
+
+        for channel, notifications in by_channel.items():
+            sender = SENDERS.get(channel)
+            if sender is None:
+                logger.warning('Unknown notification channel %s', channel)
+                continue
+            for notification in sender(notifications):
+                notification.channels_sent.append(channel)
+                totals[channel] += 1
+
+        # Failed channels are not retried; channels_sent tells what arrived
+        Notification.objects.bulk_update(batch, ['channels_sent'])
+    return dict(totals)
+
+
+def purge_expired_notifications(now=None, chunk_size=PURGE_CHUNK_SIZE):
+    """
+    Delete expired notifications, chunk_size per DELETE
+
+    Returns:
+        int: Notifications deleted
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(Notification.objects.filter(expires_at__isnull=False, expires_at__lte=now)
+                   .order_by().values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += Notification.objects.filter(pk__in=ids).delete()[0]
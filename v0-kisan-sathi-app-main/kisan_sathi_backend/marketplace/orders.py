@@ -0,0 +1,259 @@
+"""
+Order placement service
+
+Stock is reserved with a conditional UPDATE (quantity_available >= qty), so
+concurrent buyers can never oversell a product, and the order and its first
+status history row are written in the same transaction as the decrement.
+Cart checkout locks every product in the cart with one SELECT ... FOR UPDATE
+instead, and writes all of the cart's orders with bulk_create. A coupon
+on a single order is redeemed in its transaction too (see coupons.py).
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CartItem, CropProduct, ListingStatus, Order, OrderStatus, OrderStatusHistory
+from .pricing import unit_price_for
+
+TAX_RATE = Decimal('5.00')  # 5% GST
+DELIVERY_CHARGES = Decimal('50.00')  # Flat delivery charge
+
+# Order number collisions (IntegrityError) and lock timeouts/deadlocks
+# (OperationalError) are retried with a short randomised backoff
+ORDER_RETRY_ATTEMPTS = 5
+ORDER_RETRY_BACKOFF = 0.02
+
+OUT_OF_STOCK = 'Requested quantity not available'
+
+
+class OrderError(Exception):
+    """An order that cannot be placed; the message is safe to show to buyers"""
+
+
+class OutOfStock(OrderError):
+    pass
+
+
+class CheckoutError(OrderError):
+    """Cart lines that cannot be ordered; nothing was placed"""
+
+    def __init__(self, message, items=()):
+        self.items = list(items)
+        super().__init__(message)
+
+
+def order_pricing(unit_price, quantity):
+    """Subtotal, tax and total for quantity units at unit_price"""
+    subtotal = unit_price * quantity
+    tax_amount = (subtotal * TAX_RATE) / 100
+    return {
+        'unit_price': unit_price,
+        'subtotal': subtotal,
+        'tax_rate': TAX_RATE,
+        'tax_amount': tax_amount,
+        'delivery_charges': DELIVERY_CHARGES,
+        'total_amount': subtotal + tax_amount + DELIVERY_CHARGES,
+    }
+
+
+def place_order(buyer, product_id, quantity, delivery_address, payment_method,
+                buyer_notes='', placed_by=None, coupon_code=''):
+    """
+    Reserve stock and create an order in one transaction
+
+    Args:
+        buyer: BuyerProfile placing the order
+        product_id: CropProduct id
+        quantity: Decimal quantity in the product's unit
+        delivery_address: DeliveryAddress belonging to buyer (snapshotted)
+        payment_method: Payment method label
+        buyer_notes: Optional notes for the farmer
+        placed_by: User recorded on the status history (default: buyer.user)
+        coupon_code: Optional coupon to redeem on the order
+
+    Returns:
+        Order: The new pending order
+
+    Raises:
+        OutOfStock: Not enough stock left
+        OrderError: Product unavailable or quantity outside the order limits
+        CouponError: The coupon cannot be used on this order
+    """
+    return _with_retries(
+        _place_order, buyer, product_id, quantity, delivery_address, payment_method,
+        buyer_notes, placed_by or buyer.user, coupon_code
+    )
+
+
+def _with_retries(place, *args):
+    # Retrying inside a caller's transaction would reuse a broken transaction
+    attempts = 1 if connection.in_atomic_block else ORDER_RETRY_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                return place(*args)
+        except (IntegrityError, OperationalError):
+            if attempt == attempts:
+                raise
+            time.sleep(random.uniform(0, ORDER_RETRY_BACKOFF * attempt))
+
+
+def _place_order(buyer, product_id, quantity, delivery_address, payment_method, buyer_notes, placed_by,
+                 coupon_code):
+    from .coupons import redeem_coupon  # coupons.py builds on this module
+
+    # Every order rule is in the WHERE clause, so the UPDATE is both the check
+    # and the oversell guard. Writing first also takes the write lock up
+    # front instead of upgrading a read lock, which SQLite refuses under load.
+    reserved = CropProduct.objects.filter(
+        Q(max_order_quantity__isnull=True) | Q(max_order_quantity__gte=quantity),
+        pk=product_id,
+        listing_status=ListingStatus.ACTIVE,
+        is_deleted=False,
+        min_order_quantity__lte=quantity,
+        quantity_available__gte=quantity,
+    ).update(
+        quantity_available=F('quantity_available') - quantity,
+        sales_count=F('sales_count') + 1,
+        updated_at=timezone.now(),
+    )
+    if not reserved:
+        raise rejection_reason(product_id, quantity)
+
+    product = CropProduct.objects.select_related('farmer').get(pk=product_id)
+    order = _build_order(buyer, product, quantity, delivery_address, payment_method, buyer_notes)
+    usage = redeem_coupon(coupon_code, order) if coupon_code else None
+    order.save()
+    if usage is not None:
+        usage.save()
+    OrderStatusHistory.objects.create(
+        order=order,
+        to_status=OrderStatus.PENDING,
+        changed_by=placed_by,
+        notes='Order created'
+    )
+    return order
+
+
+def _build_order(buyer, product, quantity, delivery_address, payment_method, buyer_notes):
+    return Order(
+        buyer=buyer,
+        farmer=product.farmer,
+        product=product,
+        quantity_ordered=quantity,
+        unit=product.unit,
+        delivery_name=delivery_address.contact_name,
+        delivery_phone=delivery_address.contact_phone,
+        delivery_address=delivery_address.address_line1,
+        delivery_city=delivery_address.city,
+        delivery_state=delivery_address.state,
+        delivery_pincode=delivery_address.pincode,
+        delivery_landmark=delivery_address.landmark,
+        payment_method=payment_method,
+        buyer_notes=buyer_notes,
+        **order_pricing(unit_price_for(product, quantity), quantity)
+    )
+
+
+def checkout_cart(buyer, delivery_address, payment_method, buyer_notes='', placed_by=None):
+    """
+    Turn the buyer's cart into one order per line and empty the cart
+
+    All lines are ordered or none are: products are locked with a single
+    query, every line is checked against the locked rows, then stock, orders,
+    status history and the cart are written in the same transaction.
+
+    Returns:
+        list: The new pending orders, one per cart line
+
+    Raises:
+        CheckoutError: Empty cart, or lines that cannot be ordered (see .items)
+    """
+    return _with_retries(
+        _checkout_cart, buyer, delivery_address, payment_method, buyer_notes, placed_by or buyer.user
+    )
+
+
+def _checkout_cart(buyer, delivery_address, payment_method, buyer_notes, placed_by):
+    now = timezone.now()
+    # Locks the cart rows and their products together, in product order so
+    # overlapping checkouts queue instead of deadlocking. A concurrent
+    # checkout of the same cart waits here and then finds it empty.
+    cart = list(
+        CartItem.objects.select_for_update(of=('self', 'product'))
+        .select_related('product__farmer')
+        .filter(buyer=buyer, expires_at__gt=now)
+        .order_by('product_id')
+    )
+    if not cart:
+        raise CheckoutError('Cart is empty')
+
+    problems = []
+    for item in cart:
+        error = line_error(item.product, item.quantity)
+        if error:
+            problems.append({'cart_item_id': str(item.pk), 'product_id': str(item.product_id),
+                             'product_name': item.product.name, 'error': error})
+    if problems:
+        raise CheckoutError('Some cart items cannot be ordered', problems)
+
+    # The products are locked, so the new stock can be computed here and
+    # written in one UPDATE without losing concurrent changes
+    products = []
+    for item in cart:
+        product = item.product
+        product.quantity_available -= item.quantity
+        product.sales_count += 1
+        product.updated_at = now
+        products.append(product)
+    CropProduct.objects.bulk_update(products, ['quantity_available', 'sales_count', 'updated_at'])
+
+    # bulk_create skips Order.save(), so number the orders here; a clash
+    # with an existing order raises IntegrityError and the checkout retries
+    numbers = set()
+    while len(numbers) < len(cart):
+        numbers.add(Order.generate_order_number())
+    orders = []
+    for item, number in zip(cart, numbers):
+        order = _build_order(buyer, item.product, item.quantity, delivery_address, payment_method, buyer_notes)
+        order.order_number = number
+        orders.append(order)
+    Order.objects.bulk_create(orders)
+    OrderStatusHistory.objects.bulk_create([
+        OrderStatusHistory(order=order, to_status=OrderStatus.PENDING,
+                           changed_by=placed_by, notes='Order created at checkout')
+        for order in orders
+    ])
+    CartItem.objects.filter(pk__in=[item.pk for item in cart]).delete()
+    return orders
+
+
+def line_error(product, quantity):
+    """Why quantity of a (locked) product cannot be ordered, or None"""
+    if product.listing_status != ListingStatus.ACTIVE or product.is_deleted:
+        return 'Product not found or not available'
+    if quantity < product.min_order_quantity:
+        return f'Minimum order quantity is {product.min_order_quantity}'
+    if product.max_order_quantity and quantity > product.max_order_quantity:
+        return f'Maximum order quantity is {product.max_order_quantity}'
+    if quantity > product.quantity_available:
+        return OUT_OF_STOCK
+    return None
+
+
+def rejection_reason(product_id, quantity):
+    """The OrderError explaining why a reservation UPDATE matched no row"""
+    product = CropProduct.objects.filter(
+        pk=product_id, listing_status=ListingStatus.ACTIVE, is_deleted=False
+    ).first()
+    if product is None:
+        return OrderError('Product not found or not available')
+    # No error means another order freed the stock after the UPDATE missed
+    error = line_error(product, quantity)
+    if error is None or error == OUT_OF_STOCK:
+        return OutOfStock(OUT_OF_STOCK)
+    return OrderError(error)
@@ -0,0 +1,182 @@
+"""
+Cart and bulk pricing
+
+CropProduct.bulk_pricing holds quantity tiers:
+
+    [{"min_quantity": "10", "price_per_unit": "18.00"},
+     {"min_quantity": "50", "price_per_unit": "16.50"}]
+
+A quantity pays the price of the largest tier it reaches, or
+price_per_unit below the first tier. A larger quantity never pays more per
+unit than a smaller one, nor more than price_per_unit. Malformed tiers are
+ignored.
+
+The tiers are compiled once into a PriceSchedule of sorted breakpoints,
+cached per product and rebuilt when the product's updated_at or
+price_per_unit changes, so pricing a quantity is a binary search.
+
+price_cart() prices a whole cart from one query: the lines come back with
+their snapshot subtotal and a price_changed flag computed in SQL, and the
+product columns needed for tiers and display joined in. quote() prices
+many (product, quantity) pairs from one query.
+"""
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db.models import BooleanField, DecimalField, ExpressionWrapper, F, Q
+
+from .models import CropProduct
+
+CENT = Decimal('0.01')
+PRICE_SCHEDULE_CACHE_SIZE = 10000  # Products
+QUOTE_MAX_ITEMS = 500
+QUOTE_PRODUCT_FIELDS = [
+    'id', 'name', 'unit', 'price_per_unit', 'bulk_pricing', 'updated_at', 'listing_status',
+    'is_deleted', 'min_order_quantity', 'max_order_quantity', 'quantity_available',
+]
+
+
+def money(value):
+    return Decimal(value).quantize(CENT, ROUND_HALF_UP)
+
+
+def parse_tiers(bulk_pricing):
+    """{min_quantity: price}, keeping the lowest price of duplicate breakpoints"""
+    tiers = {}
+    for tier in bulk_pricing if isinstance(bulk_pricing, list) else []:
+        try:
+            min_quantity = Decimal(str(tier['min_quantity']))
+            price = Decimal(str(tier['price_per_unit']))
+        except (KeyError, TypeError, InvalidOperation):
+            continue
+        if min_quantity > 0 and price >= 0:
+            price = money(price)
+            tiers[min_quantity] = min(price, tiers.get(min_quantity, price))
+    return tiers
+
+
+class PriceSchedule:
+    """Compiled bulk pricing: sorted breakpoints and the unit price from each"""
+    __slots__ = ('base_price', 'breakpoints', 'prices')
+
+    def __init__(self, base_price, bulk_pricing):
+        self.base_price = base_price
+        self.breakpoints, self.prices = [], []
+        best = base_price
+        for min_quantity, price in sorted(parse_tiers(bulk_pricing).items()):
+            best = min(best, price)
+            self.breakpoints.append(min_quantity)
+            self.prices.append(best)
+
+    def price_for(self, quantity):
+        tier = bisect_right(self.breakpoints, quantity)
+        return self.prices[tier - 1] if tier else self.base_price
+
+
+_schedules = OrderedDict()  # product pk -> (version, PriceSchedule)
+_schedules_lock = threading.Lock()
+
+
+def price_schedule(product):
+    """The product's compiled PriceSchedule, cached until the product changes"""
+    version = (product.updated_at, product.price_per_unit)
+    with _schedules_lock:
+        cached = _schedules.get(product.pk)
+        if cached is not None and cached[0] == version:
+            _schedules.move_to_end(product.pk)
+            return cached[1]
+
+    schedule = PriceSchedule(product.price_per_unit, product.bulk_pricing)
+    with _schedules_lock:
+        _schedules[product.pk] = (version, schedule)
+        _schedules.move_to_end(product.pk)
+        while len(_schedules) > PRICE_SCHEDULE_CACHE_SIZE:
+            _schedules.popitem(last=False)
+    return schedule
+
+
+def unit_price_for(product, quantity):
+    """Price per unit for quantity of product, after bulk tiers"""
+    return price_schedule(product).price_for(quantity)
+
+
+def priced_cart_lines(cart_items):
+    """cart_items annotated for pricing, with products joined"""
+    return cart_items.select_related('product__farmer', 'product__category').annotate(
+        snapshot_subtotal=ExpressionWrapper(
+            F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=22, decimal_places=5)
+        ),
+        price_changed=ExpressionWrapper(
+            ~Q(unit_price=F('product__price_per_unit')), output_field=BooleanField()
+        ),
+    ).order_by('created_at')
+
+
+def price_cart(cart_items):
+    """
+    Price every line of a cart at today's prices and bulk tiers
+
+    Returns:
+        tuple: (lines, totals); each line is a CartItem with current_unit_price,
+        effective_unit_price and line_total set
+    """
+    lines = list(priced_cart_lines(cart_items))
+    snapshot_total = list_total = total = Decimal('0')
+    changed = 0
+    for line in lines:
+        line.current_unit_price = line.product.price_per_unit
+        line.effective_unit_price = unit_price_for(line.product, line.quantity)
+        line.line_total = money(line.quantity * line.effective_unit_price)
+        snapshot_total += line.snapshot_subtotal
+        list_total += line.quantity * line.current_unit_price
+        total += line.line_total
+        changed += line.price_changed
+
+    totals = {
+        'item_count': len(lines),
+        'subtotal': total,
+        'snapshot_subtotal': money(snapshot_total),
+        'bulk_savings': money(list_total) - total,
+        'price_changed_count': changed,
+        'warning': f'Prices changed for {changed} cart item(s) since they were added' if changed else None,
+    }
+    return lines, totals
+
+
+def quote(items):
+    """
+    Price (product_id, quantity) pairs at today's prices and bulk tiers
+
+    Returns:
+        tuple: (lines, totals); lines follow the order of items, and lines that
+        cannot be ordered carry an error and stay out of the totals
+    """
+    from .orders import line_error
+
+    products = CropProduct.objects.only(*QUOTE_PRODUCT_FIELDS).in_bulk({product_id for product_id, _ in items})
+    lines = []
+    subtotal = savings = Decimal('0')
+    for product_id, quantity in items:
+        product = products.get(product_id)
+        if product is None:
+            lines.append({'product_id': product_id, 'quantity': quantity, 'error': 'Product not found or not available'})
+            continue
+        unit_price = unit_price_for(product, quantity)
+        line = {
+            'product_id': product_id,
+            'product_name': product.name,
+            'unit': product.unit,
+            'quantity': quantity,
+            'list_price': product.price_per_unit,
+            'unit_price': unit_price,
+            'line_total': money(quantity * unit_price),
+            'savings': money(quantity * product.price_per_unit) - money(quantity * unit_price),
+            'error': line_error(product, quantity),
+        }
+        if line['error'] is None:
+            subtotal += line['line_total']
+            savings += line['savings']
+        lines.append(line)
+    return lines, {'subtotal': subtotal, 'bulk_savings': savings}
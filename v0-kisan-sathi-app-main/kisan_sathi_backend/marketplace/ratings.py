@@ -0,0 +1,204 @@
+"""
+Denormalized ratings and sales totals
+
+CropProduct.rating/review_count summarise its approved ProductReviews,
+FarmerProfile.rating/review_count its FarmerRatings and
+FarmerProfile.total_sales/total_orders its delivered Orders. Each row
+contributes a (sum, count) pair to its target; the signal handlers in
+signals.py snapshot a row's contribution before it is saved and add the
+difference afterwards with a single F() UPDATE, so approving, removing,
+delivering or cancelling never rescans the source table. Ratings keep the
+raw sum in rating_total so the average stays exact.
+
+reconcile_ratings() recomputes everything from one grouped query per
+source table, for data written around the signals (raw SQL, fixtures,
+queryset.update()).
+"""
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+
+from .cache import invalidate_catalog
+from .models import CropProduct, FarmerProfile, FarmerRating, Order, OrderStatus, ProductReview
+
+RECONCILE_BATCH_SIZE = 500
+
+NO_CONTRIBUTION = (0, 0)
+
+
+def review_contribution(review):
+    """(rating sum, count) a review adds to its product"""
+    return (review.rating, 1) if review.is_approved else NO_CONTRIBUTION
+
+
+def farmer_rating_contribution(rating):
+    return (rating.rating, 1)
+
+
+def order_contribution(order):
+    """(sales, orders) an order adds to its farmer; only delivered orders count"""
+    if order.order_status == OrderStatus.DELIVERED:
+        return (order.total_amount, 1)
+    return NO_CONTRIBUTION
+
+
+def average_rating(total, count):
+    """total / count rounded half up to 2 places, as the UPDATEs compute it"""
+    if count <= 0:
+        return Decimal('0')
+    return Decimal((total * 200 + count) // (count * 2)) / 100
+
+
+def _average_expression(total, count):
+    # Integer arithmetic rounds the same on every database and in Python
+    hundredths = (total * 200 + count) / (count * 2)
+    return Cast(hundredths, FloatField()) / Value(100.0)
+
+
+def add_rating(model, pk, total, count):
+    """Add total/count to one product's or farmer's rating in one UPDATE"""
+    if not (total or count):
+        return
+    new_total = F('rating_total') + Value(total)
+    new_count = F('review_count') + Value(count)
+    model.objects.filter(pk=pk).update(
+        rating_total=new_total,
+        review_count=new_count,
+        rating=Case(
+            When(review_count__gt=-count, then=_average_expression(new_total, new_count)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+    if model is CropProduct:
+        transaction.on_commit(invalidate_catalog)
+
+
+def add_sales(farmer_id, sales, orders):
+    if not (sales or orders):
+        return
+    FarmerProfile.objects.filter(pk=farmer_id).update(
+        total_sales=F('total_sales') + Value(Decimal(sales)),
+        total_orders=F('total_orders') + Value(orders),
+    )
+
+
+# source model -> (target key, contribution, add to target)
+SOURCES = {
+    ProductReview: ('product_id', review_contribution, partial(add_rating, CropProduct)),
+    FarmerRating: ('farmer_id', farmer_rating_contribution, partial(add_rating, FarmerProfile)),
+    Order: ('farmer_id', order_contribution, add_sales),
+}
+
+
+def record_change(before, after):
+    """
+    Move a source row's contribution from its before to its after state
+
+    Either may be None, for a created or a deleted row.
+    """
+    key, contribute, add = SOURCES[type(before or after)]
+    changes = defaultdict(lambda: [0, 0])
+    for instance, sign in ((before, -1), (after, 1)):
+        if instance is not None:
+            total, count = contribute(instance)
+            change = changes[getattr(instance, key)]
+            change[0] += sign * total
+            change[1] += sign * count
+    for pk, (total, count) in changes.items():
+        add(pk, total, count)
+
+
+def approve_reviews(queryset, moderator=None):
+    """
+    Approve reviews in bulk, adding them to their products' ratings
+
+    Returns:
+        int: Reviews approved
+    """
+    from django.utils import timezone
+
+    with transaction.atomic():
+        pending = list(queryset.filter(is_approved=False).select_for_update()
+                       .values_list('pk', 'product_id', 'rating'))
+        if not pending:
+            return 0
+        queryset.model.objects.filter(pk__in=[pk for pk, _, _ in pending]).update(
+            is_approved=True, moderated_by=moderator, moderated_at=timezone.now()
+        )
+        totals = {}
+        for _, product_id, rating in pending:
+            total, count = totals.get(product_id, NO_CONTRIBUTION)
+            totals[product_id] = (total + rating, count + 1)
+        for product_id, (total, count) in totals.items():
+            add_rating(CropProduct, product_id, total, count)
+    return len(pending)
+
+
+# ============================================================================
+# RECONCILIATION
+# ============================================================================
+
+def _reconcile(model, expected, fields, dry_run):
+    """Write expected {pk: {field: value}} where stored values differ; absent values are zeroed"""
+    zeros = {field: model._meta.get_field(field).get_default() for field in fields}
+    drifted = []
+    for obj in model.objects.only('pk', *fields).iterator(chunk_size=RECONCILE_BATCH_SIZE):
+        values = {**zeros, **expected.get(obj.pk, {})}
+        if any(getattr(obj, field) != values[field] for field in fields):
+            for field in fields:
+                setattr(obj, field, values[field])
+            drifted.append(obj)
+    if drifted and not dry_run:
+        model.objects.bulk_update(drifted, fields, batch_size=RECONCILE_BATCH_SIZE)
+    return len(drifted)
+
+
+def _rating_values(rows, key):
+    return {
+        row[key]: {
+            'rating_total': row['total'],
+            'review_count': row['count'],
+            'rating': average_rating(row['total'], row['count']),
+        }
+        for row in rows
+    }
+
+
+def reconcile_ratings(dry_run=False, apps=global_apps):
+    """
+    Recompute every denormalized rating and sales total
+
+    Returns:
+        dict: 'products'/'farmers' -> rows that had drifted (and were fixed unless dry_run)
+    """
+    ProductReview = apps.get_model('marketplace', 'ProductReview')
+    FarmerRating = apps.get_model('marketplace', 'FarmerRating')
+    Order = apps.get_model('marketplace', 'Order')
+    Product = apps.get_model('marketplace', 'CropProduct')
+    Farmer = apps.get_model('marketplace', 'FarmerProfile')
+    rating_fields = ['rating_total', 'review_count', 'rating']
+
+    reviews = (ProductReview.objects.filter(is_approved=True).order_by().values('product_id')
+               .annotate(total=Sum('rating'), count=Count('pk')))
+    farmer_ratings = (FarmerRating.objects.order_by().values('farmer_id')
+                      .annotate(total=Sum('rating'), count=Count('pk')))
+    sales = (Order.objects.filter(order_status=OrderStatus.DELIVERED).order_by().values('farmer_id')
+             .annotate(sales=Sum('total_amount'), count=Count('pk')))
+
+    with transaction.atomic():
+        farmers = _rating_values(farmer_ratings, 'farmer_id')
+        for row in sales:
+            farmers.setdefault(row['farmer_id'], {}).update(total_sales=row['sales'], total_orders=row['count'])
+        drift = {
+            'products': _reconcile(Product, _rating_values(reviews, 'product_id'), rating_fields, dry_run),
+            'farmers': _reconcile(Farmer, farmers, rating_fields + ['total_sales', 'total_orders'], dry_run),
+        }
+        if drift['products'] and not dry_run:
+            transaction.on_commit(invalidate_catalog)
+    return drift
@@ -0,0 +1,318 @@
+"""
+Product search index
+
+Products are indexed as their text (name, variety, category, farm,
+description, keywords and every string in ``translations``) plus a
+transliteration-tolerant phonetic key per word, so "tamatar", "tamaatar"
+and "टमाटर" all find the same listing.
+
+The index sits behind a small backend interface. SQLite uses an FTS5 table
+with bm25 ranking and prefix matching; other databases fall back to
+DatabaseSearchBackend, which scans the product columns with LIKE. Set
+``MARKETPLACE_SEARCH_BACKEND`` to a dotted path to plug in another backend.
+The index is kept current by the CropProduct signal handlers in signals.py;
+``python manage.py rebuild_search_index`` rebuilds it from scratch.
+"""
+import re
+import unicodedata
+import uuid
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, TextField, Value, When
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+
+SEARCH_TABLE = 'marketplace_product_search'
+SEARCH_MAX_RESULTS = 200
+
+# Fields whose change makes a product's indexed text stale
+INDEXED_FIELDS = {
+    'name', 'variety', 'description', 'translations', 'meta_keywords',
+    'category', 'farmer', 'is_deleted',
+}
+
+# Letters, digits and the Indic blocks (Devanagari to Malayalam), whose
+# vowel signs and viramas are combining marks that \w alone would split on
+_WORD = re.compile(r'[\w\u0900-\u0d7f]+')
+
+# The Indic blocks share one layout (offset within each 0x80 block), so a
+# single table transliterates Hindi, Kannada, Telugu, Tamil etc. Aspirated
+# and retroflex consonants fold onto their plain Latin letter.
+_INDIC_LETTERS = {
+    0x02: 'n', 0x05: 'a', 0x06: 'a', 0x07: 'i', 0x08: 'i', 0x09: 'u', 0x0A: 'u',
+    0x0B: 'r', 0x0E: 'e', 0x0F: 'e', 0x10: 'e', 0x12: 'o', 0x13: 'o', 0x14: 'o',
+    0x15: 'k', 0x16: 'k', 0x17: 'g', 0x18: 'g', 0x19: 'n', 0x1A: 'c', 0x1B: 'c',
+    0x1C: 'j', 0x1D: 'j', 0x1E: 'n', 0x1F: 't', 0x20: 't', 0x21: 'd', 0x22: 'd',
+    0x23: 'n', 0x24: 't', 0x25: 't', 0x26: 'd', 0x27: 'd', 0x28: 'n', 0x29: 'n',
+    0x2A: 'p', 0x2B: 'p', 0x2C: 'b', 0x2D: 'b', 0x2E: 'm', 0x2F: 'y', 0x30: 'r',
+    0x31: 'r', 0x32: 'l', 0x33: 'l', 0x34: 'l', 0x35: 'v', 0x36: 's', 0x37: 's',
+    0x38: 's', 0x39: 'h', 0x58: 'k', 0x59: 'k', 0x5A: 'g', 0x5B: 'j', 0x5C: 'd',
+    0x5D: 'd', 0x5E: 'p', 0x5F: 'y',
+}
+
+_LATIN_SOUNDS = [
+    (re.compile(r'ph|f'), 'p'),
+    (re.compile(r'ck|q'), 'k'),
+    (re.compile(r'x'), 'ks'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'z'), 'j'),
+    (re.compile(r'([bcdgjkpst])h'), r'\1'),
+]
+
+
+def words(text):
+    """Lower-cased words of text, keeping Indic words whole"""
+    return _WORD.findall(text.lower())
+
+
+def phonetic_key(word):
+    """
+    Consonant skeleton of a word, identical across common spellings and scripts
+
+    Indic letters are transliterated, aspirates and similar sounds are
+    folded, vowels after the first letter are dropped and repeated letters
+    collapsed: "tamatar", "tamaatar" and "टमाटर" all give "tmtr".
+    """
+    if any(0x0900 <= ord(char) < 0x0D80 for char in word):
+        # Vowel signs, viramas and nuktas map to nothing. Transliterated
+        # letters are already folded, so the Latin rules would misread
+        # pairs such as g + h that only became adjacent by dropping a vowel.
+        latin = ''.join(
+            _INDIC_LETTERS.get((ord(char) - 0x0900) % 0x80, '') if 0x0900 <= ord(char) < 0x0D80 else char
+            for char in word.lower()
+        )
+    else:
+        latin = ''.join(unicodedata.normalize('NFKD', char)[0] for char in word.lower())
+        for pattern, replacement in _LATIN_SOUNDS:
+            latin = pattern.sub(replacement, latin)
+
+    key = latin[:1]
+    for char in latin[1:]:
+        if char in 'aeiou' or char == key[-1]:
+            continue
+        key += char
+    return key
+
+
+def _strings(value):
+    """Every string inside a JSON value such as translations"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def product_document(product):
+    """Column values indexed for one product"""
+    translations = ' '.join(_strings(product.translations))
+    keywords = ' '.join(_strings(product.meta_keywords))
+    named = ' '.join([product.name, product.variety, product.category.name, translations])
+    return {
+        'name': product.name,
+        'variety': product.variety,
+        'category': product.category.name,
+        'farm': product.farmer.farm_name,
+        'body': ' '.join([translations, keywords, product.description]),
+        'phonetic': ' '.join(sorted({phonetic_key(word) for word in words(named)})),
+    }
+
+
+class SearchBackend(ABC):
+    """Interface for product search backends"""
+
+    def index(self, products):
+        """Add or replace products (with category and farmer loaded)"""
+
+    def remove(self, product_ids):
+        """Drop products from the index"""
+
+    def rebuild(self, products):
+        """Replace the whole index with products"""
+        self.clear()
+        self.index(products)
+
+    def clear(self):
+        """Empty the index"""
+
+    @abstractmethod
+    def search(self, query, prefix=True, limit=SEARCH_MAX_RESULTS):
+        """Product ids matching every word of query, best match first"""
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    FTS5 index in SEARCH_TABLE
+
+    The FTS rowid is derived from the product UUID so updates and deletes
+    are rowid lookups rather than scans of the UNINDEXED product_id column.
+    """
+    columns = ('name', 'variety', 'category', 'farm', 'body', 'phonetic')
+    # bm25 weights in column order, product_id first
+    weights = (0.0, 10.0, 4.0, 3.0, 2.0, 1.0, 2.0)
+
+    @staticmethod
+    def create_table(schema_editor):
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            'product_id UNINDEXED, name, variety, category, farm, body, phonetic, '
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    @staticmethod
+    def drop_table(schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    @staticmethod
+    def rowid(product_id):
+        if not isinstance(product_id, uuid.UUID):
+            product_id = uuid.UUID(str(product_id))
+        # 63 bits fit SQLite's signed integer rowid
+        return product_id.int >> 65
+
+    def index(self, products):
+        products = list(products)
+        self.remove([product.pk for product in products])
+        rows = []
+        for product in products:
+            if product.is_deleted:
+                continue
+            document = product_document(product)
+            rows.append([self.rowid(product.pk), product.pk.hex] + [document[name] for name in self.columns])
+        if rows:
+            placeholders = ', '.join(['%s'] * (len(self.columns) + 2))
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {SEARCH_TABLE} (rowid, product_id, {', '.join(self.columns)}) "
+                    f'VALUES ({placeholders})',
+                    rows
+                )
+
+    def remove(self, product_ids):
+        rowids = [[self.rowid(pk)] for pk in product_ids]
+        if rowids:
+            with connection.cursor() as cursor:
+                cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', rowids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    def search(self, query, prefix=True, limit=SEARCH_MAX_RESULTS):
+        expression = self.match_expression(query, prefix)
+        if not expression:
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT product_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s',
+                [expression, limit]
+            )
+            return [uuid.UUID(row[0]) for row in cursor.fetchall()]
+
+    @staticmethod
+    def match_expression(query, prefix=True):
+        """
+        FTS5 query: each word must match as text or by phonetic key
+
+        Only the last word is a prefix, so "tom" finds tomatoes while the
+        buyer is still typing; phonetic prefixes need three letters to
+        avoid matching half the catalogue.
+        """
+        terms = words(query)
+        clauses = []
+        for position, word in enumerate(terms):
+            star = '*' if prefix and position == len(terms) - 1 else ''
+            options = [f'{{name variety category farm body}} : "{word}"{star}']
+            key = phonetic_key(word)
+            if len(key) >= 2:
+                key_star = star if len(key) >= 3 else ''
+                options.append(f'phonetic : "{key}"{key_star}')
+            clauses.append('(' + ' OR '.join(options) + ')')
+        return ' AND '.join(clauses)
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """
+    Index-free fallback for databases without a search backend
+
+    Matches words with LIKE against the product columns, ranking name
+    matches first. There is no phonetic matching on this backend.
+    """
+
+    def search(self, query, prefix=True, limit=SEARCH_MAX_RESULTS):
+        from .models import CropProduct
+
+        terms = words(query)
+        if not terms:
+            return []
+        queryset = CropProduct.objects.filter(is_deleted=False).annotate(
+            translations_text=Cast('translations', TextField())
+        )
+        for word in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=word) | Q(variety__icontains=word) | Q(description__icontains=word)
+                | Q(category__name__icontains=word) | Q(farmer__farm_name__icontains=word)
+                | Q(translations_text__icontains=word)
+            )
+        queryset = queryset.annotate(
+            name_match=Case(When(name__icontains=terms[0], then=Value(0)), default=Value(1),
+                            output_field=IntegerField())
+        ).order_by('name_match', '-sales_count')
+        return list(queryset.values_list('pk', flat=True)[:limit])
+
+
+_backend = None
+
+
+def get_backend():
+    """The configured backend; FTS5 on SQLite unless settings say otherwise"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'MARKETPLACE_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = DatabaseSearchBackend()
+    return _backend
+
+
+def index_products(products):
+    """(Re)index products; soft-deleted ones are removed"""
+    get_backend().index(products)
+
+
+def remove_products(product_ids):
+    get_backend().remove(product_ids)
+
+
+def rebuild_index(batch_size=500):
+    """Rebuild the whole index from the database; returns the product count"""
+    from .models import CropProduct
+
+    backend = get_backend()
+    backend.clear()
+    products = CropProduct.objects.filter(is_deleted=False).select_related('category', 'farmer').order_by('pk')
+    count = 0
+    batch = []
+    for product in products.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) == batch_size:
+            backend.index(batch)
+            count += len(batch)
+            batch = []
+    backend.index(batch)
+    return count + len(batch)
+
+
+def search_product_ids(query, prefix=True, limit=SEARCH_MAX_RESULTS):
+    """Ranked ids of products matching query (may include inactive listings)"""
+    return get_backend().search(query, prefix=prefix, limit=limit)
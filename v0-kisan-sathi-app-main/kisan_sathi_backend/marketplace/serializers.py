@@ -1,19 +1,33 @@
 """
 REST API Serializers for Marketplace
 """
+from collections import defaultdict
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import (
     FarmerProfile, BuyerProfile, DeliveryAddress,
     CropCategory, CropProduct, ProductImage,
-    CartItem, Order, OrderStatusHistory, Receipt,
+    CartItem, Order, OrderStatus, OrderStatusHistory, Receipt,
     ProductReview, FarmerRating, Wishlist,
-    Notification, Coupon, CouponUsage
+    Notification, Coupon, CouponUsage, DailyMetrics
 )
+from .carts import cart_expiry
 
 User = get_user_model()
 
 
+class DistanceKmField(serializers.ReadOnlyField):
+    """distance_km annotated by geo.nearby(); null outside ?near= searches"""
+
+    def get_attribute(self, instance):
+        return getattr(instance, 'distance_km', None)
+
+    def to_representation(self, value):
+        return round(value, 2)
+
+
 class UserBasicSerializer(serializers.ModelSerializer):
     """Basic user info"""
     class Meta:
@@ -35,10 +49,14 @@ class FarmerProfileSerializer(serializers.ModelSerializer):
 class FarmerProfileListSerializer(serializers.ModelSerializer):
     """Simplified farmer list"""
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    distance_km = DistanceKmField()
     
     class Meta:
         model = FarmerProfile
-        fields = ['id', 'farm_name', 'user_name', 'district', 'state', 'rating', 'verification_status', 'is_premium']
+        fields = [
+            'id', 'farm_name', 'user_name', 'district', 'state', 'rating', 'verification_status',
+            'is_premium', 'distance_km'
+        ]
 
 
 class BuyerProfileSerializer(serializers.ModelSerializer):
@@ -59,6 +77,14 @@ class DeliveryAddressSerializer(serializers.ModelSerializer):
         read_only_fields = ['buyer', 'created_at', 'updated_at']
 
 
+def group_by_parent(categories):
+    """{parent_id: [children]} for building category trees in memory"""
+    children_by_parent = defaultdict(list)
+    for category in sorted(categories, key=lambda c: (c.display_order, c.name)):
+        children_by_parent[category.parent_id].append(category)
+    return children_by_parent
+
+
 class CropCategorySerializer(serializers.ModelSerializer):
     """Category with hierarchy"""
     children = serializers.SerializerMethodField()
@@ -68,9 +94,16 @@ class CropCategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
     
     def get_children(self, obj):
-        if obj.children.exists():
-            return CropCategorySerializer(obj.children.filter(is_active=True), many=True).data
-        return []
+        # Callers serializing many categories pass every active category as
+        # context['children_by_parent']; otherwise the subtree is one query
+        children_by_parent = self.context.get('children_by_parent')
+        if children_by_parent is None:
+            children_by_parent = group_by_parent(obj.descendants().filter(is_active=True))
+        children = children_by_parent.get(obj.pk, [])
+        if not children:
+            return []
+        context = {**self.context, 'children_by_parent': children_by_parent}
+        return CropCategorySerializer(children, many=True, context=context).data
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -192,6 +225,7 @@ class CropProductListSerializer(serializers.ModelSerializer):
     farmer_name = serializers.CharField(source='farmer.farm_name', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     discount_percentage = serializers.ReadOnlyField()
+    distance_km = DistanceKmField()
     
     class Meta:
         model = CropProduct
@@ -200,7 +234,7 @@ class CropProductListSerializer(serializers.ModelSerializer):
             'price_per_unit', 'original_price', 'discount_percentage',
             'unit', 'quantity_available', 'primary_image_url',
             'rating', 'review_count', 'is_organic_certified',
-            'quality_grade', 'listing_status', 'is_featured'
+            'quality_grade', 'listing_status', 'is_featured', 'distance_km'
         ]
 
 
@@ -220,15 +254,19 @@ class CartItemSerializer(serializers.ModelSerializer):
         product = CropProduct.objects.get(id=product_id)
         validated_data['product'] = product
         validated_data['unit_price'] = product.price_per_unit
-        
-        # Set expiry
-        from django.utils import timezone
-        from datetime import timedelta
-        validated_data['expires_at'] = timezone.now() + timedelta(days=7)
+        validated_data['expires_at'] = cart_expiry()
         
         return super().create(validated_data)
 
 
+class CartSummaryItemSerializer(CartItemSerializer):
+    """Cart line priced by pricing.price_cart"""
+    current_unit_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    effective_unit_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    line_total = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+    price_changed = serializers.BooleanField(read_only=True)
+
+
 class OrderStatusHistorySerializer(serializers.ModelSerializer):
     """Order status change history"""
     changed_by_name = serializers.CharField(source='changed_by.get_full_name', read_only=True)
@@ -249,9 +287,12 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
+        # Status and the fields stamped with it only change through
+        # transitions.py, which enforces the order state machine
         read_only_fields = [
-            'order_number', 'created_at', 'updated_at',
-            'placed_at', 'confirmed_at', 'shipped_at', 'delivered_at'
+            'order_number', 'created_at', 'updated_at', 'order_status', 'status_updated_at',
+            'placed_at', 'confirmed_at', 'shipped_at', 'delivered_at', 'actual_delivery_date',
+            'cancelled_at', 'cancelled_by', 'refund_date'
         ]
 
 
@@ -348,37 +389,62 @@ class CouponUsageSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
+class ValidateCouponSerializer(serializers.Serializer):
+    """Coupon to check, optionally against a product and quantity"""
+    code = serializers.CharField(max_length=50)
+    product_id = serializers.UUIDField(required=False)
+    quantity = serializers.DecimalField(
+        max_digits=10, decimal_places=3, min_value=Decimal('0.001'), required=False
+    )
+
+
 # ============================================================================
 # CREATE ORDER SERIALIZER (For checkout)
 # ============================================================================
 
 class CreateOrderSerializer(serializers.Serializer):
     """Serializer for creating orders from cart"""
+    # Product availability, order limits, stock and address ownership are
+    # checked by the view against the locked/owned rows, not here
     product_id = serializers.UUIDField()
-    quantity = serializers.DecimalField(max_digits=10, decimal_places=3)
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=3, min_value=Decimal('0.001'))
     delivery_address_id = serializers.UUIDField()
     payment_method = serializers.CharField(max_length=50)
     coupon_code = serializers.CharField(max_length=50, required=False, allow_blank=True)
     buyer_notes = serializers.CharField(required=False, allow_blank=True)
-    
-    def validate_product_id(self, value):
-        try:
-            product = CropProduct.objects.get(id=value, listing_status='active', is_deleted=False)
-            return value
-        except CropProduct.DoesNotExist:
-            raise serializers.ValidationError("Product not found or not available")
-    
-    def validate_delivery_address_id(self, value):
-        try:
-            address = DeliveryAddress.objects.get(id=value, is_active=True)
-            return value
-        except DeliveryAddress.DoesNotExist:
-            raise serializers.ValidationError("Delivery address not found")
-    
-    def validate(self, data):
-        product = CropProduct.objects.get(id=data['product_id'])
-        if data['quantity'] > product.quantity_available:
-            raise serializers.ValidationError("Requested quantity not available")
-        if data['quantity'] < product.min_order_quantity:
-            raise serializers.ValidationError(f"Minimum order quantity is {product.min_order_quantity}")
-        return data
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """Serializer for moving an order to another status"""
+    status = serializers.ChoiceField(choices=OrderStatus.choices)
+    reason = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class BulkOrderTransitionSerializer(OrderTransitionSerializer):
+    """Serializer for moving up to 500 orders to the same status"""
+    order_ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=500)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """Serializer for checking out the whole cart"""
+    delivery_address_id = serializers.UUIDField()
+    payment_method = serializers.CharField(max_length=50)
+    buyer_notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class QuoteItemSerializer(serializers.Serializer):
+    product_id = serializers.UUIDField()
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=3, min_value=Decimal('0.001'))
+
+
+class QuoteSerializer(serializers.Serializer):
+    """Serializer for pricing many products at once"""
+    items = QuoteItemSerializer(many=True, allow_empty=False, max_length=500)
+
+
+class DailyMetricsSerializer(serializers.ModelSerializer):
+    """Daily marketplace metrics"""
+
+    class Meta:
+        model = DailyMetrics
+        exclude = ['id', 'created_at']
@@ -0,0 +1,121 @@
+"""
+Signal handlers that keep the product search index, the cached catalog
+responses, the cached coupon rules and the denormalized ratings in sync, and
+that merge a visitor's session cart when they log in
+"""
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .cache import CATALOG_PRODUCT_FIELDS, invalidate_catalog
+from .carts import cart_session_id, merge_session_cart
+from .coupons import invalidate_coupons
+from .models import Coupon, CropCategory, CropProduct, FarmerProfile, FarmerRating, Order, ProductReview
+from .ratings import record_change
+from .search import INDEXED_FIELDS, index_products, remove_products
+
+
+@receiver(post_save, sender=CropProduct)
+def index_product_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Reindex on save; soft-deleted products are dropped from the index"""
+    if raw:
+        return
+    # Counter updates such as views_count do not touch the indexed text
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    index_products([instance])
+
+
+@receiver(post_delete, sender=CropProduct)
+def remove_product_on_delete(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+@receiver(pre_save, sender=CropCategory)
+@receiver(pre_save, sender=FarmerProfile)
+def remember_indexed_name(sender, instance, raw=False, **kwargs):
+    """Load the stored name so post_save only reindexes products on a rename"""
+    instance._search_previous_name = None
+    if raw or instance._state.adding:
+        return
+    field = 'farm_name' if sender is FarmerProfile else 'name'
+    instance._search_previous_name = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=CropCategory)
+@receiver(post_save, sender=FarmerProfile)
+def reindex_products_on_rename(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_search_previous_name', None)
+    current = instance.farm_name if sender is FarmerProfile else instance.name
+    if raw or previous is None or previous == current:
+        return
+    index_products(instance.products.filter(is_deleted=False).select_related('category', 'farmer'))
+
+
+@receiver(post_save, sender=CropProduct)
+@receiver(post_delete, sender=CropProduct)
+def invalidate_catalog_on_product_change(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not CATALOG_PRODUCT_FIELDS.intersection(update_fields):
+        return
+    # After commit, so a request racing the save cannot cache the old rows
+    # under the new version
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=CropCategory)
+@receiver(post_delete, sender=CropCategory)
+def invalidate_catalog_on_category_change(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+@receiver(post_save, sender=CropCategory)
+@receiver(post_delete, sender=CropCategory)
+def invalidate_coupons_on_change(sender, instance, **kwargs):
+    """Cached coupon rules hold the coupon's fields and category subtrees"""
+    transaction.on_commit(invalidate_coupons)
+
+
+@receiver(pre_save, sender=ProductReview)
+@receiver(pre_save, sender=FarmerRating)
+@receiver(pre_save, sender=Order)
+@receiver(pre_delete, sender=ProductReview)
+@receiver(pre_delete, sender=FarmerRating)
+@receiver(pre_delete, sender=Order)
+def remember_rating_source(sender, instance, raw=False, **kwargs):
+    """Load the stored row; the instance may be stale after a queryset.update()"""
+    instance._ratings_previous = None
+    if raw or instance._state.adding:
+        return
+    stored = sender.objects.filter(pk=instance.pk)
+    if transaction.get_connection().in_atomic_block:
+        # Holds the row so a concurrent save cannot apply the same change twice
+        stored = stored.select_for_update()
+    instance._ratings_previous = stored.first()
+
+
+@receiver(post_save, sender=ProductReview)
+@receiver(post_save, sender=FarmerRating)
+@receiver(post_save, sender=Order)
+def update_ratings_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    record_change(getattr(instance, '_ratings_previous', None), instance)
+
+
+@receiver(post_delete, sender=ProductReview)
+@receiver(post_delete, sender=FarmerRating)
+@receiver(post_delete, sender=Order)
+def update_ratings_on_delete(sender, instance, **kwargs):
+    previous = getattr(instance, '_ratings_previous', None)
+    if previous is not None:
+        record_change(previous, None)
+
+
+@receiver(user_logged_in)
+def merge_session_cart_on_login(sender, request, user, **kwargs):
+    buyer = getattr(user, 'buyer_profile', None)
+    if buyer is not None and request is not None:
+        merge_session_cart(buyer, cart_session_id(request))
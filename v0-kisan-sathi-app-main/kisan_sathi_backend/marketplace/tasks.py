@@ -0,0 +1,61 @@
+"""
+Celery tasks for Marketplace
+"""
+from datetime import timedelta
+
+from celery import shared_task
+from django.utils import timezone
+
+from .carts import sweep_expired_carts
+from .counters import flush_counters
+from .metrics import rollup_daily_metrics
+from .models import CropProduct
+from .notifications import broadcast_new_listing, deliver_due_notifications, purge_expired_notifications
+from .trending import update_trending_scores
+
+
+@shared_task
+def refresh_trending_scores():
+    """Score engagement since the last run and refresh is_trending"""
+    flush_counters()
+    return update_trending_scores()
+
+
+@shared_task
+def flush_product_counters():
+    """Write buffered view, cart add and wishlist counts"""
+    return flush_counters()
+
+
+@shared_task
+def rollup_recent_metrics():
+    """Roll up DailyMetrics for yesterday (now complete) and today so far"""
+    today = timezone.localdate()
+    return rollup_daily_metrics(today - timedelta(days=1), today)
+
+
+@shared_task
+def deliver_notifications():
+    """Send due notifications on their channels"""
+    return deliver_due_notifications()
+
+
+@shared_task
+def purge_notifications():
+    """Delete expired notifications"""
+    return purge_expired_notifications()
+
+
+@shared_task
+def sweep_carts():
+    """Delete expired cart lines"""
+    return sweep_expired_carts()
+
+
+@shared_task
+def notify_new_listing(product_id):
+    """Notify the buyers in a new listing's district"""
+    product = CropProduct.objects.select_related('farmer').filter(pk=product_id).first()
+    if product is None:
+        return 0
+    return broadcast_new_listing(product)
@@ -1,3 +1,1400 @@
-from django.test import TestCase
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from .carts import sweep_expired_carts
+from .coupons import CouponError, check_buyer, coupon_rules
+from .counters import MemoryCounterBuffer, flush_counters, increment
+from .geo import encode, haversine_km
+from .metrics import ROLLUP_FIELDS, backfill_daily_metrics, rollup_daily_metrics
+from .models import (
+    BuyerProfile, CartItem, Coupon, CouponUsage, CouponUserType, CropCategory, CropProduct, DailyMetrics, DeliveryAddress, DiscountType, FarmerProfile, FarmerRating,
+    ListingStatus, Notification, NotificationChannel, NotificationPriority, NotificationType, Order, OrderStatus, OrderStatusHistory,
+    ProductReview
+)
+from . import notifications
+from .pricing import PriceSchedule, price_cart, price_schedule
+from .orders import OUT_OF_STOCK, CheckoutError, checkout_cart, place_order
+from .ratings import approve_reviews, reconcile_ratings
+from .search import search_product_ids
+from .trending import decayed_score, pending_products, update_trending_scores
+
+
+class MarketplaceFixtures:
+    """Builders for the users, profiles and products the marketplace tests share"""
+
+    @classmethod
+    def make_user(cls, name, phone, **fields):
+        return get_user_model().objects.create_user(
+            phone=phone, email=f'{name}@example.com', password='test-pass',
+            username=name, first_name=name.title(), **fields
+        )
+
+    @classmethod
+    def make_farmer(cls, name, phone):
+        return FarmerProfile.objects.create(
+            user=cls.make_user(name, phone), farm_name=f'{name.title()} Farm', farm_size_acres=Decimal('2'),
+            address='Village road', district='Nashik', state='Maharashtra', pincode='422001'
+        )
+
+    @classmethod
+    def make_buyer(cls, name, phone):
+        """A buyer profile and its delivery address"""
+        buyer = BuyerProfile.objects.create(
+            user=cls.make_user(name, phone), business_type='individual', default_address='Market road',
+            city='Pune', state='Maharashtra', pincode='411001'
+        )
+        address = DeliveryAddress.objects.create(
+            buyer=buyer, contact_name=name.title(), contact_phone='9999999999',
+            address_line1='Market road', city='Pune', state='Maharashtra', pincode='411001'
+        )
+        return buyer, address
+
+    @classmethod
+    def make_product(cls, farmer, category, name, stock='100', price='20', **fields):
+        return CropProduct.objects.create(
+            farmer=farmer, category=category, name=name, slug=name.lower().replace(' ', '-'),
+            quantity_available=Decimal(stock), unit='kg', price_per_unit=Decimal(price),
+            listing_status='active', **fields
+        )
+
+    @staticmethod
+    def add_to_cart(buyer, product, quantity):
+        return CartItem.objects.create(
+            buyer=buyer, product=product, quantity=Decimal(quantity), unit_price=product.price_per_unit,
+            expires_at=timezone.now() + timedelta(days=7)
+        )
+
+
+class CheckoutTests(MarketplaceFixtures, APITestCase):
+    url = '/api/marketplace/cart/checkout/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = cls.make_farmer('grower', '+919876510001')
+        cls.buyer, cls.address = cls.make_buyer('shopper', '+919876510002')
+        cls.category = CropCategory.objects.create(name='Grains', slug='grains')
+
+    def setUp(self):
+        self.client.force_authenticate(self.buyer.user)
+        self.wheat = self.make_product(self.farmer, self.category, 'Wheat', stock='10')
+        self.rice = self.make_product(self.farmer, self.category, 'Rice', stock='5')
+
+    def checkout(self):
+        return self.client.post(self.url, {
+            'delivery_address_id': str(self.address.id), 'payment_method': 'cod'
+        }, format='json')
+
+    def test_one_order_per_line_and_cart_emptied(self):
+        self.add_to_cart(self.buyer, self.wheat, '4')
+        self.add_to_cart(self.buyer, self.rice, '5')
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['orders']), 2)
+        self.assertEqual(response.data['total_amount'], float(sum(o.total_amount for o in Order.objects.all())))
+
+        self.wheat.refresh_from_db()
+        self.rice.refresh_from_db()
+        self.assertEqual((self.wheat.quantity_available, self.wheat.sales_count), (Decimal('6'), 1))
+        self.assertEqual((self.rice.quantity_available, self.rice.sales_count), (Decimal('0'), 1))
+        self.assertEqual(
+            sorted(Order.objects.values_list('product__name', 'quantity_ordered')),
+            [('Rice', Decimal('5')), ('Wheat', Decimal('4'))]
+        )
+        self.assertEqual(OrderStatusHistory.objects.filter(to_status='pending').count(), 2)
+        self.assertFalse(CartItem.objects.filter(buyer=self.buyer).exists())
+
+    def test_lines_that_cannot_be_ordered_place_nothing(self):
+        self.add_to_cart(self.buyer, self.wheat, '4')
+        too_many = self.add_to_cart(self.buyer, self.rice, '6')
+        hidden = self.make_product(self.farmer, self.category, 'Maize')
+        gone = self.add_to_cart(self.buyer, hidden, '1')
+        hidden.listing_status = 'inactive'
+        hidden.save()
+
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Some cart items cannot be ordered')
+        self.assertEqual(
+            sorted((item['cart_item_id'], item['error']) for item in response.data['items']),
+            sorted([(str(too_many.pk), 'Requested quantity not available'),
+                    (str(gone.pk), 'Product not found or not available')])
+        )
+        self.assertFalse(Order.objects.exists())
+        self.wheat.refresh_from_db()
+        self.assertEqual(self.wheat.quantity_available, Decimal('10'))
+        self.assertEqual(CartItem.objects.filter(buyer=self.buyer).count(), 3)
+
+    def test_empty_or_expired_cart(self):
+        self.assertEqual(self.checkout().data['error'], 'Cart is empty')
+        line = self.add_to_cart(self.buyer, self.wheat, '1')
+        CartItem.objects.filter(pk=line.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        response = self.checkout()
+        self.assertEqual((response.status_code, response.data['error']), (400, 'Cart is empty'))
+
+    def test_stale_carts_cannot_oversell(self):
+        other, other_address = self.make_buyer('rival', '+919876510003')
+        self.add_to_cart(self.buyer, self.wheat, '6')
+        self.add_to_cart(other, self.wheat, '6')
+        self.assertEqual(len(checkout_cart(other, other_address, 'cod')), 1)
+
+        # The first buyer's cart still holds 6 kg of the 4 kg left
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'][0]['error'], 'Requested quantity not available')
+        self.wheat.refresh_from_db()
+        self.assertEqual(self.wheat.quantity_available, Decimal('4'))
+
+
+class CheckoutConcurrencyTests(MarketplaceFixtures, TransactionTestCase):
+    BUYERS = 8
+
+    def test_concurrent_checkouts_cannot_oversell(self):
+        farmer = self.make_farmer('grower', '+919876511000')
+        category = CropCategory.objects.create(name='Pulses', slug='pulses')
+        dal = self.make_product(farmer, category, 'Toor Dal', stock='5')
+        buyers = [self.make_buyer(f'buyer{i}', f'+91987651{1001 + i:04d}') for i in range(self.BUYERS)]
+        for buyer, _ in buyers:
+            self.add_to_cart(buyer, dal, '1')
+
+        placed, out_of_stock = [], []
+        start = threading.Barrier(self.BUYERS)
+
+        def checkout(buyer, address):
+            try:
+                start.wait()
+                placed.extend(checkout_cart(buyer, address, 'cod'))
+            except CheckoutError as exc:
+                out_of_stock.extend(item['error'] == OUT_OF_STOCK for item in exc.items)
+            except OperationalError:
+                # SQLite's table locks can outlast the retries; the buyer simply did not order
+                pass
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=checkout, args=pair) for pair in buyers]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        dal.refresh_from_db()
+        self.assertLessEqual(len(placed), 5)
+        self.assertTrue(all(out_of_stock))
+        self.assertEqual(dal.quantity_available, Decimal('5') - len(placed))
+        self.assertEqual(Order.objects.filter(product=dal).count(), len(placed))
+        # Buyers who did not get an order keep their cart; the others' carts are emptied
+        self.assertEqual(CartItem.objects.filter(product=dal).count(), self.BUYERS - len(placed))
+
+
+class CartSessionTests(MarketplaceFixtures, APITestCase):
+    """Anonymous carts kept under the X-Cart-Session header, merged on login"""
+    url = '/api/marketplace/cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        farmer = cls.make_farmer('grower', '+919876517001')
+        cls.buyer, cls.address = cls.make_buyer('shopper', '+919876517002')
+        category = CropCategory.objects.create(name='Grains', slug='grains')
+        cls.wheat = cls.make_product(farmer, category, 'Wheat', price='20')
+        cls.rice = cls.make_product(farmer, category, 'Rice', price='30')
+
+    def setUp(self):
+        # Cart adds bump product counters; keep them out of the shared buffer
+        self.buffer = MemoryCounterBuffer()
+        patcher = patch('marketplace.counters._buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_session_line(self, session_id, product, quantity, expires_in=timedelta(days=7)):
+        return CartItem.objects.create(
+            session_id=session_id, product=product, quantity=Decimal(quantity),
+            unit_price=product.price_per_unit, expires_at=timezone.now() + expires_in
+        )
+
+    def test_anonymous_cart_is_scoped_to_its_session(self):
+        response = self.client.post(self.url, {'product_id': str(self.wheat.pk), 'quantity': '2'},
+                                    HTTP_X_CART_SESSION='visitor-a')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data['buyer'])
+        self.assertEqual(response.data['session_id'], 'visitor-a')
+        self.assertEqual(Decimal(response.data['unit_price']), Decimal('20'))
+        self.assertEqual(self.buffer.drain(), {str(self.wheat.pk): {'cart_add_count': 1}})
+        wheat_line = response.data['id']
+        self.add_session_line('visitor-b', self.rice, '1')
+
+        response = self.client.get(self.url, HTTP_X_CART_SESSION='visitor-a')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line['id'] for line in response.data], [wheat_line])
+
+        # Another session can neither see nor delete the line
+        response = self.client.delete(f'{self.url}{wheat_line}/', HTTP_X_CART_SESSION='visitor-b')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.delete(f'{self.url}{wheat_line}/', HTTP_X_CART_SESSION='visitor-a')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(CartItem.objects.filter(pk=wheat_line).exists())
+
+        # Without a session id or a login there is no cart at all
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_checkout_still_requires_login(self):
+        self.add_session_line('visitor-a', self.wheat, '2')
+        response = self.client.post(f'{self.url}checkout/', {
+            'delivery_address_id': self.address.pk, 'payment_method': 'cod'
+        }, HTTP_X_CART_SESSION='visitor-a')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_login_merges_the_session_cart(self):
+        # The buyer's own wheat line keeps the price it was added at
+        self.add_to_cart(self.buyer, self.wheat, '1')
+        CartItem.objects.filter(buyer=self.buyer).update(unit_price=Decimal('18'))
+        self.add_session_line('visitor-a', self.wheat, '2')
+        self.add_session_line('visitor-a', self.wheat, '0.5')
+        self.add_session_line('visitor-a', self.rice, '3')
+        self.add_session_line('visitor-a', self.rice, '9', expires_in=-timedelta(minutes=1))
+        self.add_session_line('visitor-b', self.rice, '4')
+
+        response = self.client.post('/api/auth/login/', {
+            'phone': self.buyer.user.phone, 'password': 'test-pass'
+        }, HTTP_X_CART_SESSION='visitor-a')
+        self.assertEqual(response.status_code, 200)
+
+        lines = {
+            line.product_id: (line.quantity, line.unit_price)
+            for line in CartItem.objects.filter(buyer=self.buyer)
+        }
+        self.assertEqual(lines, {
+            self.wheat.pk: (Decimal('3.5'), Decimal('18')),
+            self.rice.pk: (Decimal('3'), Decimal('30')),
+        })
+        # The live session lines moved over; the expired one is left for the sweep
+        self.assertEqual(list(CartItem.objects.filter(session_id='visitor-a').values_list('quantity', flat=True)),
+                         [Decimal('9')])
+        self.assertEqual(CartItem.objects.filter(session_id='visitor-b').count(), 1)
+
+    def test_sweep_deletes_expired_lines_in_chunks(self):
+        for _ in range(5):
+            self.add_session_line('visitor-a', self.wheat, '1', expires_in=-timedelta(minutes=1))
+        live = [self.add_session_line('visitor-b', self.rice, '1'), self.add_to_cart(self.buyer, self.rice, '1')]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sweep_expired_carts(chunk_size=2), 5)
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(set(CartItem.objects.values_list('pk', flat=True)), {line.pk for line in live})
+        self.assertEqual(sweep_expired_carts(chunk_size=2), 0)
+
+
+class CounterFlushTests(MarketplaceFixtures, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        farmer = cls.make_farmer('grower', '+919876512001')
+        category = CropCategory.objects.create(name='Fruits', slug='fruits')
+        cls.mango = cls.make_product(farmer, category, 'Mango', wishlist_count=1)
+        cls.guava = cls.make_product(farmer, category, 'Guava', views_count=40)
+
+    def setUp(self):
+        # A buffer of our own, so nothing left over from other tests is flushed
+        self.buffer = MemoryCounterBuffer()
+        patcher = patch('marketplace.counters._buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def counters(self, product):
+        product.refresh_from_db()
+        return product.views_count, product.cart_add_count, product.wishlist_count
+
+    def test_flush_applies_buffered_deltas(self):
+        for _ in range(3):
+            increment(self.mango.pk, 'views_count')
+        increment(self.mango.pk, 'cart_add_count', 2)
+        increment(self.guava.pk, 'views_count')
+        self.assertEqual(self.counters(self.mango), (0, 0, 1))
+
+        self.assertEqual(flush_counters(), 2)
+        self.assertEqual(self.counters(self.mango), (3, 2, 1))
+        self.assertEqual(self.counters(self.guava), (41, 0, 0))
+        self.assertEqual(self.buffer.drain(), {})
+        self.assertEqual(flush_counters(), 0)
+
+    def test_wishlist_removals_stop_at_zero(self):
+        for _ in range(3):
+            increment(self.mango.pk, 'wishlist_count', -1)
+        flush_counters()
+        self.assertEqual(self.counters(self.mango), (0, 0, 0))
+
+    def test_failed_write_keeps_the_deltas_buffered(self):
+        increment(self.mango.pk, 'views_count', 5)
+        with patch('marketplace.counters.write_deltas', side_effect=RuntimeError('database gone')):
+            with self.assertRaises(RuntimeError):
+                flush_counters()
+        self.assertEqual(self.counters(self.mango), (0, 0, 1))
+
+        increment(self.mango.pk, 'views_count')
+        self.assertEqual(flush_counters(), 1)
+        self.assertEqual(self.counters(self.mango), (6, 0, 1))
+
+    def test_only_counter_fields_are_buffered(self):
+        with self.assertRaises(ValueError):
+            increment(self.mango.pk, 'sales_count')
+
+
+class RatingTotalsTests(MarketplaceFixtures, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = cls.make_farmer('grower', '+919876513001')
+        cls.buyer, cls.address = cls.make_buyer('shopper', '+919876513002')
+        cls.other, _ = cls.make_buyer('rival', '+919876513003')
+        cls.onion = cls.make_product(cls.farmer, CropCategory.objects.create(name='Bulbs', slug='bulbs'), 'Onion')
+
+    def rating(self, obj):
+        obj.refresh_from_db()
+        return obj.rating_total, obj.review_count, obj.rating
+
+    def assertReconciled(self):
+        self.assertEqual(reconcile_ratings(dry_run=True), {'products': 0, 'farmers': 0})
+
+    def test_only_approved_reviews_count(self):
+        review = ProductReview.objects.create(product=self.onion, buyer=self.buyer, rating=4)
+        self.assertEqual(self.rating(self.onion), (0, 0, Decimal('0')))
+
+        review.is_approved = True
+        review.save()
+        ProductReview.objects.create(product=self.onion, buyer=self.other, rating=5, is_approved=True)
+        self.assertEqual(self.rating(self.onion), (9, 2, Decimal('4.5')))
+
+        review.rating = 1
+        review.save()
+        self.assertEqual(self.rating(self.onion), (6, 2, Decimal('3')))
+        review.delete()
+        self.assertEqual(self.rating(self.onion), (5, 1, Decimal('5')))
+        self.assertReconciled()
+
+    def test_bulk_approval(self):
+        for buyer, stars in ((self.buyer, 4), (self.other, 5), (self.other, 5)):
+            ProductReview.objects.create(product=self.onion, buyer=buyer, rating=stars)
+        self.assertEqual(approve_reviews(ProductReview.objects.all()), 3)
+        # 14 / 3 rounds half up to 4.67
+        self.assertEqual(self.rating(self.onion), (14, 3, Decimal('4.67')))
+        self.assertEqual(approve_reviews(ProductReview.objects.all()), 0)
+        self.assertReconciled()
+
+    def test_farmer_ratings(self):
+        first = FarmerRating.objects.create(farmer=self.farmer, buyer=self.buyer, rating=2)
+        FarmerRating.objects.create(farmer=self.farmer, buyer=self.other, rating=5)
+        self.assertEqual(self.rating(self.farmer), (7, 2, Decimal('3.5')))
+        first.delete()
+        self.assertEqual(self.rating(self.farmer), (5, 1, Decimal('5')))
+        self.assertReconciled()
+
+    def test_only_delivered_orders_count_as_sales(self):
+        order = place_order(self.buyer, self.onion.pk, Decimal('3'), self.address, 'cod')
+        self.farmer.refresh_from_db()
+        self.assertEqual((self.farmer.total_sales, self.farmer.total_orders), (Decimal('0'), 0))
+
+        order.order_status = OrderStatus.DELIVERED
+        order.save()
+        self.farmer.refresh_from_db()
+        self.assertEqual((self.farmer.total_sales, self.farmer.total_orders), (order.total_amount, 1))
+        self.assertReconciled()
+
+        order.order_status = OrderStatus.RETURNED
+        order.save()
+        self.farmer.refresh_from_db()
+        self.assertEqual((self.farmer.total_sales, self.farmer.total_orders), (Decimal('0'), 0))
+        self.assertReconciled()
+
+
+class CouponRedemptionTests(MarketplaceFixtures, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = cls.make_farmer('grower', '+919876514001')
+        cls.buyer, cls.address = cls.make_buyer('shopper', '+919876514002')
+        cls.other, cls.other_address = cls.make_buyer('rival', '+919876514003')
+        cls.vegetables = CropCategory.objects.create(name='Vegetables', slug='vegetables')
+        cls.leafy = CropCategory.objects.create(name='Leafy', slug='leafy', parent=cls.vegetables)
+        cls.grains = CropCategory.objects.create(name='Grains', slug='grains')
+
+    def setUp(self):
+        # Rules cached by another test's coupon of the same code must not leak in
+        cache.clear()
+        self.spinach = self.make_product(self.farmer, self.leafy, 'Spinach', stock='50')
+        self.wheat = self.make_product(self.farmer, self.grains, 'Wheat', stock='50')
+
+    def make_coupon(self, **fields):
+        now = timezone.now()
+        return Coupon.objects.create(**{
+            'code': 'FRESH10', 'discount_type': DiscountType.PERCENTAGE, 'discount_value': Decimal('10'),
+            'max_uses_per_user': 5, 'valid_from': now - timedelta(days=1), 'valid_until': now + timedelta(days=1),
+            **fields,
+        })
+
+    def order(self, product, buyer=None, code='FRESH10'):
+        buyer, address = (buyer, self.other_address) if buyer else (self.buyer, self.address)
+        return place_order(buyer, product.pk, Decimal('5'), address, 'cod', coupon_code=code)
+
+    def assertRolledBack(self, coupon, orders, stock):
+        coupon.refresh_from_db()
+        self.spinach.refresh_from_db()
+        self.assertEqual(coupon.times_used, orders)
+        self.assertEqual(CouponUsage.objects.filter(coupon=coupon).count(), orders)
+        self.assertEqual(Order.objects.count(), orders)
+        self.assertEqual(self.spinach.quantity_available, Decimal(stock))
+
+    def test_discount_and_usage_recorded(self):
+        coupon = self.make_coupon()
+        order = self.order(self.spinach)
+        self.assertEqual((order.coupon_code, order.discount_amount), ('FRESH10', Decimal('10.00')))
+        self.assertEqual(order.total_amount,
+                         order.subtotal + order.tax_amount + order.delivery_charges - Decimal('10.00'))
+        usage = CouponUsage.objects.get(coupon=coupon)
+        self.assertEqual((usage.order_id, usage.user_id, usage.discount_applied),
+                         (order.pk, self.buyer.user_id, Decimal('10.00')))
+        self.assertRolledBack(coupon, 1, '45')
+
+    def test_total_usage_limit(self):
+        coupon = self.make_coupon(total_usage_limit=2)
+        self.order(self.spinach)
+        self.order(self.spinach, buyer=self.other)
+        with self.assertRaisesMessage(CouponError, 'This coupon has reached its usage limit'):
+            self.order(self.spinach)
+        # The failed order's stock reservation is rolled back with it
+        self.assertRolledBack(coupon, 2, '40')
+
+    def test_uses_per_user(self):
+        coupon = self.make_coupon(max_uses_per_user=1)
+        self.order(self.spinach)
+        with self.assertRaisesMessage(CouponError, 'You have already used this coupon'):
+            self.order(self.spinach)
+        # The use claimed before the per-user check is given back too
+        self.assertRolledBack(coupon, 1, '45')
+        self.order(self.spinach, buyer=self.other)
+        self.assertRolledBack(coupon, 2, '40')
+
+    def test_categories_include_their_subtrees(self):
+        for listed in ([str(self.vegetables.pk)], ['vegetables']):
+            with self.subTest(applicable_categories=listed):
+                cache.clear()
+                Coupon.objects.all().delete()
+                coupon = self.make_coupon(applicable_categories=listed)
+                self.order(self.spinach)
+                with self.assertRaisesMessage(CouponError, 'Coupon FRESH10 does not apply to Wheat'):
+                    self.order(self.wheat)
+                self.wheat.refresh_from_db()
+                self.assertEqual(self.wheat.quantity_available, Decimal('50'))
+                self.assertEqual(CouponUsage.objects.filter(coupon=coupon).count(), 1)
+
+    def test_new_and_existing_users(self):
+        self.make_coupon(code='WELCOME', applicable_to=CouponUserType.NEW_USERS)
+        self.make_coupon(code='LOYAL', applicable_to=CouponUserType.EXISTING_USERS)
+        with self.assertRaisesMessage(CouponError, 'This coupon is not available for your account'):
+            check_buyer(coupon_rules('LOYAL'), self.buyer)
+        self.order(self.spinach, code='WELCOME')
+        with self.assertRaisesMessage(CouponError, 'This coupon is not available for your account'):
+            check_buyer(coupon_rules('WELCOME'), self.buyer)
+        check_buyer(coupon_rules('LOYAL'), self.buyer)
+
+    def test_saving_a_coupon_invalidates_its_rules(self):
+        coupon = self.make_coupon()
+        self.assertTrue(coupon_rules('FRESH10').is_active)
+        with self.captureOnCommitCallbacks(execute=True):
+            coupon.is_active = False
+            coupon.save()
+        with self.assertRaisesMessage(CouponError, 'Invalid coupon code'):
+            self.order(self.spinach)
+        self.assertRolledBack(coupon, 0, '50')
+
+    def test_saving_a_category_invalidates_subtrees(self):
+        self.make_coupon(applicable_categories=[str(self.vegetables.pk)])
+        self.assertNotIn(self.grains.pk, coupon_rules('FRESH10').categories)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grains.parent = self.vegetables
+            self.grains.save()
+        self.assertIn(self.grains.pk, coupon_rules('FRESH10').categories)
+        self.order(self.wheat)
+
+
+class OrderTransitionTests(MarketplaceFixtures, APITestCase):
+    url = '/api/marketplace/orders/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = cls.make_farmer('grower', '+919876515001')
+        cls.buyer, cls.address = cls.make_buyer('shopper', '+919876515002')
+        cls.staff = cls.make_user('moderator', '+919876515003', is_staff=True)
+        cls.category = CropCategory.objects.create(name='Spices', slug='spices')
+
+    def setUp(self):
+        cache.clear()
+        self.turmeric = self.make_product(self.farmer, self.category, 'Turmeric', stock='20')
+
+    def place(self, quantity='4', **kwargs):
+        return place_order(self.buyer, self.turmeric.pk, Decimal(quantity), self.address, 'cod', **kwargs)
+
+    def post(self, user, path, data=None):
+        self.client.force_authenticate(user)
+        return self.client.post(f'{self.url}{path}', data or {}, format='json')
+
+    def move(self, user, order, to_status, reason=''):
+        return self.post(user, f'{order.pk}/transition/', {'status': to_status, 'reason': reason})
+
+    def test_who_may_make_each_move(self):
+        cases = [
+            (OrderStatus.PENDING, OrderStatus.CONFIRMED, self.farmer.user, None),
+            (OrderStatus.PENDING, OrderStatus.CONFIRMED, self.buyer.user, 'You cannot mark this order Confirmed'),
+            (OrderStatus.CONFIRMED, OrderStatus.SHIPPED, self.buyer.user, 'You cannot mark this order Shipped'),
+            (OrderStatus.PACKED, OrderStatus.CANCELLED, self.buyer.user, 'You cannot mark this order Cancelled'),
+            (OrderStatus.SHIPPED, OrderStatus.DELIVERED, self.buyer.user, None),
+            (OrderStatus.DELIVERED, OrderStatus.REFUNDED, self.farmer.user, 'You cannot mark this order Refunded'),
+            (OrderStatus.DELIVERED, OrderStatus.REFUNDED, self.staff, None),
+            (OrderStatus.PENDING, OrderStatus.DELIVERED, self.staff, 'Cannot move a Pending order to Delivered'),
+            (OrderStatus.CANCELLED, OrderStatus.CONFIRMED, self.farmer.user, 'Cannot move a Cancelled order to Confirmed'),
+        ]
+        for from_status, to_status, user, error in cases:
+            with self.subTest(from_status=from_status, to_status=to_status, user=user.username):
+                order = self.place('1')
+                Order.objects.filter(pk=order.pk).update(order_status=from_status)
+                response = self.move(user, order, to_status)
+                order.refresh_from_db()
+                if error:
+                    self.assertEqual((response.status_code, response.data['error']), (400, error))
+                    self.assertEqual(order.order_status, from_status)
+                else:
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(order.order_status, to_status)
+
+    def test_history_records_the_status_left(self):
+        order = self.place()
+        self.assertEqual(self.post(self.farmer.user, f'{order.pk}/confirm/').status_code, 200)
+        response = self.post(self.buyer.user, f'{order.pk}/cancel/', {'reason': 'Found it cheaper'})
+        self.assertEqual(response.status_code, 200)
+
+        order.refresh_from_db()
+        self.assertEqual((order.order_status, order.cancelled_by, order.cancellation_reason),
+                         (OrderStatus.CANCELLED, self.buyer.user, 'Found it cheaper'))
+        self.assertIsNotNone(order.confirmed_at)
+        self.assertEqual(
+            list(order.status_history.order_by('created_at').values_list('from_status', 'to_status', 'notes')),
+            [('', OrderStatus.PENDING, 'Order created'),
+             (OrderStatus.PENDING, OrderStatus.CONFIRMED, 'Order confirmed by farmer'),
+             (OrderStatus.CONFIRMED, OrderStatus.CANCELLED, 'Order cancelled by buyer')]
+        )
+
+    def test_cancelling_gives_back_stock_and_coupon_use(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='SPICE5', discount_type=DiscountType.FIXED_AMOUNT, discount_value=Decimal('5'),
+            valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1),
+        )
+        order = self.place(coupon_code='SPICE5')
+        self.assertEqual(self.post(self.buyer.user, f'{order.pk}/cancel/').status_code, 200)
+
+        self.turmeric.refresh_from_db()
+        coupon.refresh_from_db()
+        self.assertEqual((self.turmeric.quantity_available, self.turmeric.sales_count), (Decimal('20'), 0))
+        self.assertEqual(coupon.times_used, 0)
+        self.assertFalse(CouponUsage.objects.exists())
+        # The use was given back, so the buyer may redeem the coupon again
+        self.place(coupon_code='SPICE5')
+
+    def test_delivery_and_return_update_farmer_sales(self):
+        order = self.place()
+        Order.objects.filter(pk=order.pk).update(order_status=OrderStatus.SHIPPED)
+        self.assertEqual(self.move(self.buyer.user, order, OrderStatus.DELIVERED).status_code, 200)
+        self.farmer.refresh_from_db()
+        self.assertEqual((self.farmer.total_sales, self.farmer.total_orders), (order.total_amount, 1))
+
+        response = self.move(self.farmer.user, order, OrderStatus.RETURNED, reason='Damaged')
+        self.assertEqual(response.data['return_reason'], 'Damaged')
+        self.farmer.refresh_from_db()
+        self.assertEqual((self.farmer.total_sales, self.farmer.total_orders), (Decimal('0'), 0))
+        self.assertEqual(reconcile_ratings(dry_run=True), {'products': 0, 'farmers': 0})
+
+    def test_bulk_transition_skips_what_cannot_move(self):
+        pending = [self.place('1') for _ in range(3)]
+        shipped = self.place('1')
+        Order.objects.filter(pk=shipped.pk).update(order_status=OrderStatus.SHIPPED)
+        other_farmer = self.make_farmer('neighbour', '+919876515004')
+        elsewhere = place_order(
+            self.buyer, self.make_product(other_farmer, self.category, 'Cumin').pk, Decimal('1'), self.address, 'cod'
+        )
+        missing = uuid.uuid4()
+
+        order_ids = [str(order.pk) for order in pending + [shipped, elsewhere]] + [str(missing)]
+        response = self.post(self.farmer.user, 'bulk_transition/', {
+            'order_ids': order_ids, 'status': OrderStatus.CANCELLED, 'reason': 'Crop failed'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(sorted(response.data['order_ids']), sorted(str(order.pk) for order in pending))
+        self.assertEqual(
+            sorted((item['order_id'], item['error']) for item in response.data['skipped']),
+            sorted([(str(shipped.pk), 'Cannot move a Shipped order to Cancelled'),
+                    (str(elsewhere.pk), 'Order not found'),
+                    (str(missing), 'Order not found')])
+        )
+
+        self.turmeric.refresh_from_db()
+        self.assertEqual((self.turmeric.quantity_available, self.turmeric.sales_count), (Decimal('19'), 1))
+        self.assertEqual(
+            set(OrderStatusHistory.objects.filter(to_status=OrderStatus.CANCELLED)
+                .values_list('order_id', 'from_status', 'change_reason')),
+            {(order.pk, OrderStatus.PENDING, 'Crop failed') for order in pending}
+        )
+        elsewhere.refresh_from_db()
+        self.assertEqual(elsewhere.order_status, OrderStatus.PENDING)
+
+
+class RecordingSMSBackend:
+    def __init__(self):
+        # The test case's own transaction; sending must not add one
+        self.depth = len(connection.atomic_blocks)
+        self.messages = []
+
+    def send_messages(self, messages):
+        assert len(connection.atomic_blocks) == self.depth, 'SMS sent while the batch was locked'
+        self.messages.extend(messages)
+        return len(messages)
+
+
+class NotificationDeliveryTests(MarketplaceFixtures, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = cls.make_farmer('grower', '+919876516001')
+        cls.buyers = [cls.make_buyer(f'buyer{i}', f'+91987651{6002 + i:04d}')[0] for i in range(5)]
+        for buyer in cls.buyers[:4]:
+            buyer.user.district = 'Nashik'
+            buyer.user.save()
+
+    def setUp(self):
+        self.sms = RecordingSMSBackend()
+        patcher = patch('marketplace.notifications._sms_backend', self.sms)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def notify(self, user, **fields):
+        return notifications.notify(user, NotificationType.SYSTEM_ALERT, 'Heads up', 'Rain tomorrow', **fields)
+
+    def test_broadcast_fans_out_in_batches(self):
+        users = get_user_model().objects.filter(pk__in=[buyer.user_id for buyer in self.buyers])
+        with CaptureQueriesContext(connection) as queries:
+            created = notifications.broadcast(users, NotificationType.SYSTEM_ALERT, 'Mandi closed', 'Holiday',
+                                              batch_size=2, priority=NotificationPriority.LOW)
+        self.assertEqual(created, 5)
+        self.assertEqual(sum('INSERT' in query['sql'] for query in queries.captured_queries), 3)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user_id', flat=True)),
+            sorted(buyer.user_id for buyer in self.buyers)
+        )
+
+    def test_new_listings_reach_buyers_in_the_district(self):
+        category = CropCategory.objects.create(name='Greens', slug='greens')
+        product = self.make_product(self.farmer, category, 'Methi')
+        self.assertEqual(notifications.broadcast_new_listing(product), 4)
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)),
+            {buyer.user_id for buyer in self.buyers[:4]}
+        )
+        self.assertTrue(Notification.objects.filter(expires_at__isnull=False, related_product=product).exists())
+
+    def test_delivery_sends_each_channel_once(self):
+        low = self.notify(self.buyers[0].user, priority=NotificationPriority.LOW)
+        high = self.notify(self.buyers[1].user, priority=NotificationPriority.HIGH)
+        email_only = self.notify(self.buyers[2].user, channels=[NotificationChannel.EMAIL])
+        # Already sent by email before; only in_app is left
+        resumed = self.notify(self.buyers[3].user, priority=NotificationPriority.MEDIUM,
+                              channels_sent=[NotificationChannel.EMAIL])
+
+        sent = notifications.deliver_due_notifications(batch_size=2)
+        self.assertEqual(sent, {'in_app': 3, 'email': 2, 'sms': 1})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         sorted([self.buyers[1].user.email, self.buyers[2].user.email]))
+        self.assertEqual(self.sms.messages, [(str(self.buyers[1].user.phone), 'Heads up: Rain tomorrow')])
+
+        expected = {
+            low.pk: ['in_app'], high.pk: ['in_app', 'email', 'sms'], email_only.pk: ['email'],
+            resumed.pk: ['email', 'in_app'],
+        }
+        for notification in Notification.objects.all():
+            self.assertIsNotNone(notification.sent_at)
+            self.assertEqual(sorted(notification.channels_sent), sorted(expected[notification.pk]))
+        self.assertEqual(notifications.deliver_due_notifications(), {})
+
+    def test_expired_and_future_notifications_are_not_sent(self):
+        now = timezone.now()
+        expired = self.notify(self.buyers[0].user, expires_at=now - timedelta(minutes=1))
+        later = self.notify(self.buyers[1].user, scheduled_for=now + timedelta(hours=1))
+        self.assertEqual(notifications.deliver_due_notifications(now=now), {})
+        self.assertFalse(mail.outbox)
+        self.assertEqual(
+            list(Notification.objects.filter(pk__in=[expired.pk, later.pk]).values_list('sent_at', flat=True)),
+            [None, None]
+        )
+        self.assertEqual(notifications.deliver_due_notifications(now=now + timedelta(hours=2))['email'], 1)
+
+    def test_failed_channel_is_not_recorded(self):
+        notification = self.notify(self.buyers[0].user, priority=NotificationPriority.HIGH)
+        with patch.object(self.sms, 'send_messages', side_effect=ConnectionError('gateway down')):
+            sent = notifications.deliver_due_notifications()
+        self.assertEqual(sent, {'in_app': 1, 'email': 1})
+        notification.refresh_from_db()
+        self.assertEqual(sorted(notification.channels_sent), ['email', 'in_app'])
+
+    def test_purge_deletes_expired_in_chunks(self):
+        now = timezone.now()
+        for buyer in self.buyers:
+            self.notify(buyer.user, expires_at=now - timedelta(days=1))
+        keep = self.notify(self.buyers[0].user, expires_at=now + timedelta(days=1))
+        forever = self.notify(self.buyers[1].user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(notifications.purge_expired_notifications(now=now, chunk_size=2), 5)
+        self.assertEqual(sum(query['sql'].startswith('DELETE') for query in queries.captured_queries), 3)
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {keep.pk, forever.pk})
+
+
+class ProductSearchTests(MarketplaceFixtures, APITestCase):
+    url = '/api/marketplace/products/search/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = cls.make_farmer('grower', '+919876518001')
+        cls.vegetables = CropCategory.objects.create(name='Vegetables', slug='vegetables')
+        cls.fruits = CropCategory.objects.create(name='Fruits', slug='fruits')
+        cls.tomato = cls.make_product(cls.farmer, cls.vegetables, 'Tomato', price='30',
+                                      translations={'hi': {'name': 'टमाटर'}})
+        cls.cherry = cls.make_product(cls.farmer, cls.fruits, 'Cherry Tomato', price='80')
+        cls.potato = cls.make_product(cls.farmer, cls.vegetables, 'Potato', price='20',
+                                      translations={'hi': {'name': 'आलू'}})
+
+    def search(self, q, **params):
+        response = self.client.get(self.url, {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return {product['id'] for product in response.data['results']}
+
+    def test_spellings_and_scripts_find_the_same_product(self):
+        for q in ('tamatar', 'tamaatar', 'टमाटर', 'Tomato'):
+            with self.subTest(q=q):
+                self.assertIn(str(self.tomato.pk), self.search(q))
+                self.assertNotIn(str(self.potato.pk), self.search(q))
+
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual(self.search('tom'), {str(self.tomato.pk), str(self.cherry.pk)})
+        self.assertEqual(self.search('cherry tom'), {str(self.cherry.pk)})
+        self.assertEqual(self.search('pota'), {str(self.potato.pk)})
+        self.assertEqual(self.search('tom', prefix='false'), set())
+
+    def test_list_filters_still_apply(self):
+        self.assertEqual(self.search('tomato', category=str(self.vegetables.pk)), {str(self.tomato.pk)})
+        self.assertEqual(self.search('tomato', max_price='50'), {str(self.tomato.pk)})
+
+        self.cherry.listing_status = ListingStatus.SOLDOUT
+        self.cherry.save()
+        self.assertEqual(self.search('tomato'), {str(self.tomato.pk)})
+
+    def test_soft_deleted_product_leaves_the_index(self):
+        self.potato.soft_delete()
+        self.assertEqual(search_product_ids('potato'), [])
+        self.assertEqual(self.search('potato'), set())
+
+    def test_index_follows_product_edits(self):
+        self.potato.name = 'Onion'
+        self.potato.save()
+        self.assertEqual(search_product_ids('onion'), [self.potato.pk])
+        self.assertEqual(search_product_ids('potato'), [])
+
+        # Counter-only saves leave the indexed text alone
+        with CaptureQueriesContext(connection) as queries:
+            self.tomato.save(update_fields=['views_count'])
+        self.assertFalse([query for query in queries if 'marketplace_product_search' in query['sql']])
+
+    def test_index_follows_category_and_farm_renames(self):
+        self.vegetables.name = 'Sabzi'
+        self.vegetables.save()
+        self.assertEqual(set(search_product_ids('sabzi')), {self.tomato.pk, self.potato.pk})
+
+        self.farmer.farm_name = 'Green Acres'
+        self.farmer.save()
+        self.assertEqual(set(search_product_ids('acres')), {self.tomato.pk, self.cherry.pk, self.potato.pk})
+        self.assertEqual(search_product_ids('grower'), [])
+
+    def test_fts_syntax_in_the_query_is_plain_text(self):
+        for q in ('"tomato', 'NEAR(tomato potato)', 'tomato OR potato', 'name:tomato', 'tom*', '"', '-(', 'AND'):
+            with self.subTest(q=q):
+                response = self.client.get(self.url, {'q': q})
+                self.assertEqual(response.status_code, 200)
+        # Quotes and operators are dropped; the words are searched as usual
+        self.assertEqual(self.search('"tomato'), {str(self.tomato.pk), str(self.cherry.pk)})
+        self.assertEqual(self.search('name:tomato'), self.search('name tomato'))
+
+
+class GeoSearchTests(MarketplaceFixtures, APITestCase):
+    url = '/api/marketplace/products/'
+    near = (20.0, 73.79)
+    # name: (latitude, longitude, price); prices fall as distance grows
+    farms = {
+        'village': (20.05, 73.80, '90'),
+        'river': (20.0, 73.99, '70'),
+        'hills': (20.15, 73.79, '60'),
+        'border': (20.25, 73.79, '50'),
+        'city': (18.52, 73.85, '10'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        category = CropCategory.objects.create(name='Grains', slug='grains')
+        cls.farmers = {}
+        for index, (name, (lat, lng, price)) in enumerate(cls.farms.items(), start=1):
+            farmer = cls.make_farmer(name, f'+9198765190{index:02d}')
+            farmer.latitude, farmer.longitude = Decimal(str(lat)), Decimal(str(lng))
+            farmer.save()
+            cls.farmers[name] = farmer
+            cls.make_product(farmer, category, f'{name.title()} Wheat', price=price)
+        # A farmer without a location never matches a distance search
+        cls.make_product(cls.make_farmer('nowhere', '+919876519099'), category, 'Nowhere Wheat')
+
+    def near_search(self, **params):
+        response = self.client.get(self.url, {'near': '{},{}'.format(*self.near), **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_radius_matches_haversine(self):
+        distances = {
+            f'{name.title()} Wheat': haversine_km(*self.near, lat, lng)
+            for name, (lat, lng, _) in self.farms.items()
+        }
+        for radius in (5, 6, 21, 25, 28, 200):
+            with self.subTest(radius_km=radius):
+                results = self.near_search(radius_km=radius)
+                expected = {name for name, distance in distances.items() if distance <= radius}
+                self.assertEqual({product['name'] for product in results}, expected)
+                for product in results:
+                    self.assertEqual(product['distance_km'], round(distances[product['name']], 2))
+
+    def test_nearest_first_unless_ordering_is_given(self):
+        results = self.near_search(radius_km=30)
+        self.assertEqual([product['name'] for product in results],
+                         ['Village Wheat', 'Hills Wheat', 'River Wheat', 'Border Wheat'])
+        self.assertEqual([product['distance_km'] for product in results],
+                         sorted(product['distance_km'] for product in results))
+
+        results = self.near_search(radius_km=30, ordering='price_per_unit')
+        self.assertEqual([product['name'] for product in results],
+                         ['Border Wheat', 'Hills Wheat', 'River Wheat', 'Village Wheat'])
+
+    def test_farmer_search_is_nearest_first(self):
+        self.client.force_authenticate(self.farmers['city'].user)
+        response = self.client.get('/api/marketplace/farmers/', {'near': '20.0,73.79', 'radius_km': '25'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([farmer['id'] for farmer in response.data['results']], [
+            str(self.farmers[name].pk) for name in ('village', 'hills', 'river')
+        ])
+
+    def test_bad_near_or_radius_is_a_400(self):
+        for params in (
+            {'near': 'nashik'},
+            {'near': '20.0'},
+            {'near': '95,73.79'},
+            {'near': '20.0,73.79', 'radius_km': 'far'},
+            {'near': '20.0,73.79', 'radius_km': '0'},
+            {'near': '20.0,73.79', 'radius_km': '501'},
+        ):
+            with self.subTest(**params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('near', response.data)
+
+    def test_saving_coordinates_with_update_fields_refreshes_geohash(self):
+        farmer = self.farmers['city']
+        farmer.latitude, farmer.longitude = Decimal('19.997'), Decimal('73.789')
+        farmer.save(update_fields=['latitude', 'longitude'])
+        farmer.refresh_from_db()
+        self.assertEqual(farmer.geohash, encode(Decimal('19.997'), Decimal('73.789')))
+        self.assertIn('City Wheat', {product['name'] for product in self.near_search(radius_km=1)})
+
+        farmer.latitude = Decimal('18.52')
+        farmer.save(update_fields=['latitude'])
+        farmer.refresh_from_db()
+        self.assertEqual(farmer.geohash, encode(Decimal('18.52'), Decimal('73.789')))
+
+
+class CatalogCacheTests(MarketplaceFixtures, APITestCase):
+    featured_url = '/api/marketplace/products/featured/'
+    tree_url = '/api/marketplace/categories/tree/'
+
+    @classmethod
+    def setUpTestData(cls):
+        farmer = cls.make_farmer('grower', '+919876520001')
+        cls.grains = CropCategory.objects.create(name='Grains', slug='grains')
+        cls.wheat = cls.make_product(farmer, cls.grains, 'Wheat', is_featured=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertIn(response.status_code, (200, 304))
+        return response
+
+    def test_if_none_match_gets_a_304_from_the_cache(self):
+        etag = self.get(self.featured_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.get(self.featured_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.get(self.featured_url, HTTP_IF_NONE_MATCH=f'"stale", W/{etag}')
+        self.assertEqual(response.status_code, 304)
+        response = self.get(self.featured_url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], 'Wheat')
+
+    def test_product_save_invalidates(self):
+        etag = self.get(self.featured_url)['ETag']
+
+        # Counter-only saves keep the cached responses
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wheat.views_count = 10
+            self.wheat.save(update_fields=['views_count'])
+        self.assertEqual(self.get(self.featured_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wheat.name = 'Durum Wheat'
+            self.wheat.save()
+        response = self.get(self.featured_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['name'], 'Durum Wheat')
+
+    def test_category_save_invalidates(self):
+        etag = self.get(self.tree_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            CropCategory.objects.create(name='Rice', slug='rice', parent=self.grains)
+        response = self.get(self.tree_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([child['name'] for child in response.data[0]['children']], ['Rice'])
+
+    def test_tree_is_built_in_one_query(self):
+        parent = self.grains
+        for depth in range(4):
+            parent = CropCategory.objects.create(name=f'Level {depth}', slug=f'level-{depth}', parent=parent)
+            for index in range(3):
+                CropCategory.objects.create(name=f'Leaf {depth}.{index}', slug=f'leaf-{depth}-{index}',
+                                            parent=parent)
+        with self.assertNumQueries(1):
+            response = self.get(self.tree_url)
+
+        node, depth = response.data[0], 0
+        while [child for child in node['children'] if child['name'].startswith('Level')]:
+            node = next(child for child in node['children'] if child['name'].startswith('Level'))
+            depth += 1
+        self.assertEqual(depth, 4)
+        self.assertEqual(len(node['children']), 3)
+
+        with self.assertNumQueries(0):
+            self.get(self.tree_url)
+
+    def test_moving_a_category_rewrites_its_subtree(self):
+        fruits = CropCategory.objects.create(name='Fruits', slug='fruits')
+        cereals = CropCategory.objects.create(name='Cereals', slug='cereals', parent=self.grains)
+        millet = CropCategory.objects.create(name='Millet', slug='millet', parent=cereals)
+        bajra = CropCategory.objects.create(name='Bajra', slug='bajra', parent=millet)
+
+        cereals.parent = fruits
+        cereals.save()
+        for category, path, level in (
+            (cereals, [fruits, cereals], 1),
+            (millet, [fruits, cereals, millet], 2),
+            (bajra, [fruits, cereals, millet, bajra], 3),
+        ):
+            category.refresh_from_db()
+            self.assertEqual(category.path, ''.join(f'{node.pk.hex}/' for node in path))
+            self.assertEqual(category.level, level)
+        self.assertEqual(set(fruits.descendants()), {cereals, millet, bajra})
+        self.assertFalse(self.grains.descendants().exists())
+
+        cereals.parent = None
+        cereals.save()
+        bajra.refresh_from_db()
+        self.assertEqual(bajra.path, f'{cereals.pk.hex}/{millet.pk.hex}/{bajra.pk.hex}/')
+        self.assertEqual(bajra.level, 2)
+
+
+class TrendingScoreTests(MarketplaceFixtures, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        farmer = cls.make_farmer('grower', '+919876521001')
+        category = CropCategory.objects.create(name='Vegetables', slug='vegetables')
+        cls.products = [cls.make_product(farmer, category, name) for name in ('Okra', 'Brinjal', 'Onion', 'Garlic')]
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def engage(self, product, **counters):
+        CropProduct.objects.filter(pk=product.pk).update(**counters)
+
+    def scores(self):
+        return dict(CropProduct.objects.values_list('name', 'trending_score'))
+
+    def trending(self):
+        return set(CropProduct.objects.filter(is_trending=True).values_list('name', flat=True))
+
+    def test_only_pending_products_are_rescored(self):
+        okra, brinjal, onion, garlic = self.products
+        self.engage(okra, views_count=5)
+        self.engage(brinjal, sales_count=1)
+        self.assertEqual(set(pending_products()), {okra, brinjal})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(update_trending_scores(self.now), 2)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertTrue(updates)
+        for sql in updates:
+            self.assertNotIn(onion.pk.hex, sql)
+            self.assertNotIn(garlic.pk.hex, sql)
+
+        self.assertFalse(pending_products().exists())
+        scores = self.scores()
+        self.assertGreater(scores['Brinjal'], scores['Okra'])
+        self.assertEqual((scores['Onion'], scores['Garlic']), (0, 0))
+
+    def test_recent_event_outranks_an_older_one_of_equal_weight(self):
+        okra, brinjal = self.products[:2]
+        self.engage(okra, cart_add_count=1)
+        update_trending_scores(self.now - timedelta(hours=48))
+        self.engage(brinjal, cart_add_count=1)
+        update_trending_scores(self.now)
+
+        okra.refresh_from_db()
+        brinjal.refresh_from_db()
+        self.assertGreater(brinjal.trending_score, okra.trending_score)
+        # Two half-lives later the older add is worth a quarter of its weight
+        self.assertAlmostEqual(decayed_score(okra, self.now), 3.0 / 4)
+        self.assertAlmostEqual(decayed_score(brinjal, self.now), 3.0)
+
+    def test_is_trending_follows_the_top_n(self):
+        okra, brinjal, onion, garlic = self.products
+        self.engage(okra, sales_count=3)
+        self.engage(brinjal, sales_count=2)
+        self.engage(onion, sales_count=1)
+        update_trending_scores(self.now, top_n=2)
+        self.assertEqual(self.trending(), {'Okra', 'Brinjal'})
+
+        # Garlic overtakes both; Brinjal drops out of the top two
+        self.engage(garlic, sales_count=5)
+        update_trending_scores(self.now, top_n=2)
+        self.assertEqual(self.trending(), {'Garlic', 'Okra'})
+
+        # Listings that are no longer active are never flagged
+        CropProduct.objects.filter(pk=garlic.pk).update(listing_status=ListingStatus.SOLDOUT)
+        update_trending_scores(self.now, top_n=2)
+        self.assertEqual(self.trending(), {'Okra', 'Brinjal'})
+
+    def test_second_run_without_new_events_changes_nothing(self):
+        self.engage(self.products[0], views_count=4, wishlist_count=1)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(update_trending_scores(self.now), 1)
+        self.assertTrue([query for query in queries if '"trending_score" =' in query['sql']])
+        self.assertEqual(len(callbacks), 1)
+        scores, trending = self.scores(), self.trending()
+
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(update_trending_scores(self.now + timedelta(hours=1)), 0)
+        # No score is rewritten; the flag updates match no rows
+        self.assertFalse([query for query in queries if '"trending_score" =' in query['sql']])
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.scores(), scores)
+        self.assertEqual(self.trending(), trending)
+
+
+class DailyMetricsRollupTests(MarketplaceFixtures, APITestCase):
+    first_day = date(2026, 3, 1)
+    second_day = date(2026, 3, 2)
+
+    @classmethod
+    def setUpTestData(cls):
+        farmer = cls.make_farmer('grower', '+919876522001')
+        buyer, address = cls.make_buyer('shopper', '+919876522002')
+        category = CropCategory.objects.create(name='Pulses', slug='pulses')
+        product = cls.make_product(farmer, category, 'Moong', price='100')
+        cls.orders = [place_order(buyer, product.pk, Decimal(quantity), address, 'cod')
+                      for quantity in ('2', '3', '4')]
+
+        # Everything happened on the first day, except two orders the next day,
+        # one of them cancelled
+        for model, rows, day in (
+            (FarmerProfile, [farmer], cls.first_day),
+            (BuyerProfile, [buyer], cls.first_day),
+            (CropProduct, [product], cls.first_day),
+            (Order, cls.orders[:1], cls.first_day),
+            (Order, cls.orders[1:], cls.second_day),
+        ):
+            model.objects.filter(pk__in=[row.pk for row in rows]).update(
+                created_at=timezone.make_aware(datetime.combine(day, time(10)))
+            )
+        Order.objects.filter(pk=cls.orders[2].pk).update(order_status=OrderStatus.CANCELLED)
+        cls.admin = cls.make_user('admin', '+919876522003', is_staff=True)
+
+    def metrics(self):
+        return {
+            row['date']: row
+            for row in DailyMetrics.objects.values('date', 'total_views', 'total_cart_adds', *ROLLUP_FIELDS)
+        }
+
+    def test_rollup_is_idempotent(self):
+        self.assertEqual(rollup_daily_metrics(self.first_day, self.second_day), 2)
+        first = self.metrics()
+        self.assertEqual(rollup_daily_metrics(self.first_day, self.second_day), 2)
+        self.assertEqual(self.metrics(), first)
+        self.assertEqual(DailyMetrics.objects.count(), 2)
+
+        day = first[self.first_day]
+        self.assertEqual((day['total_orders'], day['total_revenue'], day['avg_order_value']),
+                         (1, self.orders[0].total_amount, self.orders[0].total_amount))
+        self.assertEqual((day['new_farmers'], day['new_buyers'], day['active_users']), (1, 1, 1))
+        self.assertEqual((day['new_listings'], day['total_active_listings']), (1, 1))
+        day = first[self.second_day]
+        self.assertEqual((day['total_orders'], day['total_revenue']), (1, self.orders[1].total_amount))
+        self.assertEqual((day['new_farmers'], day['new_listings'], day['total_active_listings']), (0, 0, 1))
+
+    def test_upsert_keeps_engagement_totals(self):
+        DailyMetrics.objects.create(date=self.first_day, total_views=50, total_cart_adds=4, total_orders=99)
+        rollup_daily_metrics(self.first_day)
+
+        day = self.metrics()[self.first_day]
+        self.assertEqual((day['total_views'], day['total_cart_adds']), (50, 4))
+        self.assertEqual(day['total_orders'], 1)
+        self.assertEqual(day['conversion_rate'], Decimal('2.00'))
+
+    def test_backfill_across_a_chunk_boundary(self):
+        start, end = self.first_day - timedelta(days=1), self.second_day + timedelta(days=2)
+        # Chunks of two days put the first and second day in different chunks
+        self.assertEqual(backfill_daily_metrics(start, end, workers=1, chunk_days=2), 5)
+        chunked = self.metrics()
+
+        DailyMetrics.objects.all().delete()
+        rollup_daily_metrics(start, end)
+        self.assertEqual(chunked, self.metrics())
+        self.assertEqual([chunked[start + timedelta(days=offset)]['total_active_listings'] for offset in range(5)],
+                         [0, 1, 1, 1, 1])
+
+    def test_metrics_endpoints(self):
+        rollup_daily_metrics(self.first_day, self.second_day)
+        self.client.force_authenticate(self.orders[0].buyer.user)
+        self.assertEqual(self.client.get('/api/marketplace/metrics/').status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/marketplace/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['date'] for row in response.data['results']], ['2026-03-02', '2026-03-01'])
+
+        response = self.client.get('/api/marketplace/metrics/', {'start': '2026-03-02'})
+        self.assertEqual([row['date'] for row in response.data['results']], ['2026-03-02'])
+
+        response = self.client.get('/api/marketplace/metrics/2026-03-01/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_orders'], 1)
+
+        response = self.client.get('/api/marketplace/metrics/summary/')
+        self.assertEqual(response.status_code, 200)
+        revenue = self.orders[0].total_amount + self.orders[1].total_amount
+        self.assertEqual((response.data['days'], response.data['total_orders']), (2, 2))
+        self.assertEqual(response.data['total_revenue'], revenue)
+        self.assertEqual(response.data['avg_order_value'], round(revenue / 2, 2))
+
+        self.assertEqual(self.client.get('/api/marketplace/metrics/', {'end': 'March'}).status_code, 400)
+
+
+class CartPricingTests(MarketplaceFixtures, APITestCase):
+    url = '/api/marketplace/cart/summary/'
+    tiers = [{'min_quantity': '10', 'price_per_unit': '18.00'}, {'min_quantity': '50', 'price_per_unit': '16.50'}]
+
+    @classmethod
+    def setUpTestData(cls):
+        farmer = cls.make_farmer('grower', '+919876523001')
+        cls.buyer, cls.address = cls.make_buyer('shopper', '+919876523002')
+        category = CropCategory.objects.create(name='Grains', slug='grains')
+        cls.wheat = cls.make_product(farmer, category, 'Wheat', price='20', bulk_pricing=cls.tiers)
+        cls.rice = cls.make_product(farmer, category, 'Rice', price='30')
+
+    def setUp(self):
+        self.client.force_authenticate(self.buyer.user)
+
+    def summary(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cart_is_priced_in_one_query(self):
+        farmer = self.wheat.farmer
+        for count in (1, 10):
+            with self.subTest(lines=count):
+                CartItem.objects.all().delete()
+                for index in range(count):
+                    product = self.make_product(farmer, self.wheat.category, f'Grain {count}-{index}',
+                                                bulk_pricing=self.tiers)
+                    self.add_to_cart(self.buyer, product, '12')
+                with self.assertNumQueries(1):
+                    lines, totals = price_cart(CartItem.objects.filter(buyer=self.buyer))
+                    # Products, farmers and categories are joined, not fetched per line
+                    self.assertTrue(all(line.product.farmer.farm_name and line.product.category.name
+                                        for line in lines))
+                self.assertEqual(totals['item_count'], count)
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.summary()['item_count'], count)
+
+    def test_price_change_since_adding_is_flagged(self):
+        self.add_to_cart(self.buyer, self.wheat, '2')
+        self.add_to_cart(self.buyer, self.rice, '1')
+        self.assertIsNone(self.summary()['warning'])
+
+        self.rice.price_per_unit = Decimal('35')
+        self.rice.save()
+        summary = self.summary()
+        self.assertEqual(summary['price_changed_count'], 1)
+        self.assertEqual(summary['warning'], 'Prices changed for 1 cart item(s) since they were added')
+        self.assertEqual({line['product']['name']: line['price_changed'] for line in summary['items']},
+                         {'Wheat': False, 'Rice': True})
+        # Added at 2 x 20 + 1 x 30, now charged at 2 x 20 + 1 x 35
+        self.assertEqual(summary['snapshot_subtotal'], 70.0)
+        self.assertEqual(summary['subtotal'], 75.0)
+
+    def test_bulk_tiers_in_totals(self):
+        self.add_to_cart(self.buyer, self.wheat, '60')
+        self.add_to_cart(self.buyer, self.rice, '2')
+        summary = self.summary()
+
+        lines = {line['product']['name']: line for line in summary['items']}
+        self.assertEqual(Decimal(lines['Wheat']['effective_unit_price']), Decimal('16.50'))
+        self.assertEqual(Decimal(lines['Wheat']['current_unit_price']), Decimal('20.00'))
+        self.assertEqual(Decimal(lines['Wheat']['line_total']), Decimal('990.00'))
+        self.assertEqual(Decimal(lines['Rice']['line_total']), Decimal('60.00'))
+        self.assertEqual(summary['subtotal'], 1050.0)
+        self.assertEqual(summary['bulk_savings'], 210.0)
+        self.assertEqual(summary['item_count'], 2)
+
+
+class PriceScheduleTests(MarketplaceFixtures, APITestCase):
+    tiers = [{'min_quantity': '10', 'price_per_unit': '18.00'}, {'min_quantity': '50', 'price_per_unit': '16.50'}]
+
+    @classmethod
+    def setUpTestData(cls):
+        farmer = cls.make_farmer('grower', '+919876524001')
+        cls.buyer, cls.address = cls.make_buyer('shopper', '+919876524002')
+        category = CropCategory.objects.create(name='Grains', slug='grains')
+        cls.wheat = cls.make_product(farmer, category, 'Wheat', price='20', bulk_pricing=cls.tiers)
+        cls.rice = cls.make_product(farmer, category, 'Rice', stock='5', price='30', min_order_quantity=Decimal('2'))
+        cls.barley = cls.make_product(farmer, category, 'Barley')
+        CropProduct.objects.filter(pk=cls.barley.pk).update(listing_status=ListingStatus.INACTIVE)
+
+    def prices(self, schedule, quantities):
+        return [schedule.price_for(Decimal(quantity)) for quantity in quantities]
+
+    def test_tier_breakpoints(self):
+        schedule = PriceSchedule(Decimal('20'), self.tiers)
+        self.assertEqual(
+            self.prices(schedule, ['0.5', '9.999', '10', '10.001', '49.999', '50', '1000']),
+            [Decimal(price) for price in ('20', '20', '18.00', '18.00', '18.00', '16.50', '16.50')]
+        )
+        self.assertEqual(self.prices(PriceSchedule(Decimal('20'), []), ['1', '1000']), [Decimal('20')] * 2)
+
+    def test_malformed_tiers_are_ignored(self):
+        tiers = [
+            {'min_quantity': '5'},
+            {'price_per_unit': '1'},
+            {'min_quantity': 'ten', 'price_per_unit': '1'},
+            {'min_quantity': '0', 'price_per_unit': '1'},
+            {'min_quantity': '-5', 'price_per_unit': '1'},
+            {'min_quantity': '20', 'price_per_unit': '-1'},
+            None,
+            '30:1',
+            {'min_quantity': 40, 'price_per_unit': 15},
+            {'min_quantity': '40', 'price_per_unit': '14.999'},
+        ]
+        schedule = PriceSchedule(Decimal('20'), tiers)
+        # Only the 40 breakpoint survives, at the lowest of its two prices
+        self.assertEqual(schedule.breakpoints, [Decimal('40')])
+        self.assertEqual(self.prices(schedule, ['39', '40']), [Decimal('20'), Decimal('15.00')])
+        for bulk_pricing in ({'min_quantity': '10', 'price_per_unit': '1'}, 'cheap', None):
+            with self.subTest(bulk_pricing=bulk_pricing):
+                self.assertEqual(PriceSchedule(Decimal('20'), bulk_pricing).breakpoints, [])
+
+    def test_more_never_costs_more_per_unit(self):
+        tiers = [
+            {'min_quantity': '5', 'price_per_unit': '25'},
+            {'min_quantity': '10', 'price_per_unit': '15'},
+            {'min_quantity': '50', 'price_per_unit': '17'},
+            {'min_quantity': '100', 'price_per_unit': '12'},
+        ]
+        schedule = PriceSchedule(Decimal('20'), tiers)
+        quantities = ['1', '5', '9', '10', '49', '50', '99', '100', '500']
+        prices = self.prices(schedule, quantities)
+        self.assertEqual(prices, sorted(prices, reverse=True))
+        self.assertLessEqual(max(prices), Decimal('20'))
+        self.assertEqual(self.prices(schedule, ['5', '50', '100']), [Decimal('20'), Decimal('15'), Decimal('12')])
+
+    def test_schedule_cache_follows_product_changes(self):
+        schedule = price_schedule(self.wheat)
+        self.assertIs(price_schedule(self.wheat), schedule)
+        self.assertIs(price_schedule(CropProduct.objects.get(pk=self.wheat.pk)), schedule)
+
+        self.wheat.bulk_pricing = [{'min_quantity': '10', 'price_per_unit': '17.00'}]
+        self.wheat.save()
+        self.assertEqual(price_schedule(self.wheat).price_for(Decimal('10')), Decimal('17.00'))
+
+        # A price written without touching updated_at is still noticed
+        CropProduct.objects.filter(pk=self.wheat.pk).update(price_per_unit=Decimal('19'),
+                                                             updated_at=self.wheat.updated_at)
+        wheat = CropProduct.objects.get(pk=self.wheat.pk)
+        self.assertEqual(price_schedule(wheat).price_for(Decimal('1')), Decimal('19'))
+
+    def test_quote_reports_errors_per_line(self):
+        missing = uuid.uuid4()
+        response = self.client.post('/api/marketplace/products/quote/', {'items': [
+            {'product_id': str(self.wheat.pk), 'quantity': '50'},
+            {'product_id': str(missing), 'quantity': '1'},
+            {'product_id': str(self.rice.pk), 'quantity': '1'},
+            {'product_id': str(self.rice.pk), 'quantity': '6'},
+            {'product_id': str(self.barley.pk), 'quantity': '1'},
+            {'product_id': str(self.rice.pk), 'quantity': '3'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line['error'] for line in response.data['items']], [
+            None,
+            'Product not found or not available',
+            'Minimum order quantity is 2.000',
+            OUT_OF_STOCK,
+            'Product not found or not available',
+            None,
+        ])
+        wheat = response.data['items'][0]
+        self.assertEqual((wheat['unit_price'], wheat['line_total'], wheat['savings']),
+                         (Decimal('16.50'), Decimal('825.00'), Decimal('175.00')))
+        # Only the lines without errors are totalled
+        self.assertEqual(response.data['subtotal'], 915.0)
+        self.assertEqual(response.data['bulk_savings'], 175.0)
+
+        response = self.client.post('/api/marketplace/products/quote/', {'items': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_is_charged_the_tier_price(self):
+        self.client.force_authenticate(self.buyer.user)
+        response = self.client.post('/api/marketplace/orders/', {
+            'product_id': str(self.wheat.pk), 'quantity': '12',
+            'delivery_address_id': str(self.address.pk), 'payment_method': 'cod'
+        })
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.unit_price, Decimal('18.00'))
+        self.assertEqual(order.subtotal, Decimal('216.00'))
@@ -0,0 +1,215 @@
+"""
+Order state machine
+
+TRANSITIONS declares every move between OrderStatus values and who may make
+it: the order's farmer, its buyer, or staff, who may make any declared move.
+Entering a status stamps its timestamp (confirmed_at, shipped_at,
+delivered_at, ...) and the other fields that go with it.
+
+transition_orders() moves any number of orders at once. It locks them with
+one SELECT ... FOR UPDATE, so every history row records the status the order
+really left, then writes the orders that may move with one UPDATE ...
+WHERE id IN and their history with one bulk_create. Orders that may not
+move are skipped and reported rather than failing the rest.
+
+queryset.update() sends no signals, so the bookkeeping the Order signals
+would do is done here: farmer sales totals follow orders into and out of
+delivered, and a cancellation gives back its stock and its coupon use.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Coupon, CouponUsage, CropProduct, Order, OrderStatus, OrderStatusHistory, PaymentStatus
+from .orders import OrderError
+from .ratings import add_sales
+
+FARMER, BUYER, STAFF = 'farmer', 'buyer', 'staff'
+
+# from status -> {to status: roles other than staff that may move it}
+TRANSITIONS = {
+    OrderStatus.PENDING: {
+        OrderStatus.CONFIRMED: {FARMER},
+        OrderStatus.CANCELLED: {FARMER, BUYER},
+    },
+    OrderStatus.CONFIRMED: {
+        OrderStatus.PROCESSING: {FARMER},
+        OrderStatus.PACKED: {FARMER},
+        OrderStatus.SHIPPED: {FARMER},
+        OrderStatus.CANCELLED: {FARMER, BUYER},
+    },
+    OrderStatus.PROCESSING: {
+        OrderStatus.PACKED: {FARMER},
+        OrderStatus.SHIPPED: {FARMER},
+        OrderStatus.CANCELLED: {FARMER},
+    },
+    OrderStatus.PACKED: {
+        OrderStatus.SHIPPED: {FARMER},
+        OrderStatus.CANCELLED: {FARMER},
+    },
+    OrderStatus.SHIPPED: {
+        OrderStatus.IN_TRANSIT: {FARMER},
+        OrderStatus.OUT_FOR_DELIVERY: {FARMER},
+        OrderStatus.DELIVERED: {FARMER, BUYER},
+        OrderStatus.RETURNED: {FARMER},
+    },
+    OrderStatus.IN_TRANSIT: {
+        OrderStatus.OUT_FOR_DELIVERY: {FARMER},
+        OrderStatus.DELIVERED: {FARMER, BUYER},
+        OrderStatus.RETURNED: {FARMER},
+    },
+    OrderStatus.OUT_FOR_DELIVERY: {
+        OrderStatus.DELIVERED: {FARMER, BUYER},
+        OrderStatus.RETURNED: {FARMER},
+    },
+    OrderStatus.DELIVERED: {
+        OrderStatus.RETURNED: {FARMER},
+        OrderStatus.REFUNDED: set(),
+    },
+    OrderStatus.CANCELLED: {
+        OrderStatus.REFUNDED: set(),
+    },
+    OrderStatus.RETURNED: {
+        OrderStatus.REFUNDED: set(),
+    },
+    OrderStatus.REFUNDED: {},
+}
+
+TIMESTAMP_FIELDS = {
+    OrderStatus.CONFIRMED: 'confirmed_at',
+    OrderStatus.SHIPPED: 'shipped_at',
+    OrderStatus.DELIVERED: 'delivered_at',
+    OrderStatus.CANCELLED: 'cancelled_at',
+    OrderStatus.REFUNDED: 'refund_date',
+}
+
+
+class TransitionError(OrderError):
+    """An order that cannot move to the requested status"""
+
+
+def role_of(user, order):
+    """FARMER, BUYER or STAFF for user on an order row, or None"""
+    if user.is_staff:
+        return STAFF
+    if order['farmer__user_id'] == user.pk:
+        return FARMER
+    if order['buyer__user_id'] == user.pk:
+        return BUYER
+    return None
+
+
+def transition_error(from_status, to_status, role):
+    """Why role may not move an order from from_status to to_status, or None"""
+    allowed = TRANSITIONS.get(from_status, {})
+    if to_status not in allowed:
+        return f'Cannot move a {OrderStatus(from_status).label} order to {OrderStatus(to_status).label}'
+    if role != STAFF and role not in allowed[to_status]:
+        return f'You cannot mark this order {OrderStatus(to_status).label}'
+    return None
+
+
+def status_fields(to_status, user, reason, now):
+    """Order fields to write along with entering to_status"""
+    fields = {'order_status': to_status, 'status_updated_at': now, 'updated_at': now}
+    if to_status in TIMESTAMP_FIELDS:
+        fields[TIMESTAMP_FIELDS[to_status]] = now
+    if to_status == OrderStatus.DELIVERED:
+        fields['actual_delivery_date'] = timezone.localdate(now)
+    elif to_status == OrderStatus.CANCELLED:
+        fields.update(cancelled_by=user, cancellation_reason=reason)
+    elif to_status == OrderStatus.RETURNED:
+        fields['return_reason'] = reason
+    elif to_status == OrderStatus.REFUNDED:
+        fields.update(payment_status=PaymentStatus.REFUNDED,
+                      refund_amount=Coalesce(F('refund_amount'), F('total_amount')))
+    return fields
+
+
+def transition_orders(orders, to_status, user, reason=''):
+    """
+    Move every order in the orders queryset that user may move to to_status
+
+    Returns:
+        tuple: (moved, skipped); moved is the ids of the orders moved and
+        skipped lists {'order_id', 'order_number', 'error'} for the rest
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # In pk order, so overlapping bulk transitions queue instead of deadlocking
+        rows = list(orders.select_for_update(of=('self',)).order_by('pk').values(
+            'pk', 'order_number', 'order_status', 'farmer_id', 'farmer__user_id', 'buyer__user_id',
+            'product_id', 'quantity_ordered', 'total_amount',
+        ))
+        moving, skipped = [], []
+        for row in rows:
+            error = transition_error(row['order_status'], to_status, role_of(user, row))
+            if error:
+                skipped.append({'order_id': str(row['pk']), 'order_number': row['order_number'], 'error': error})
+            else:
+                moving.append(row)
+        if not moving:
+            return [], skipped
+
+        Order.objects.filter(pk__in=[row['pk'] for row in moving]).update(
+            **status_fields(to_status, user, reason, now)
+        )
+        label = str(OrderStatus(to_status).label).lower()
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(
+                order_id=row['pk'], from_status=row['order_status'], to_status=to_status,
+                changed_by=user, change_reason=reason, notes=f'Order {label} by {role_of(user, row)}',
+            )
+            for row in moving
+        ])
+        _record_sales(moving, to_status)
+        if to_status == OrderStatus.CANCELLED:
+            _release_cancelled(moving)
+    return [row['pk'] for row in moving], skipped
+
+
+def transition_order(order, to_status, user, reason=''):
+    """Move one order to to_status; raises TransitionError if it may not"""
+    moved, skipped = transition_orders(Order.objects.filter(pk=order.pk), to_status, user, reason)
+    if not moved:
+        raise TransitionError(skipped[0]['error'] if skipped else 'Order not found')
+
+
+def _record_sales(moved, to_status):
+    # Delivered orders count towards their farmer's sales (see ratings.py)
+    sales = defaultdict(lambda: [Decimal('0'), 0])
+    for row in moved:
+        sign = (to_status == OrderStatus.DELIVERED) - (row['order_status'] == OrderStatus.DELIVERED)
+        if sign:
+            sales[row['farmer_id']][0] += sign * row['total_amount']
+            sales[row['farmer_id']][1] += sign
+    for farmer_id, (total, count) in sales.items():
+        add_sales(farmer_id, total, count)
+
+
+def _release_cancelled(cancelled):
+    """Return cancelled orders' stock and coupon uses"""
+    stock = defaultdict(lambda: [Decimal('0'), 0])
+    for row in cancelled:
+        stock[row['product_id']][0] += row['quantity_ordered']
+        stock[row['product_id']][1] += 1
+    now = timezone.now()
+    for product_id, (quantity, count) in stock.items():
+        CropProduct.objects.filter(pk=product_id).update(
+            quantity_available=F('quantity_available') + quantity,
+            sales_count=F('sales_count') - count,
+            updated_at=now,
+        )
+
+    usages = CouponUsage.objects.filter(order_id__in=[row['pk'] for row in cancelled])
+    released = defaultdict(int)
+    for coupon_id in usages.values_list('coupon_id', flat=True):
+        released[coupon_id] += 1
+    if released:
+        usages.delete()
+        for coupon_id, count in released.items():
+            Coupon.objects.filter(pk=coupon_id).update(times_used=F('times_used') - count)
@@ -0,0 +1,109 @@
+"""
+Time-decayed trending scores for CropProduct
+
+A product's trending score is the sum of its engagement events, each
+weighted by TRENDING_WEIGHTS and halved every TRENDING_HALF_LIFE. Decaying
+every score on every run would rewrite the whole table, so scores are kept
+relative to a fixed landmark instead ("forward decay"): an event at time t
+adds weight * 2 ** ((t - landmark) / half_life). All scores shrink by the
+same factor as time passes, so ordering by the stored value is ordering by
+the decayed score, and only products with new events need writing. The
+value is stored as its natural log to stay within float range.
+
+New events are the differences between the engagement counters
+(views_count, wishlist_count, cart_add_count, sales_count) and the
+trending_*_seen copies taken at the last run; a partial index lists exactly
+the products where they differ.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_catalog
+from .models import CropProduct, ListingStatus
+
+TRENDING_HALF_LIFE = timedelta(hours=24)
+TRENDING_LANDMARK = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+TRENDING_TOP_N = 50  # Products flagged is_trending
+TRENDING_BATCH_SIZE = 500
+
+# counter field -> (seen field, weight per event)
+TRENDING_WEIGHTS = {
+    'sales_count': ('trending_sales_seen', 10.0),
+    'cart_add_count': ('trending_cart_adds_seen', 3.0),
+    'wishlist_count': ('trending_wishlists_seen', 2.0),
+    'views_count': ('trending_views_seen', 0.2),
+}
+
+_DECAY_RATE = math.log(2) / TRENDING_HALF_LIFE.total_seconds()
+
+
+def log_weight(weight, when):
+    """Log of weight as an event at when, relative to the landmark"""
+    return math.log(weight) + _DECAY_RATE * (when - TRENDING_LANDMARK).total_seconds()
+
+
+def add_log(a, b):
+    """log(exp(a) + exp(b)) without overflow"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed_score(product, now=None):
+    """The trending score as of now, in event-weight units"""
+    now = now or timezone.now()
+    return math.exp(product.trending_score - _DECAY_RATE * (now - TRENDING_LANDMARK).total_seconds())
+
+
+def pending_products():
+    """Products with engagement not yet folded into their score"""
+    index = next(index for index in CropProduct._meta.indexes if index.name == 'product_trending_pending_idx')
+    return CropProduct.objects.filter(index.condition)
+
+
+def score_events(product, now):
+    """Fold product's new events into its score; False if it had none"""
+    weight = 0.0
+    for counter, (seen, event_weight) in TRENDING_WEIGHTS.items():
+        # Counters can go down (a wishlist removal); only growth is activity
+        weight += max(getattr(product, counter) - getattr(product, seen), 0) * event_weight
+        setattr(product, seen, getattr(product, counter))
+    if weight:
+        product.trending_score = add_log(product.trending_score, log_weight(weight, now))
+    return bool(weight)
+
+
+def update_trending_scores(now=None, top_n=TRENDING_TOP_N, batch_size=TRENDING_BATCH_SIZE):
+    """
+    Score new engagement and refresh the is_trending flags
+
+    Returns:
+        int: Products whose score changed
+    """
+    now = now or timezone.now()
+    fields = ['trending_score'] + [seen for seen, _ in TRENDING_WEIGHTS.values()]
+    fields_to_read = ['id'] + fields + list(TRENDING_WEIGHTS)
+    scored = 0
+    while True:
+        with transaction.atomic():
+            # Each batch clears its rows from pending_products(); locking
+            # keeps a concurrent run from scoring the same events twice
+            batch = list(pending_products().select_for_update().only(*fields_to_read).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            scored += sum(score_events(product, now) for product in batch)
+            CropProduct.objects.bulk_update(batch, fields)
+
+    with transaction.atomic():
+        top = list(
+            CropProduct.objects.filter(listing_status=ListingStatus.ACTIVE, is_deleted=False, trending_score__gt=0)
+            .order_by('-trending_score').values_list('pk', flat=True)[:top_n]
+        )
+        unflagged = CropProduct.objects.filter(is_trending=True).exclude(pk__in=top).update(is_trending=False)
+        flagged = CropProduct.objects.filter(pk__in=top, is_trending=False).update(is_trending=True)
+
+    if scored or unflagged or flagged:
+        transaction.on_commit(invalidate_catalog)
+    return scored
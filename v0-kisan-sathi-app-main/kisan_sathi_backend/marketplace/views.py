@@ -5,7 +5,7 @@ High-performance views with caching and optimization
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Avg, Count, Sum
@@ -15,20 +15,30 @@ from decimal import Decimal
 from .models import (
     FarmerProfile, BuyerProfile, DeliveryAddress,
     CropCategory, CropProduct, ProductImage,
-    CartItem, Order, OrderStatusHistory, Receipt,
+    CartItem, Order, OrderStatus, Receipt,
     ProductReview, FarmerRating, Wishlist,
-    Notification, Coupon, CouponUsage
+    Notification, Coupon, CouponUsage, DailyMetrics
 )
 from .serializers import (
     FarmerProfileSerializer, FarmerProfileListSerializer,
     BuyerProfileSerializer, DeliveryAddressSerializer,
     CropCategorySerializer, CropProductSerializer, CropProductListSerializer,
-    CropProductCreateSerializer, ProductImageSerializer, CartItemSerializer,
+    CropProductCreateSerializer, ProductImageSerializer, CartItemSerializer, CartSummaryItemSerializer,
     OrderSerializer, OrderListSerializer, ReceiptSerializer,
     ProductReviewSerializer, FarmerRatingSerializer,
     WishlistSerializer, NotificationSerializer,
-    CouponSerializer, CreateOrderSerializer
+    CouponSerializer, CreateOrderSerializer, CheckoutSerializer, DailyMetricsSerializer, QuoteSerializer,
+    ValidateCouponSerializer, OrderTransitionSerializer, BulkOrderTransitionSerializer, group_by_parent
 )
+from .cache import cached_catalog_response
+from .carts import cart_session_id
+from .counters import increment
+from .pricing import price_cart, quote, unit_price_for
+from .orders import DELIVERY_CHARGES, CheckoutError, OrderError, checkout_cart, place_order
+from .coupons import CouponError, check_coupon
+from .transitions import TransitionError, transition_order, transition_orders
+from .geo import nearby, parse_near
+from .search import search_product_ids
 
 
 # ============================================================================
@@ -47,6 +57,36 @@ class LargeResultsSetPagination(PageNumberPagination):
     max_page_size = 200
 
 
+# ============================================================================
+# GEO FILTERING
+# ============================================================================
+
+def filter_near(queryset, params, prefix=''):
+    """
+    Apply ?near=lat,lng&radius_km= (see geo.py); a no-op without near
+    
+    prefix is the path to FarmerProfile, e.g. 'farmer__' for products.
+    """
+    near = params.get('near')
+    if not near:
+        return queryset
+    try:
+        lat, lng, radius_km = parse_near(near, params.get('radius_km'))
+    except ValueError as exc:
+        from rest_framework.exceptions import ValidationError
+        raise ValidationError({'near': str(exc)})
+    return nearby(queryset, lat, lng, radius_km, prefix)
+
+
+class NearestFirstOrderingFilter(filters.OrderingFilter):
+    """Defaults to nearest first for ?near= searches; ?ordering= still wins"""
+    
+    def get_default_ordering(self, view):
+        if view.request.query_params.get('near'):
+            return ['distance_km']
+        return super().get_default_ordering(view)
+
+
 # ============================================================================
 # FARMER PROFILES
 # ============================================================================
@@ -56,7 +96,7 @@ class FarmerProfileViewSet(viewsets.ModelViewSet):
     queryset = FarmerProfile.objects.select_related('user').all()
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, NearestFirstOrderingFilter]
     filterset_fields = ['verification_status', 'state', 'district', 'is_premium']
     search_fields = ['farm_name', 'user__first_name', 'user__last_name', 'district']
     ordering_fields = ['rating', 'total_sales', 'created_at']
@@ -67,6 +107,10 @@ class FarmerProfileViewSet(viewsets.ModelViewSet):
             return FarmerProfileListSerializer
         return FarmerProfileSerializer
     
+    def get_queryset(self):
+        # Distance search: ?near=lat,lng&radius_km=25
+        return filter_near(self.queryset, self.request.query_params)
+    
     @action(detail=True, methods=['get'])
     def products(self, request, pk=None):
         """Get all products by this farmer"""
@@ -134,19 +178,27 @@ class DeliveryAddressViewSet(viewsets.ModelViewSet):
 
 class CropCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """Product categories (read-only for users)"""
-    queryset = CropCategory.objects.filter(is_active=True).prefetch_related('children')
+    queryset = CropCategory.objects.filter(is_active=True).order_by('level', 'display_order', 'name')
     serializer_class = CropCategorySerializer
     permission_classes = [AllowAny]
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'slug']
     
+    def get_serializer_context(self):
+        # Children of every serialized category come from this one query
+        context = super().get_serializer_context()
+        context['children_by_parent'] = group_by_parent(CropCategory.objects.filter(is_active=True))
+        return context
+    
     @action(detail=False, methods=['get'])
     def tree(self, request):
         """Get category tree (root categories with children)"""
-        root_categories = self.queryset.filter(parent__isnull=True)
-        serializer = self.get_serializer(root_categories, many=True)
-        return Response(serializer.data)
+        def build():
+            context = self.get_serializer_context()
+            roots = context['children_by_parent'][None]
+            return CropCategorySerializer(roots, many=True, context=context).data
+        return cached_catalog_response(request, 'category-tree', build)
 
 
 # ============================================================================
@@ -158,7 +210,7 @@ class CropProductViewSet(viewsets.ModelViewSet):
     queryset = CropProduct.objects.select_related('farmer', 'category').prefetch_related('images').filter(is_deleted=False)
     permission_classes = [AllowAny]
     pagination_class = LargeResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, NearestFirstOrderingFilter]
     filterset_fields = ['category', 'listing_status', 'is_organic_certified', 'quality_grade', 'unit']
     search_fields = ['name', 'variety', 'description', 'farmer__farm_name']
     ordering_fields = ['price_per_unit', 'rating', 'created_at', 'sales_count']
@@ -181,7 +233,12 @@ class CropProductViewSet(viewsets.ModelViewSet):
         if not hasattr(self.request.user, 'farmer_profile'):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Only farmers can create products")
-        serializer.save(farmer=self.request.user.farmer_profile)
+        product = serializer.save(farmer=self.request.user.farmer_profile)
+        if product.listing_status == 'active':
+            # Fanned out by a worker; the request only queues the broadcast
+            from django.db import transaction
+            from .tasks import notify_new_listing
+            transaction.on_commit(lambda: notify_new_listing.delay(str(product.pk)))
     
     def perform_update(self, serializer):
         # Ensure user owns the product
@@ -194,7 +251,7 @@ class CropProductViewSet(viewsets.ModelViewSet):
         queryset = self.queryset
         
         # Filter by listing status
-        if self.action == 'list':
+        if self.action in ('list', 'search'):
             queryset = queryset.filter(listing_status='active')
         
         # Price range filter
@@ -213,6 +270,9 @@ class CropProductViewSet(viewsets.ModelViewSet):
         if district:
             queryset = queryset.filter(farmer__district=district)
         
+        # Distance search: ?near=lat,lng&radius_km=25
+        queryset = filter_near(queryset, self.request.query_params, prefix='farmer__')
+        
         # Featured/Trending
         if self.request.query_params.get('featured') == 'true':
             queryset = queryset.filter(is_featured=True)
@@ -222,11 +282,11 @@ class CropProductViewSet(viewsets.ModelViewSet):
         return queryset
     
     def retrieve(self, request, *args, **kwargs):
-        """Increment view count on product detail"""
+        """Product detail; the view is counted through the counter buffer"""
         instance = self.get_object()
-        instance.views_count += 1
-        instance.save(update_fields=['views_count'])
-        return super().retrieve(request, *args, **kwargs)
+        increment(instance.pk, 'views_count')
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
     
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
@@ -239,16 +299,55 @@ class CropProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def featured(self, request):
         """Get featured products"""
-        products = self.queryset.filter(is_featured=True, listing_status='active')[:10]
-        serializer = CropProductListSerializer(products, many=True)
-        return Response(serializer.data)
+        def build():
+            products = self.queryset.filter(is_featured=True, listing_status='active')[:10]
+            return CropProductListSerializer(products, many=True).data
+        return cached_catalog_response(request, 'featured', build)
     
     @action(detail=False, methods=['get'])
     def trending(self, request):
-        """Get trending products"""
-        products = self.queryset.filter(is_trending=True, listing_status='active').order_by('-sales_count')[:10]
-        serializer = CropProductListSerializer(products, many=True)
-        return Response(serializer.data)
+        """Get trending products (top trending scores, see trending.py)"""
+        def build():
+            products = self.queryset.filter(
+                listing_status='active', trending_score__gt=0
+            ).order_by('-trending_score')[:10]
+            return CropProductListSerializer(products, many=True).data
+        return cached_catalog_response(request, 'trending', build)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search over product text and translations
+        
+        ?q= is matched by word and by transliteration-tolerant phonetic key;
+        the last word is a prefix unless ?prefix=false. The list filters
+        (category, price, state, ...) still apply.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Search query (q) is required'}, status=status.HTTP_400_BAD_REQUEST)
+        ranked = search_product_ids(query, prefix=request.query_params.get('prefix') != 'false')
+        
+        queryset = DjangoFilterBackend().filter_queryset(request, self.get_queryset(), self)
+        visible = set(queryset.filter(pk__in=ranked).values_list('pk', flat=True))
+        page = self.paginate_queryset([pk for pk in ranked if pk in visible])
+        products = queryset.in_bulk(page)
+        serializer = CropProductListSerializer([products[pk] for pk in page], many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """Price up to 500 (product, quantity) pairs with bulk tiers in one call"""
+        serializer = QuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lines, totals = quote([
+            (item['product_id'], item['quantity']) for item in serializer.validated_data['items']
+        ])
+        return Response({
+            'subtotal': float(totals['subtotal']),
+            'bulk_savings': float(totals['bulk_savings']),
+            'items': lines,
+        })
 
 
 # ============================================================================
@@ -256,32 +355,51 @@ class CropProductViewSet(viewsets.ModelViewSet):
 # ============================================================================
 
 class CartItemViewSet(viewsets.ModelViewSet):
-    """Shopping cart management"""
+    """Shopping cart management; anonymous visitors keep a session cart until they log in"""
     queryset = CartItem.objects.select_related('product', 'buyer').all()
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
     
+    def get_permissions(self):
+        # Session carts (X-Cart-Session header) need no login, but checkout does
+        if self.action != 'checkout' and cart_session_id(self.request):
+            return [AllowAny()]
+        return super().get_permissions()
+    
     def get_queryset(self):
         if hasattr(self.request.user, 'buyer_profile'):
             return self.queryset.filter(
                 buyer=self.request.user.buyer_profile,
                 expires_at__gt=timezone.now()
             )
+        if not self.request.user.is_authenticated:
+            return self.queryset.filter(
+                buyer__isnull=True,
+                session_id=cart_session_id(self.request),
+                expires_at__gt=timezone.now()
+            )
         return self.queryset.none()
     
     def perform_create(self, serializer):
         if hasattr(self.request.user, 'buyer_profile'):
-            serializer.save(buyer=self.request.user.buyer_profile)
+            item = serializer.save(buyer=self.request.user.buyer_profile)
+            increment(item.product_id, 'cart_add_count')
+        elif not self.request.user.is_authenticated:
+            item = serializer.save(session_id=cart_session_id(self.request))
+            increment(item.product_id, 'cart_add_count')
     
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        """Get cart summary"""
-        cart_items = self.get_queryset()
-        total = sum(item.subtotal for item in cart_items)
+        """Cart totals at current prices and bulk tiers, from one query"""
+        lines, totals = price_cart(self.get_queryset())
         return Response({
-            'item_count': cart_items.count(),
-            'subtotal': float(total),
-            'items': CartItemSerializer(cart_items, many=True).data
+            'item_count': totals['item_count'],
+            'subtotal': float(totals['subtotal']),
+            'snapshot_subtotal': float(totals['snapshot_subtotal']),
+            'bulk_savings': float(totals['bulk_savings']),
+            'price_changed_count': totals['price_changed_count'],
+            'warning': totals['warning'],
+            'items': CartSummaryItemSerializer(lines, many=True).data
         })
     
     @action(detail=False, methods=['post'])
@@ -289,6 +407,39 @@ class CartItemViewSet(viewsets.ModelViewSet):
         """Clear cart"""
         self.get_queryset().delete()
         return Response({'message': 'Cart cleared'}, status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        """Place one order per cart item and empty the cart, all or nothing"""
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        buyer_profile = getattr(request.user, 'buyer_profile', None)
+        if buyer_profile is None:
+            from rest_framework.exceptions import PermissionDenied
+            raise PermissionDenied("Only buyers can place orders")
+        delivery_address = DeliveryAddress.objects.filter(
+            id=serializer.validated_data['delivery_address_id'], buyer=buyer_profile, is_active=True
+        ).first()
+        if delivery_address is None:
+            return Response({'error': 'Delivery address not found'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            orders = checkout_cart(
+                buyer_profile,
+                delivery_address,
+                payment_method=serializer.validated_data['payment_method'],
+                buyer_notes=serializer.validated_data.get('buyer_notes', ''),
+                placed_by=request.user,
+            )
+        except CheckoutError as exc:
+            return Response({'error': str(exc), 'items': exc.items}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'message': f'{len(orders)} orders placed',
+            'total_amount': float(sum(order.total_amount for order in orders)),
+            'orders': OrderListSerializer(orders, many=True).data
+        }, status=status.HTTP_201_CREATED)
 
 
 # ============================================================================
@@ -331,56 +482,29 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # Get validated data
-        product = CropProduct.objects.get(id=serializer.validated_data['product_id'])
-        quantity = serializer.validated_data['quantity']
-        delivery_address = DeliveryAddress.objects.get(id=serializer.validated_data['delivery_address_id'])
-        buyer_profile = request.user.buyer_profile
-        
-        # Calculate pricing
-        unit_price = product.price_per_unit
-        subtotal = unit_price * quantity
-        tax_rate = Decimal('5.00')  # 5% GST
-        tax_amount = (subtotal * tax_rate) / 100
-        delivery_charges = Decimal('50.00')  # Flat delivery charge
-        total_amount = subtotal + tax_amount + delivery_charges
-        
-        # Create order
-        order = Order.objects.create(
-            buyer=buyer_profile,
-            farmer=product.farmer,
-            product=product,
-            quantity_ordered=quantity,
-            unit=product.unit,
-            unit_price=unit_price,
-            subtotal=subtotal,
-            tax_amount=tax_amount,
-            tax_rate=tax_rate,
-            delivery_charges=delivery_charges,
-            total_amount=total_amount,
-            delivery_name=delivery_address.contact_name,
-            delivery_phone=delivery_address.contact_phone,
-            delivery_address=delivery_address.address_line1,
-            delivery_city=delivery_address.city,
-            delivery_state=delivery_address.state,
-            delivery_pincode=delivery_address.pincode,
-            delivery_landmark=delivery_address.landmark,
-            payment_method=serializer.validated_data['payment_method'],
-            buyer_notes=serializer.validated_data.get('buyer_notes', ''),
-        )
-        
-        # Update product inventory
-        product.quantity_available -= quantity
-        product.sales_count += 1
-        product.save()
+        buyer_profile = getattr(request.user, 'buyer_profile', None)
+        if buyer_profile is None:
+            from rest_framework.exceptions import PermissionDenied
+            raise PermissionDenied("Only buyers can place orders")
+        delivery_address = DeliveryAddress.objects.filter(
+            id=serializer.validated_data['delivery_address_id'], buyer=buyer_profile, is_active=True
+        ).first()
+        if delivery_address is None:
+            return Response({'error': 'Delivery address not found'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create status history
-        OrderStatusHistory.objects.create(
-            order=order,
-            to_status='pending',
-            changed_by=request.user,
-            notes='Order created'
-        )
+        try:
+            order = place_order(
+                buyer_profile,
+                serializer.validated_data['product_id'],
+                serializer.validated_data['quantity'],
+                delivery_address,
+                payment_method=serializer.validated_data['payment_method'],
+                buyer_notes=serializer.validated_data.get('buyer_notes', ''),
+                placed_by=request.user,
+                coupon_code=serializer.validated_data.get('coupon_code', ''),
+            )
+        except OrderError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response(
             OrderSerializer(order).data,
@@ -390,50 +514,54 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
         """Confirm order (farmer action)"""
-        order = self.get_object()
-        if order.order_status == 'pending':
-            order.order_status = 'confirmed'
-            order.confirmed_at = timezone.now()
-            order.save()
-            
-            OrderStatusHistory.objects.create(
-                order=order,
-                from_status='pending',
-                to_status='confirmed',
-                changed_by=request.user,
-                notes='Order confirmed by farmer'
-            )
-            
-            return Response({'message': 'Order confirmed'})
-        return Response({'error': 'Cannot confirm order'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            transition_order(self.get_object(), OrderStatus.CONFIRMED, request.user)
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': 'Order confirmed'})
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
-        """Cancel order"""
-        order = self.get_object()
-        reason = request.data.get('reason', '')
-        
-        if order.order_status in ['pending', 'confirmed']:
-            order.order_status = 'cancelled'
-            order.cancellation_reason = reason
-            order.cancelled_by = request.user
-            order.cancelled_at = timezone.now()
-            order.save()
-            
-            # Restore inventory
-            order.product.quantity_available += order.quantity_ordered
-            order.product.save()
-            
-            OrderStatusHistory.objects.create(
-                order=order,
-                from_status=order.order_status,
-                to_status='cancelled',
-                changed_by=request.user,
-                notes=f'Order cancelled: {reason}'
+        """Cancel order; its stock and coupon use are given back"""
+        try:
+            transition_order(
+                self.get_object(), OrderStatus.CANCELLED, request.user, reason=request.data.get('reason', '')
             )
-            
-            return Response({'message': 'Order cancelled'})
-        return Response({'error': 'Cannot cancel order'}, status=status.HTTP_400_BAD_REQUEST)
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': 'Order cancelled'})
+    
+    @action(detail=True, methods=['post'])
+    def transition(self, request, pk=None):
+        """Move order to any status the state machine allows the user"""
+        serializer = OrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = self.get_object()
+        try:
+            transition_order(order, serializer.validated_data['status'], request.user,
+                             reason=serializer.validated_data['reason'])
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        order.refresh_from_db()
+        return Response(OrderSerializer(order).data)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """Move up to 500 orders to one status; orders that cannot move are skipped"""
+        serializer = BulkOrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order_ids = serializer.validated_data['order_ids']
+        moved, skipped = transition_orders(
+            self.get_queryset().filter(pk__in=order_ids),
+            serializer.validated_data['status'],
+            request.user,
+            reason=serializer.validated_data['reason'],
+        )
+        moved = [str(order_id) for order_id in moved]
+        found = set(moved) | {item['order_id'] for item in skipped}
+        skipped += [{'order_id': order_id, 'error': 'Order not found'}
+                    for order_id in dict.fromkeys(map(str, order_ids)) if order_id not in found]
+        return Response({'updated': len(moved), 'order_ids': moved, 'skipped': skipped})
 
 
 # ============================================================================
@@ -476,7 +604,13 @@ class WishlistViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         if hasattr(self.request.user, 'buyer_profile'):
-            serializer.save(buyer=self.request.user.buyer_profile)
+            item = serializer.save(buyer=self.request.user.buyer_profile)
+            increment(item.product_id, 'wishlist_count')
+    
+    def perform_destroy(self, instance):
+        product_id = instance.product_id
+        instance.delete()
+        increment(product_id, 'wishlist_count', -1)
 
 
 # ============================================================================
@@ -491,7 +625,11 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = StandardResultsSetPagination
     
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-created_at')
+        # Scheduled notifications appear when due; expired ones never do
+        now = timezone.now()
+        return self.queryset.filter(user=self.request.user, scheduled_for__lte=now).exclude(
+            expires_at__lte=now
+        ).order_by('-created_at')
     
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
@@ -521,18 +659,77 @@ class CouponViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['post'])
     def validate(self, request):
-        """Validate coupon code"""
-        code = request.data.get('code')
+        """Check a coupon for the current buyer, and for a product and quantity if given"""
+        serializer = ValidateCouponSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        product = subtotal = None
+        if 'product_id' in data:
+            product = CropProduct.objects.filter(
+                pk=data['product_id'], listing_status='active', is_deleted=False
+            ).first()
+            if product is None:
+                return Response({'error': 'Product not found or not available'}, status=status.HTTP_400_BAD_REQUEST)
+            quantity = data.get('quantity') or product.min_order_quantity
+            subtotal = quantity * unit_price_for(product, quantity)
+        
         try:
-            coupon = Coupon.objects.get(code=code, is_active=True)
-            if coupon.is_valid():
-                return Response({
-                    'valid': True,
-                    'coupon': CouponSerializer(coupon).data
-                })
-            return Response({'valid': False, 'message': 'Coupon expired'})
-        except Coupon.DoesNotExist:
-            return Response({'valid': False, 'message': 'Invalid coupon code'})
+            rules = check_coupon(
+                data['code'], buyer=getattr(request.user, 'buyer_profile', None), product=product, subtotal=subtotal
+            )
+        except CouponError as exc:
+            return Response({'valid': False, 'message': str(exc)})
+        
+        response = {'valid': True, 'coupon': CouponSerializer(Coupon.objects.get(pk=rules.pk)).data}
+        if subtotal is not None:
+            response['discount_amount'] = float(rules.discount_for(subtotal, DELIVERY_CHARGES))
+        return Response(response)
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+class DailyMetricsViewSet(viewsets.ReadOnlyModelViewSet):
+    """Daily marketplace metrics for admin dashboards, newest first"""
+    queryset = DailyMetrics.objects.all()
+    serializer_class = DailyMetricsSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = StandardResultsSetPagination
+    lookup_field = 'date'
+
+    def get_queryset(self):
+        from datetime import date
+        from rest_framework.exceptions import ValidationError
+
+        queryset = self.queryset
+        for param, lookup in (('start', 'date__gte'), ('end', 'date__lte')):
+            value = self.request.query_params.get(param)
+            if value:
+                try:
+                    queryset = queryset.filter(**{lookup: date.fromisoformat(value)})
+                except ValueError:
+                    raise ValidationError({param: 'Expected a date as YYYY-MM-DD'})
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Totals over the selected days"""
+        totals = self.get_queryset().aggregate(
+            days=Count('id'),
+            total_orders=Sum('total_orders'),
+            total_revenue=Sum('total_revenue'),
+            new_farmers=Sum('new_farmers'),
+            new_buyers=Sum('new_buyers'),
+            new_listings=Sum('new_listings'),
+            total_views=Sum('total_views'),
+            total_cart_adds=Sum('total_cart_adds'),
+        )
+        totals = {key: value or 0 for key, value in totals.items()}
+        orders = totals['total_orders']
+        totals['avg_order_value'] = round(Decimal(totals['total_revenue']) / orders, 2) if orders else 0
+        return Response(totals)
 
 
 # ============================================================================
@@ -5,3 +5,7 @@ class SoilAnalysisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'soil_analysis'
     verbose_name = 'SoilSense - AI Soil Analysis'
+
+    def ready(self):
+        from kisan_sathi.pdf_styles import warm_pdf_registry
+        warm_pdf_registry()
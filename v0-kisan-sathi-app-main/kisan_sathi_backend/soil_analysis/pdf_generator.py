@@ -6,42 +6,47 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from django.core.files.base import ContentFile
 
+from kisan_sathi.pdf_styles import get_pdf_fonts, pdf_style
+
 class SoilAnalysisPDFGenerator:
     def __init__(self):
-        self.styles = getSampleStyleSheet()
         self._setup_custom_styles()
     
     def _setup_custom_styles(self):
-        """Setup custom styles for the PDF report"""
+        """Setup custom styles for the PDF report from the shared registry"""
+        
+        fonts = get_pdf_fonts()
         
-        self.title_style = ParagraphStyle(
+        self.title_style = pdf_style(
             'CustomTitle',
-            parent=self.styles['Heading1'],
+            parent='Heading1',
             fontSize=24,
             spaceAfter=30,
             alignment=TA_CENTER,
-            textColor=colors.HexColor('#2E7D32')
+            textColor=colors.HexColor('#2E7D32'),
+            fontName=fonts.bold
         )
         
-        self.section_style = ParagraphStyle(
+        self.section_style = pdf_style(
             'SectionHeader',
-            parent=self.styles['Heading2'],
+            parent='Heading2',
             fontSize=14,
             spaceBefore=20,
             spaceAfter=10,
-            textColor=colors.HexColor('#1B5E20')
+            textColor=colors.HexColor('#1B5E20'),
+            fontName=fonts.bold
         )
         
-        self.body_style = ParagraphStyle(
+        self.body_style = pdf_style(
             'CustomBody',
-            parent=self.styles['Normal'],
+            parent='Normal',
             fontSize=11,
             spaceAfter=6,
-            alignment=TA_LEFT
+            alignment=TA_LEFT,
+            fontName=fonts.regular
         )
     
     def generate_report(self, analysis_data, farmer_data, soil_image_path=None):
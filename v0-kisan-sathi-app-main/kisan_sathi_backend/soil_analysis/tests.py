@@ -1,3 +1,25 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .pdf_generator import SoilAnalysisPDFGenerator
+
+
+class SoilAnalysisPDFTests(SimpleTestCase):
+    def test_renders_pdf(self):
+        analysis = {
+            'soil_type': 'Black cotton',
+            'fertility_level': 'Medium',
+            'moisture_level': 'Low',
+            'confidence_score': 87,
+            'recommended_crops': ['Cotton', 'Soybean'],
+            'fertilizer_suggestions': ['DAP 50 kg per acre'],
+        }
+        farmer = {'id': 7, 'name': 'Ramesh', 'village': 'Wardha', 'district': 'Wardha', 'phone': '+919876500099'}
+
+        report = SoilAnalysisPDFGenerator().generate_report(analysis, farmer)
+
+        self.assertTrue(report.name.startswith('soil_analysis_7_'))
+        self.assertTrue(report.read().startswith(b'%PDF'))
+
+    def test_generators_share_styles(self):
+        first, second = SoilAnalysisPDFGenerator(), SoilAnalysisPDFGenerator()
+        self.assertIs(first.body_style, second.body_style)
@@ -6,6 +6,7 @@ import { Button } from "@/components/ui/button"
 import { Input } from "@/components/ui/input"
 import { Label } from "@/components/ui/label"
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs"
+import { fetchPage } from "@/lib/farm-api"
 
 const API_BASE = "http://127.0.0.1:8000/farm-management/api"
 
@@ -21,7 +22,10 @@ export function ExpenseManagement() {
     date: new Date().toISOString().split('T')[0],
     notes: ""
   })
+  const [nextPage, setNextPage] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [totalExpenses, setTotalExpenses] = useState(0)
+  const [expenseCount, setExpenseCount] = useState(0)
   const [deletedCount, setDeletedCount] = useState(0)
 
   useEffect(() => {
@@ -49,23 +53,29 @@ export function ExpenseManagement() {
 
   const fetchExpenses = async () => {
     try {
-      const token = localStorage.getItem('kisan-sathi-access')
-      const headers: any = {}
-      if (token) {
-        headers['Authorization'] = `Bearer ${token}`
-      }
-      const response = await fetch(`${API_BASE}/expenses/`, { headers })
-      if (response.ok) {
-        const data = await response.json()
-        setExpenses(data)
-        const total = data.reduce((sum: number, exp: any) => sum + parseFloat(exp.amount), 0)
-        setTotalExpenses(total)
-      }
+      // First page only; older expenses load on demand
+      const page = await fetchPage('/expenses/')
+      setExpenses(page.results)
+      setNextPage(page.next)
     } catch (error) {
       console.error('Error fetching expenses:', error)
     }
   }
 
+  const loadMoreExpenses = async () => {
+    if (!nextPage) return
+    setLoadingMore(true)
+    try {
+      const page = await fetchPage(nextPage)
+      setExpenses((previous) => [...previous, ...page.results])
+      setNextPage(page.next)
+    } catch (error) {
+      console.error('Error loading more expenses:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const fetchDeletedExpenses = async () => {
     try {
       const token = localStorage.getItem('kisan-sathi-access')
@@ -93,6 +103,9 @@ export function ExpenseManagement() {
       })
       if (response.ok) {
         const data = await response.json()
+        // Totals come from the server, not from the rows loaded so far
+        setTotalExpenses(parseFloat(data.total_expenses) || 0)
+        setExpenseCount(data.expense_count || 0)
         setDeletedCount(data.deleted_count || 0)
       }
     } catch (error) {
@@ -273,7 +286,7 @@ export function ExpenseManagement() {
         </Card>
         <Card className="p-6 bg-gradient-to-br from-green-500 to-green-600 text-white">
           <p className="text-sm opacity-90 mb-1">Active Records</p>
-          <p className="text-3xl font-bold">{expenses.length}</p>
+          <p className="text-3xl font-bold">{expenseCount}</p>
         </Card>
         <Card className="p-6 bg-gradient-to-br from-orange-500 to-orange-600 text-white">
           <p className="text-sm opacity-90 mb-1">Deleted Records</p>
@@ -350,7 +363,7 @@ export function ExpenseManagement() {
               <TabsTrigger value="active" className="gap-2">
                 📊 Active Expenses
                 <span className="px-2 py-0.5 bg-blue-100 text-blue-800 rounded-full text-xs font-semibold">
-                  {expenses.length}
+                  {expenseCount}
                 </span>
               </TabsTrigger>
               <TabsTrigger value="history" className="gap-2">
@@ -391,6 +404,13 @@ export function ExpenseManagement() {
                     </div>
                   </div>
                 ))}
+                {nextPage && (
+                  <div className="text-center pt-2">
+                    <Button variant="outline" size="sm" onClick={loadMoreExpenses} disabled={loadingMore}>
+                      {loadingMore ? 'Loading...' : 'Load more'}
+                    </Button>
+                  </div>
+                )}
               </div>
             )}
           </TabsContent>
@@ -6,6 +6,7 @@ import { Button } from "@/components/ui/button"
 import { Input } from "@/components/ui/input"
 import { Label } from "@/components/ui/label"
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs"
+import { fetchPage } from "@/lib/farm-api"
 
 const API_BASE = "http://127.0.0.1:8000/farm-management/api"
 
@@ -25,7 +26,10 @@ export function IncomeManagement() {
     payment_status: "pending",
     notes: ""
   })
+  const [nextPage, setNextPage] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [totalIncome, setTotalIncome] = useState(0)
+  const [incomeCount, setIncomeCount] = useState(0)
   const [deletedCount, setDeletedCount] = useState(0)
 
   useEffect(() => {
@@ -53,23 +57,29 @@ export function IncomeManagement() {
 
   const fetchIncome = async () => {
     try {
-      const token = localStorage.getItem('kisan-sathi-access')
-      const headers: any = {}
-      if (token) {
-        headers['Authorization'] = `Bearer ${token}`
-      }
-      const response = await fetch(`${API_BASE}/income/`, { headers })
-      if (response.ok) {
-        const data = await response.json()
-        setIncome(data)
-        const total = data.reduce((sum: number, inc: any) => sum + parseFloat(inc.total_amount), 0)
-        setTotalIncome(total)
-      }
+      // First page only; older sales load on demand
+      const page = await fetchPage('/income/')
+      setIncome(page.results)
+      setNextPage(page.next)
     } catch (error) {
       console.error('Error fetching income:', error)
     }
   }
 
+  const loadMoreIncome = async () => {
+    if (!nextPage) return
+    setLoadingMore(true)
+    try {
+      const page = await fetchPage(nextPage)
+      setIncome((previous) => [...previous, ...page.results])
+      setNextPage(page.next)
+    } catch (error) {
+      console.error('Error loading more income:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const fetchDeletedIncome = async () => {
     try {
       const token = localStorage.getItem('kisan-sathi-access')
@@ -97,6 +107,9 @@ export function IncomeManagement() {
       })
       if (response.ok) {
         const data = await response.json()
+        // Totals come from the server, not from the rows loaded so far
+        setTotalIncome(parseFloat(data.total_income) || 0)
+        setIncomeCount(data.income_count || 0)
         setDeletedCount(data.deleted_count || 0)
       }
     } catch (error) {
@@ -287,7 +300,7 @@ export function IncomeManagement() {
         </Card>
         <Card className="p-6 bg-gradient-to-br from-blue-500 to-blue-600 text-white">
           <p className="text-sm opacity-90 mb-1">Active Records</p>
-          <p className="text-3xl font-bold">{income.length}</p>
+          <p className="text-3xl font-bold">{incomeCount}</p>
         </Card>
         <Card className="p-6 bg-gradient-to-br from-orange-500 to-orange-600 text-white">
           <p className="text-sm opacity-90 mb-1">Deleted Records</p>
@@ -411,7 +424,7 @@ export function IncomeManagement() {
               <TabsTrigger value="active" className="gap-2">
                 📊 Active Income
                 <span className="px-2 py-0.5 bg-blue-100 text-blue-800 rounded-full text-xs font-semibold">
-                  {income.length}
+                  {incomeCount}
                 </span>
               </TabsTrigger>
               <TabsTrigger value="history" className="gap-2">
@@ -452,6 +465,13 @@ export function IncomeManagement() {
                     </div>
                   </div>
                 ))}
+                {nextPage && (
+                  <div className="text-center pt-2">
+                    <Button variant="outline" size="sm" onClick={loadMoreIncome} disabled={loadingMore}>
+                      {loadingMore ? 'Loading...' : 'Load more'}
+                    </Button>
+                  </div>
+                )}
               </div>
             )}
           </TabsContent>
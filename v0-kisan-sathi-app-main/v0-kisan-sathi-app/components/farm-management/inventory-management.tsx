@@ -6,6 +6,7 @@ import { Button } from "@/components/ui/button"
 import { Input } from "@/components/ui/input"
 import { Label } from "@/components/ui/label"
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select"
+import { fetchPage } from "@/lib/farm-api"
 
 const API_BASE = "http://127.0.0.1:8000/farm-management/api"
 
@@ -13,6 +14,8 @@ export function InventoryManagement() {
   const [inventory, setInventory] = useState<any[]>([])
   const [categories, setCategories] = useState<any[]>([])
   const [loading, setLoading] = useState(false)
+  const [nextPage, setNextPage] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [formData, setFormData] = useState({
     category: "",
     name: "",
@@ -47,21 +50,29 @@ export function InventoryManagement() {
 
   const fetchInventory = async () => {
     try {
-      const token = localStorage.getItem('token')
-      const response = await fetch(`${API_BASE}/inventory/`, {
-        headers: {
-          'Authorization': `Bearer ${token}`
-        }
-      })
-      if (response.ok) {
-        const data = await response.json()
-        setInventory(data)
-      }
+      // First page only; the rest load on demand
+      const page = await fetchPage('/inventory/')
+      setInventory(page.results)
+      setNextPage(page.next)
     } catch (error) {
       console.error('Error fetching inventory:', error)
     }
   }
 
+  const loadMoreInventory = async () => {
+    if (!nextPage) return
+    setLoadingMore(true)
+    try {
+      const page = await fetchPage(nextPage)
+      setInventory((previous) => [...previous, ...page.results])
+      setNextPage(page.next)
+    } catch (error) {
+      console.error('Error loading more inventory:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
     setLoading(true)
@@ -215,6 +226,13 @@ export function InventoryManagement() {
             ))}
           </div>
         )}
+        {nextPage && (
+          <div className="text-center pt-4">
+            <Button variant="outline" size="sm" onClick={loadMoreInventory} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </Button>
+          </div>
+        )}
       </Card>
     </div>
   )
@@ -47,6 +47,25 @@ export async function farmApiFetch(endpoint: string, options: RequestInit = {})
   return response
 }
 
+// List endpoints are cursor-paginated ({ next, previous, results }).
+// Fetch one page; pass its next link back in to load the following page.
+export interface Page<T = any> {
+  results: T[]
+  next: string | null
+}
+
+export async function fetchPage(endpoint: string): Promise<Page> {
+  const response = await farmApiFetch(endpoint)
+  if (!response.ok) {
+    throw new Error(`Request failed with status ${response.status}`)
+  }
+  const data = await response.json()
+  if (!data.results) {
+    return { results: data, next: null }
+  }
+  return { results: data.results, next: data.next }
+}
+
 // API endpoints
 export const farmApi = {
   // Dashboard